@@ -1,3 +1,17 @@
+"""Compare the qps of the clients with the mock server of tests/mock_server.py.
+
+    python tests/mock_server.py --port 8080
+    python benchmarks/py_test_client.py [ROUNDS] [MOCK_PROFILE_QUERY]
+
+The default profile returns 'ok' instantly, which is only the best case, the
+MOCK_PROFILE_QUERY sets the behavior of the mock server, like:
+
+    'latency=lognormal:-3,0.5&size=100k'
+    'size=10m&chunked=1&drip=0.001'
+    'error_rate=0.1&error_status=429,503&reset_rate=0.01&encoding=gzip'
+
+Only the responses of status 200 are counted as ok.
+"""
 import asyncio
 import timeit
 
@@ -20,9 +34,12 @@ async def test_aiohttp():
     from aiohttp import ClientSession
 
     async def test(req, url):
-        async with req.get(url) as resp:
-            await resp.read()
-            return resp._body
+        try:
+            async with req.get(url) as resp:
+                await resp.read()
+                return resp.status
+        except aiohttp.ClientError:
+            return None
 
     async with ClientSession() as req:
         ok = 0
@@ -33,7 +50,7 @@ async def test_aiohttp():
         ]
         for task in tasks:
             r = await task
-            if r == b'ok':
+            if r == 200:
                 ok += 1
     name = 'test_aiohttp'
     cost = timeit.default_timer() - start
@@ -57,7 +74,7 @@ async def test_dummy():
         ]
         for task in tasks:
             r = await task
-            if r.content == b'ok':
+            if getattr(r, 'status_code', None) == 200:
                 ok += 1
     name = 'test_dummy'
     cost = timeit.default_timer() - start
@@ -81,7 +98,7 @@ async def test_aiohttp_dummy():
         ]
         for task in tasks:
             r = await task
-            if r.content == b'ok':
+            if getattr(r, 'status_code', None) == 200:
                 ok += 1
     name = 'test_aiohttp_dummy'
     cost = timeit.default_timer() - start
@@ -103,7 +120,7 @@ def test_tPool():
     req.x
     for task in tasks:
         r = task.x
-        if r.text == 'ok':
+        if getattr(r, 'status_code', None) == 200:
             ok += 1
     name = 'test_tPool'
     cost = timeit.default_timer() - start
@@ -119,14 +136,21 @@ async def test_httpx():
     from httpx import AsyncClient
     start = timeit.default_timer()
     ok = 0
+
+    async def test(req, url):
+        try:
+            return await req.get(url)
+        except httpx.HTTPError:
+            return None
+
     async with AsyncClient() as req:
         tasks = [
-            asyncio.create_task(req.get(url))
+            asyncio.create_task(test(req, url))
             for _ in range(TOTAL_REQUEST_COUNTS)
         ]
         for task in tasks:
             r = await task
-            if r.text == 'ok':
+            if getattr(r, 'status_code', None) == 200:
                 ok += 1
     name = 'test_httpx'
     cost = timeit.default_timer() - start
@@ -153,7 +177,9 @@ if __name__ == "__main__":
             uvloop.install()
         except ImportError:
             pass
-    url = 'http://127.0.0.1:8080'
+    url = 'http://127.0.0.1:8080/'
+    if len(sys.argv) > 2:
+        url += '?' + sys.argv[2]
     TOTAL_REQUEST_COUNTS = 2000
     # use aiohttp as the standard qps
     AIOHTTP_QPS = None
@@ -0,0 +1,65 @@
+"""Measure the import time of the entry points by `python -X importtime`, and check
+the heavy dependencies are only imported by the entry points which need them.
+
+    python benchmarks/py_test_importtime.py [ROUNDS]
+
+Exit with 1 if any entry point imports a module it should not.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('requests', 'urllib3', 'aiohttp', 'uvloop')
+# entry point: the heavy modules allowed to be imported
+ENTRY_POINTS = {
+    'torequests': (),
+    'torequests.utils': (),
+    'torequests.crawlers': (),
+    'torequests.replay': (),
+    'torequests.main': ('requests', 'urllib3'),
+    'torequests.dummy': ('requests', 'urllib3', 'aiohttp', 'uvloop'),
+    'torequests.aiohttp_dummy': ('aiohttp', 'uvloop'),
+}
+
+
+def import_time(module):
+    """Return (cumulative us of the module, the heavy modules imported)."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            env=env,
+                            stderr=subprocess.PIPE,
+                            check=True).stderr.decode('utf-8')
+    cost, imported = 0, set()
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if name == module:
+            cost = int(cumulative)
+        if name in HEAVY_MODULES:
+            imported.add(name)
+    return cost, imported
+
+
+def main(rounds):
+    failed = []
+    print(f'{"entry point": <25}: {"best": >8} {"median": >8}   heavy modules')
+    for module, allowed in ENTRY_POINTS.items():
+        results = [import_time(module) for _ in range(rounds)]
+        costs = sorted(cost for cost, _ in results)
+        imported = results[0][1]
+        unexpected = imported - set(allowed)
+        if unexpected:
+            failed.append(module)
+        print(f'{module: <25}: {costs[0] / 1000: >6.1f}ms {costs[len(costs) // 2] / 1000: >6.1f}ms   '
+              f'{", ".join(sorted(imported)) or "-"}'
+              f'{" (unexpected: %s)" % ", ".join(sorted(unexpected)) if unexpected else ""}')
+    if failed:
+        print(f'unexpected imports of: {", ".join(failed)}')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,64 @@
+"""Compare Regex dispatch of the default mode and the compiled mode, over a registry of URL patterns.
+
+    python benchmarks/py_test_regex.py [PATTERN_COUNTS] [URL_COUNTS]
+"""
+import random
+import re
+import timeit
+
+from torequests.utils import Regex
+
+PATHS = ['item', 'list', 'search', 'user', 'article', 'api/v1/detail']
+
+
+def get_patterns(count):
+    patterns = []
+    for index in range(count):
+        path = PATHS[index % len(PATHS)]
+        kind = index % 4
+        if kind == 0:
+            patterns.append((r'^https?://www\.site%s\.com/%s/\d+' % (index, path), 0))
+        elif kind == 1:
+            patterns.append((r'https?://m\.site%s\.(com|net)/%s\?id=\w+' % (index, path), 0))
+        elif kind == 2:
+            patterns.append((r'^https?://(www\.)?SITE%s\.org/%s' % (index, path), re.I))
+        else:
+            patterns.append((r'//api\.site%s\.com/.*/%s' % (index, path), 0))
+    return patterns
+
+
+def get_urls(count, pattern_count):
+    random.seed(1)
+    urls = []
+    for _ in range(count):
+        index = random.randint(0, pattern_count * 2)
+        path = random.choice(PATHS)
+        urls.append(random.choice([
+            'https://www.site%s.com/%s/%s' % (index, path, index),
+            'http://m.site%s.net/%s?id=abc' % (index, path),
+            'https://site%s.org/%s' % (index, path),
+            'https://api.site%s.com/x/y/%s' % (index, path),
+        ]))
+    return urls
+
+
+def test(compiled, patterns, urls):
+    reg = Regex(compiled=compiled)
+    for index, (pattern, flags) in enumerate(patterns):
+        reg.register(pattern, 'obj%s' % index, flags=flags)
+    start = timeit.default_timer()
+    results = [(reg.match(url), reg.search(url)) for url in urls]
+    cost = timeit.default_timer() - start
+    print(f'compiled={compiled!s: <5}: {cost:.3f}s, '
+          f'{cost * 1000000 / len(urls): >8.1f} us/url')
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    pattern_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    url_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    patterns = get_patterns(pattern_count)
+    urls = get_urls(url_count, pattern_count)
+    print(f'{pattern_count} patterns, {url_count} urls')
+    assert test(False, patterns, urls) == test(True, patterns, urls)
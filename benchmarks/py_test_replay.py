@@ -0,0 +1,93 @@
+"""Replay the recorded traffic with its load shape: serve the records by a ReplayServer,
+then send the recorded requests at their recorded start time offsets through dummy.Requests.
+
+    python benchmarks/py_test_replay.py [RECORDS_PATH] [SPEEDUP]
+
+Without RECORDS_PATH, a synthetic recording (bursts over a base rate, mixed sizes,
+statuses and latencies) will be generated into a temporary directory.
+"""
+import asyncio
+import random
+import tempfile
+import timeit
+from collections import Counter
+from urllib.parse import urlsplit
+
+from torequests.crawlers import LatencyHistogram
+from torequests.dummy import Requests
+from torequests.replay import Recorder, ReplayServer, load_records
+
+
+def make_records(path, seconds=5, base_rate=50, seed=1):
+    """Base rate with 3 bursts of 6x, 95% 200 / 3% 429 / 2% 503, lognormal sizes and latencies."""
+    rand = random.Random(seed)
+    bodies = [b'x' * int(rand.lognormvariate(8, 1.5)) for _ in range(20)]
+    bursts = [(seconds * i / 4, seconds * i / 4 + 0.3) for i in range(1, 4)]
+    start_time, offset = 1600000000, 0.0
+    with Recorder(path, mode='w') as recorder:
+        while offset < seconds:
+            in_burst = any(start <= offset < end for start, end in bursts)
+            offset += rand.expovariate(base_rate * (6 if in_burst else 1))
+            status = rand.choices([200, 429, 503], [95, 3, 2])[0]
+            headers = [('Content-Type', 'text/plain')]
+            if status == 429:
+                headers.append(('Retry-After', '1'))
+            recorder.record('GET',
+                            f'http://api.example.com/item/{rand.randint(1, 200)}',
+                            status, headers, rand.choice(bodies),
+                            min(rand.lognormvariate(-3.5, 0.6), 2),
+                            start_time + offset)
+        return recorder.count
+
+
+async def replay(records, url, speedup):
+    histogram = LatencyHistogram()
+    statuses = Counter()
+    first_start = records[0]['start_time']
+
+    async def fetch(req, record, scheduled):
+        parts = urlsplit(record['url'])
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        resp = await req.request(record['method'], url + path)
+        # measured from the scheduled time, so the queueing of the client is counted
+        histogram.record(timeit.default_timer() - scheduled)
+        statuses[getattr(resp, 'status', 'error')] += 1
+
+    async with Requests(n=1000) as req:
+        start = timeit.default_timer()
+        tasks = []
+        for record in records:
+            scheduled = start + (record['start_time'] - first_start) / speedup
+            await asyncio.sleep(max(scheduled - timeit.default_timer(), 0))
+            tasks.append(asyncio.ensure_future(fetch(req, record, scheduled)))
+        await asyncio.gather(*tasks)
+        cost = timeit.default_timer() - start
+    return histogram, statuses, cost
+
+
+def main(path, speedup):
+    records = sorted(load_records(path), key=lambda record: record['start_time'])
+    recorded = LatencyHistogram()
+    for record in records:
+        recorded.record(record['latency'])
+    duration = records[-1]['start_time'] - records[0]['start_time']
+    with ReplayServer(path, latency='record') as server:
+        histogram, statuses, cost = asyncio.get_event_loop().run_until_complete(
+            replay(records, server.url, speedup))
+    print(f'{len(records)} records of {duration:.3f}s, speedup {speedup}x, replayed in {cost:.3f}s')
+    for name, h in (('recorded', recorded), ('replayed', histogram)):
+        s = h.summary()
+        print(f'{name: <9}: p50 {s["p50"]}s, p90 {s["p90"]}s, p99 {s["p99"]}s, max {s["max"]}s')
+    expect = Counter(record['status'] for record in records)
+    print(f'statuses: {dict(statuses)}, match: {statuses == expect}')
+
+
+if __name__ == "__main__":
+    import sys
+    speedup = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    if len(sys.argv) > 1:
+        main(sys.argv[1], speedup)
+    else:
+        with tempfile.TemporaryDirectory() as path:
+            print(f'generated {make_records(path)} records into {path}')
+            main(path, speedup)
@@ -0,0 +1,77 @@
+"""Measure the bytes and microseconds per submitted task, default mode vs compact mode.
+
+The tasks are kept pending while measuring (the workers are blocked, the loop
+is not running), so the numbers only show the cost of the submission itself.
+
+    python benchmarks/py_test_submit.py [TOTAL_TASK_COUNTS]
+"""
+import asyncio
+import gc
+import threading
+import timeit
+import tracemalloc
+
+from torequests.dummy import Requests
+from torequests.main import Pool, tPool
+
+
+def measure(name, submit):
+    gc.collect()
+    tracemalloc.start()
+    start_size = tracemalloc.get_traced_memory()[0]
+    start = timeit.default_timer()
+    tasks = [submit() for _ in range(TOTAL_TASK_COUNTS)]
+    cost = timeit.default_timer() - start
+    size = tracemalloc.get_traced_memory()[0] - start_size
+    tracemalloc.stop()
+    print(f'{name: <25}: {size / TOTAL_TASK_COUNTS: >8.1f} bytes/task, '
+          f'{cost * 1000000 / TOTAL_TASK_COUNTS: >6.2f} us/task')
+    return tasks
+
+
+def test_Pool(compact):
+    gate = threading.Event()
+    pool = Pool(1, compact=compact)
+    # block the only worker, all the other tasks keep pending
+    pool.submit(gate.wait)
+    measure(f'test_Pool(compact={compact})',
+            lambda: pool.submit(sum, (1, 2), callback=bool))
+    pool.shutdown(wait=False, cancel_futures=True)
+    gate.set()
+
+
+def test_tPool(compact):
+    gate = threading.Event()
+    req = tPool(1, compact=compact)
+    req.pool.submit(gate.wait)
+    measure(f'test_tPool(compact={compact})',
+            lambda: req.get(url, callback=bool))
+    req.pool.shutdown(wait=False, cancel_futures=True)
+    gate.set()
+
+
+def test_dummy(compact):
+    loop = asyncio.new_event_loop()
+    req = Requests(loop=loop, compact=compact)
+    # the loop is not running, so all the tasks keep pending
+    tasks = measure(f'test_dummy(compact={compact})',
+                    lambda: req.get(url, callback=bool))
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.run_until_complete(req.close())
+    loop.close()
+
+
+if __name__ == "__main__":
+    import sys
+    url = 'http://127.0.0.1:8080'
+    if len(sys.argv) > 1:
+        TOTAL_TASK_COUNTS = int(sys.argv[1])
+    else:
+        TOTAL_TASK_COUNTS = 100000
+    for compact in (False, True):
+        test_Pool(compact)
+        test_tPool(compact)
+        test_dummy(compact)
+        print('=' * 80)
@@ -0,0 +1,355 @@
+"""The benchmark suite, save the results into a JSON file, and compare it with a baseline.
+
+    python benchmarks/py_test_suite.py run [-o results.json] [--quick] [--url URL] [--only PREFIX]
+    python benchmarks/py_test_suite.py compare baseline.json results.json [--threshold 0.1]
+
+Without --url, tests/mock_server.py is started on a free port in a subprocess.
+The results are {"meta": {...}, "results": {name: {"value": float, "unit": str}}},
+the unit `qps` is higher-better, the others (`s`, `us`, `bytes`) are lower-better.
+`compare` prints the changes and exits with 1 if any metric regressed more than threshold.
+
+    client.{name}.c{concurrency}.qps / .p50 / .p99: closed-loop GETs to the mock server.
+        the raw aiohttp / httpx clients are the baselines, skipped if not installed.
+    client.{name}.memory: traced bytes per in-flight request.
+    frequency.{sync,async}.acquire: us per acquire of Frequency / AsyncFrequency.
+    pool.submit: us per Pool.submit + result.
+    utils.{curlparse,find_jsons,regex_search,update_url,unique}: us per call.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from collections import OrderedDict
+
+import torequests
+from torequests.crawlers import LatencyHistogram
+from torequests.frequency_controller.async_tools import AsyncFrequency
+from torequests.frequency_controller.sync_tools import Frequency
+from torequests.main import Pool, tPool
+from torequests.utils import Regex, curlparse, find_jsons, unique, update_url
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HIGHER_BETTER_UNITS = {'qps'}
+CONCURRENCIES = (1, 10, 100)
+CLIENTS = ('dummy', 'aiohttp_dummy', 'tPool', 'aiohttp', 'httpx')
+# the raw clients measured as the baselines, optional dependencies
+BASELINE_CLIENTS = {'aiohttp', 'httpx'}
+CURL = r'''curl 'https://p.3.cn/prices/mgets?skuIds=J_1&nonsense=1&nonce=0' -H 'Pragma: no-cache' -H 'DNT: 1' -H 'Accept-Encoding: gzip, deflate' -H 'Accept-Language: zh-CN,zh;q=0.9' -H 'User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.84 Safari/537.36' -H 'Accept: */*' -H 'Cookie: a=1; b=2' --data-raw 'a=1&b=2' --compressed'''
+HTML = ('<html><script>var data = {"items": [%s], "total": 100};</script>'
+        '<div data-x="[1, 2, {3}]">text {not json} [] {}</div></html>' %
+        ', '.join('{"id": %s, "name": "item %s", "tags": ["a", "b"]}' %
+                  (i, i) for i in range(100)))
+
+
+def client_installed(name):
+    return name not in BASELINE_CLIENTS or importlib.util.find_spec(
+        name) is not None
+
+
+def create_requests(name, n):
+    """Should be called in the running loop."""
+    if name == 'dummy':
+        from torequests.dummy import Requests
+        return Requests(n=n)
+    if name == 'httpx':
+        from httpx import AsyncClient, Limits
+        return AsyncClient(limits=Limits(max_connections=n))
+    from aiohttp import ClientSession, TCPConnector
+    if name == 'aiohttp':
+        return ClientSession(connector=TCPConnector(limit=n))
+    from torequests.aiohttp_dummy import Requests
+    return Requests(connector=TCPConnector(limit=n))
+
+
+async def fetch(name, req, url):
+    """GET the url and read the whole body."""
+    if name == 'aiohttp':
+        async with req.get(url) as resp:
+            return await resp.read()
+    return await req.get(url)
+
+
+class Suite(object):
+
+    def __init__(self, url, quick=False, only=None):
+        self.url = url
+        self.quick = quick
+        self.only = only
+        self.results = OrderedDict()
+
+    def add(self, name, value, unit):
+        self.results[name] = {'value': round(value, 3), 'unit': unit}
+        print(f'{name: <40}: {round(value, 3): >12} {unit}')
+
+    def selected(self, name):
+        return not self.only or name.startswith(self.only)
+
+    def selected_client(self, name, prefix):
+        if not self.selected(prefix):
+            return False
+        if not client_installed(name):
+            print(f'{prefix: <40}: skipped, {name} is not installed')
+            return False
+        return True
+
+    def micro(self, name, function, number):
+        """Add the best of 5 rounds, in us per call."""
+        if not self.selected(name):
+            return
+        if self.quick:
+            number = max(number // 10, 1)
+        cost = min(timeit.repeat(function, number=number, repeat=5))
+        self.add(name, cost * 1000000 / number, 'us')
+
+    def run_client(self, name, concurrency, total):
+        histogram = LatencyHistogram()
+        start = timeit.default_timer()
+        if name == 'tPool':
+            req = tPool(concurrency)
+            counter = iter(range(total))
+
+            def worker():
+                for _ in counter:
+                    begin = timeit.default_timer()
+                    req.get(self.url).x
+                    histogram.record(timeit.default_timer() - begin)
+
+            threads = [
+                threading.Thread(target=worker) for _ in range(concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            req.close()
+        else:
+            async def test():
+                counter = iter(range(total))
+
+                async def worker(req):
+                    for _ in counter:
+                        begin = timeit.default_timer()
+                        await fetch(name, req, self.url)
+                        histogram.record(timeit.default_timer() - begin)
+
+                async with create_requests(name, concurrency) as req:
+                    await asyncio.gather(
+                        *[worker(req) for _ in range(concurrency)])
+
+            asyncio.run(test())
+        cost = timeit.default_timer() - start
+        return total / cost, histogram
+
+    def test_clients(self):
+        total = 200 if self.quick else 2000
+        for name in CLIENTS:
+            for concurrency in CONCURRENCIES:
+                prefix = f'client.{name}.c{concurrency}'
+                if not self.selected_client(name, prefix):
+                    continue
+                qps, histogram = self.run_client(name, concurrency, total)
+                self.add(prefix + '.qps', qps, 'qps')
+                self.add(prefix + '.p50', histogram.percentile(50), 's')
+                self.add(prefix + '.p99', histogram.percentile(99), 's')
+
+    def test_memory(self):
+        """Keep the requests in flight by the latency of mock server, and trace the peak."""
+        count = 50 if self.quick else 200
+        url = self.url + ('&' if '?' in self.url else '?') + 'latency=0.5'
+        for name in CLIENTS:
+            prefix = f'client.{name}.memory'
+            if not self.selected_client(name, prefix):
+                continue
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            if name == 'tPool':
+                req = tPool(count)
+                for task in [req.get(url) for _ in range(count)]:
+                    task.x
+                req.close()
+            else:
+                async def test():
+                    async with create_requests(name, count) as req:
+                        await asyncio.gather(
+                            *[fetch(name, req, url) for _ in range(count)])
+
+                asyncio.run(test())
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.add(prefix, (peak - base) / count, 'bytes')
+
+    def test_frequency(self):
+        frequency = Frequency(1000000, 0.001)
+
+        def acquire():
+            with frequency:
+                pass
+
+        self.micro('frequency.sync.acquire', acquire, 100000)
+        if self.selected('frequency.async.acquire'):
+            number = 10000 if self.quick else 100000
+
+            async def test():
+                frequency = AsyncFrequency(1000000, 0.001)
+                start = timeit.default_timer()
+                for _ in range(number):
+                    async with frequency:
+                        pass
+                return timeit.default_timer() - start
+
+            cost = min(asyncio.run(test()) for _ in range(3))
+            self.add('frequency.async.acquire', cost * 1000000 / number, 'us')
+
+    def test_pool(self):
+        if not self.selected('pool.submit'):
+            return
+        number = 10000 if self.quick else 100000
+        pool = Pool(4)
+        costs = []
+        for _ in range(3):
+            start = timeit.default_timer()
+            for task in [pool.submit(sum, (1, 2)) for _ in range(number)]:
+                task.x
+            costs.append(timeit.default_timer() - start)
+        pool.shutdown()
+        self.add('pool.submit', min(costs) * 1000000 / number, 'us')
+
+    def test_utils(self):
+        reg = Regex()
+        for index in range(100):
+            reg.register(r'^https?://www\.site%s\.com/item/\d+' % index, 'obj%s' % index)
+        urls = ['https://www.site%s.com/item/1' % index for index in range(0, 200, 7)]
+        items = list(range(500)) * 4
+        self.micro('utils.curlparse', lambda: curlparse(CURL, cache=False), 2000)
+        self.micro('utils.find_jsons', lambda: list(find_jsons(HTML)), 200)
+        self.micro('utils.regex_search',
+                   lambda: [reg.search(url) for url in urls], 200)
+        self.micro(
+            'utils.update_url', lambda: update_url(
+                'http://httpbin.org/get?a=1&b=2', {
+                    'a': '2',
+                    'b': None
+                }, c='3'), 20000)
+        self.micro('utils.unique', lambda: unique(items, return_as=list), 500)
+
+    def run(self):
+        self.test_clients()
+        self.test_memory()
+        self.test_frequency()
+        self.test_pool()
+        self.test_utils()
+        return {
+            'meta': {
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'quick': self.quick,
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'torequests': torequests.__version__,
+            },
+            'results': self.results,
+        }
+
+
+def start_mock_server():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    proc = subprocess.Popen([
+        sys.executable,
+        os.path.join(ROOT, 'tests', 'mock_server.py'), '--port',
+        str(port)
+    ],
+                            stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    else:
+        proc.kill()
+        raise RuntimeError('mock server not started')
+    return f'http://127.0.0.1:{port}/', proc
+
+
+def compare(baseline, current, threshold=0.1):
+    """Print the changes of the metrics, return the names of the regressed ones."""
+    regressions = []
+    baseline, current = baseline['results'], current['results']
+    for name, item in current.items():
+        if name not in baseline:
+            print(f'{name: <40}: {"": >12} -> {item["value"]: >12} {item["unit"]} (new)')
+            continue
+        old, new = baseline[name]['value'], item['value']
+        change = (new - old) / old if old else 0
+        if item['unit'] in HIGHER_BETTER_UNITS:
+            change = -change
+        if change > threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = 'improved'
+        else:
+            flag = ''
+        # positive change means slower (worse)
+        print(f'{name: <40}: {old: >12} -> {new: >12} {item["unit"]: <5} '
+              f'{change * 100: >+7.1f}% {flag}')
+    for name in baseline:
+        if name not in current:
+            print(f'{name: <40}: missing')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run')
+    run_parser.add_argument('-o', '--output', default='benchmark_results.json')
+    run_parser.add_argument('--quick', action='store_true',
+                            help='less rounds for a smoke run')
+    run_parser.add_argument('--url', help='use a running mock server')
+    run_parser.add_argument('--only', help='only run the metrics with the prefix')
+    compare_parser = subparsers.add_parser('compare')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='0.1 means 10% worse is a regression')
+    args = parser.parse_args()
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions: {", ".join(regressions)}')
+            sys.exit(1)
+        print('no regression')
+        return
+    proc = None
+    url = args.url
+    if not url:
+        url, proc = start_mock_server()
+    try:
+        output = Suite(url, quick=args.quick, only=args.only).run()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f'saved to {args.output}')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 #! coding:utf-8
 import asyncio
+import os
 import time
 
 from torequests import *
 from torequests.dummy import *
+from torequests.exceptions import FailureException
 from torequests.utils import retry
 
 
@@ -114,6 +116,412 @@ def test_new_future_awaitable():
     assert task.x == 1.5
 
 
+def test_compact_loop():
+    loop = Loop(compact=True)
+
+    async def test(i):
+        await asyncio.sleep(0.01)
+        return i
+
+    tasks = [
+        loop.submit(test(i), callback=[lambda t: t.x + 1, lambda t: t.x * 2])
+        for i in range(3)
+    ] + [loop.submit(test(3))]
+    assert all(isinstance(task, CompactTask) for task in tasks)
+    assert not hasattr(tasks[0], '__dict__')
+    loop.x
+    assert [task.cx for task in tasks] == [0, 2, 4, 3]
+    assert tasks[0].task_cost_time > 0
+
+
+def test_sync_requests(local_server):
+    with SyncRequests(n=50) as req:
+        start = time.time()
+        tasks = [
+            req.get(local_server + '/?sleep=0.2',
+                    callback=lambda f: f.x.status_code) for _ in range(200)
+        ]
+        assert all(isinstance(task, NewFuture) for task in tasks)
+        req.x
+        # 200 requests in 4 rounds of 50 concurrent requests, 40s if serial
+        assert time.time() - start < 10
+        assert [task.cx for task in tasks] == [200] * 200
+        assert tasks[0].text == 'ok'
+        assert isinstance(req.get('http://127.0.0.1:1').x, FailureException)
+    assert req.loop.is_closed()
+    try:
+        req.get(local_server)
+        raise AssertionError('should raise RuntimeError after shutdown')
+    except RuntimeError:
+        pass
+
+
+def test_sync_requests_callback_thread(local_server, wait_until):
+    import threading
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_callback(f):
+        started.set()
+        release.wait(5)
+        return threading.current_thread().name
+
+    with SyncRequests(n=10, callback_workers=1) as req:
+        slow = req.get(local_server, callback=slow_callback)
+        assert started.wait(5)
+        # the blocked callback is not running in the loop thread, so the
+        # next request does not wait for the release.wait(5)
+        start = time.time()
+        assert req.get(local_server).x.text == 'ok'
+        assert time.time() - start < 4
+        release.set()
+        assert wait_until(lambda: slow.cx is not None)
+        assert slow.cx.startswith('SyncRequests-callback')
+    # shutdown in the loop thread (like __del__ by gc) does not deadlock
+    req = SyncRequests()
+    assert req.get(local_server).x.text == 'ok'
+    req.loop.call_soon_threadsafe(req.shutdown, False)
+    req._thread.join(5)
+    assert not req._thread.is_alive()
+    assert req.loop.is_closed()
+
+
+def test_dummy_proxy_pool(local_server):
+    import threading
+    from torequests.utils import ProxyPool
+
+    bad_proxy, good_proxy = '127.0.0.1:1', local_server.split('://')[1]
+    proxy_pool = ProxyPool([bad_proxy, good_proxy],
+                           interval=0.2,
+                           max_failures=1,
+                           eject_seconds=60)
+
+    async def test():
+        async with Requests(proxy_pool=proxy_pool) as req:
+            # retry with the other proxy
+            resp = await req.get('http://example.invalid/', retry=1)
+            assert resp.text == 'ok'
+            start = time.time()
+            # the good proxy is used once per 0.2 seconds
+            resps = await asyncio.gather(
+                *[req.get('http://example.invalid/') for _ in range(2)])
+            assert [resp.text for resp in resps] == ['ok', 'ok']
+            assert time.time() - start > 0.15
+            proxy_pool.remove_proxy(good_proxy)
+            proxy_pool.timeout = 0.1
+            failure = await req.get('http://example.invalid/')
+            assert failure.name == 'ProxyUnavailable'
+            # the waiting request wakes up once a proxy is added by a thread
+            proxy_pool.timeout = 5
+            timer = threading.Timer(0.1, proxy_pool.add_proxy, (good_proxy,))
+            timer.start()
+            start = time.time()
+            resp = await req.get('http://example.invalid/')
+            assert resp.text == 'ok'
+            assert time.time() - start < 1
+            assert not proxy_pool.cooldown._listeners
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(test())
+    loop.close()
+    stats = proxy_pool.stats
+    assert stats[bad_proxy]['failure'] <= 1
+    assert stats[bad_proxy]['success'] == 0
+
+
+def test_frontier():
+    from torequests.crawlers import Frontier
+
+    frontier = Frontier(frequencies={'a.com': (1, 0.2)},
+                        default_host_frequency=None,
+                        idle_timeout=0.3)
+    assert frontier.add('http://a.com/?x=1&y=2')
+    assert not frontier.add('http://a.com/?y=2&x=1')
+    assert frontier.add_many(['http://a.com/2', 'http://a.com/3']) == 2
+    assert frontier.add('http://a.com/4', priority=1)
+    assert frontier.add('http://b.com/1')
+    assert len(frontier) == 5
+
+    async def test():
+        result = []
+        async for request in frontier:
+            result.append((request['url'], time.time()))
+            if request['url'] == 'http://b.com/1':
+                frontier.add('http://b.com/2')
+        return result
+
+    loop = asyncio.new_event_loop()
+    result = loop.run_until_complete(test())
+    loop.close()
+    # the busy host does not block the others, and the priority goes first
+    assert [url for url, _ in result] == [
+        'http://a.com/4', 'http://b.com/1', 'http://b.com/2',
+        'http://a.com/?x=1&y=2', 'http://a.com/2', 'http://a.com/3'
+    ]
+    times = [ts for _, ts in result]
+    assert times[2] - times[0] < 0.1
+    assert times[3] - times[0] > 0.18
+    assert times[4] - times[3] > 0.18
+    assert len(frontier) == 0
+    assert frontier.pop_ready() == (None, None)
+    # the stale entries of the ready hosts are skipped
+    frontier = Frontier(default_host_frequency=None)
+    frontier.add('http://a.com/1')
+    frontier.add('http://b.com/1', priority=1)
+    assert frontier.pop_ready()[0]['url'] == 'http://b.com/1'
+    frontier.add('http://a.com/2', priority=5)
+    frontier.add('http://a.com/3', priority=6)
+    frontier.add('http://c.com/1', priority=3)
+    assert [frontier.pop_ready()[0]['url'] for _ in range(4)] == [
+        'http://a.com/3', 'http://a.com/2', 'http://c.com/1', 'http://a.com/1'
+    ]
+    assert not frontier._ready_sequences
+    # wake up by the adding from other threads
+    import threading
+
+    async def test_threads():
+        result = []
+        threading.Timer(0.1, frontier.add, ('http://d.com/1',)).start()
+        threading.Timer(0.2, frontier.close).start()
+        start = time.time()
+        async for request in frontier:
+            result.append(request['url'])
+        return result, time.time() - start
+
+    loop = asyncio.new_event_loop()
+    result, cost = loop.run_until_complete(test_threads())
+    loop.close()
+    assert result == ['http://d.com/1']
+    assert cost < 0.5
+
+
+def test_stress_test_open_loop(local_server):
+    from torequests.crawlers import RateSchedule, StressTest
+
+    assert [round(i, 3) for i in RateSchedule.ramp(0, 10, 1)
+           ] == [0, 0.447, 0.632, 0.775, 0.894]
+    schedule = RateSchedule.step([(10, 1), (0, 1), (20, 0.5)])
+    offsets = list(schedule)
+    assert len(offsets) == 20 and offsets[9] == 0.9 and offsets[10] == 2
+    assert schedule.expected_count(1.5) == 10
+    assert schedule.rate_at(2.1) == 20 and schedule.rate_at(3) == 0
+    # n=2 can only handle 20 req/s for 0.1s latency, the open-loop still sends
+    # 40 req/s, and the queueing time is counted.
+    costs = []
+    st = StressTest(local_server + '/?sleep=0.1',
+                    n=2,
+                    rate=RateSchedule.constant(40, 0.5),
+                    shutdown=lambda: None,
+                    logger_function=lambda text, **kw: costs.append(kw['cost']))
+    report = st.x['open_loop']
+    assert report['sent'] == report['responses'] == len(costs) == 20
+    assert report['target_rps'] == 40
+    assert report['achieved_rps'] > 30
+    assert min(costs) >= 0.1
+    assert max(costs) > 0.4
+
+
+def test_stress_test_report(local_server, tmp_path):
+    import json
+    from torequests.crawlers import LatencyHistogram, StressTest
+
+    histogram = LatencyHistogram()
+    for i in range(1, 1001):
+        histogram.record(i / 1000)
+    for percent in (50, 90, 99):
+        assert abs(histogram.percentile(percent) - percent / 100) < percent / 10000
+    assert histogram.max == 1 and histogram.min == 0.001
+    merged = LatencyHistogram.from_dict(json.loads(json.dumps(
+        histogram.to_dict()))).merge(histogram)
+    assert merged.count == 2000
+    assert merged.percentile(50) == histogram.percentile(50)
+
+    report_path = tmp_path / 'report.json'
+    st = StressTest(local_server,
+                    n=5,
+                    chunk_size=8,
+                    total_tries=20,
+                    shutdown_changed=False,
+                    report_interval=0,
+                    report_path=str(report_path))
+    st.request['url'] = local_server + '/?status=503'
+    report = st.x
+    assert report == json.loads(report_path.read_text())
+    # the chunk is limited by total_tries
+    assert report['sent'] == report['total'] == 20
+    assert report['stop_reason'] == 'total_tries: 20'
+    assert report['statuses'] == {'503': 20}
+    assert report['succ'] == 0 and not report['errors']
+    assert report['histogram']['count'] == 20
+
+    st = StressTest(local_server, n=5, total_tries=10, report_interval=0)
+    st.request['url'] = 'http://127.0.0.1:1/'
+    report = st.x
+    # stop at the first changed response, the in-flight requests go on
+    assert report['stop_reason'].startswith('shutdown_changed')
+    assert report['sent'] == 10
+    assert sum(report['errors'].values()) == 10 and report['succ'] == 0
+
+
+def test_stress_test_processes(local_server):
+    from torequests.crawlers import StressTest
+
+    st = StressTest(local_server,
+                    n=5,
+                    chunk_size=8,
+                    total_tries=30,
+                    report_interval=0,
+                    processes=2)
+    report = st.x
+    # the total_tries is shared by the workers
+    assert report['processes'] == 2
+    assert report['sent'] == report['total'] == 30
+    assert report['histogram']['count'] == 30
+    assert report['statuses'] == {'200': 30}
+    assert report['stop_reason'] == 'total_tries: 30'
+
+    st = StressTest(local_server + '/?sleep=0.05',
+                    n=20,
+                    rate=[(40, 0.5)],
+                    report_interval=0,
+                    processes=2)
+    report = st.x
+    assert report['total'] == report['open_loop']['sent'] == 20
+    assert report['open_loop']['target_rps'] == 40
+    assert report['stop_reason'] == 'schedule finished'
+    assert report['min'] >= 0.05
+
+    # the crashed workers never post their results
+    start = time.time()
+    st = StressTest(local_server,
+                    n=2,
+                    total_tries=10,
+                    report_interval=0,
+                    logger_function=lambda text, **kwargs: os._exit(3),
+                    processes=2)
+    report = st.x
+    assert time.time() - start < 5
+    assert report['stop_reason'].startswith('worker error: worker exited')
+    # processes > 1 needs the fork start method
+    import multiprocessing
+    get_all_start_methods = multiprocessing.get_all_start_methods
+    multiprocessing.get_all_start_methods = lambda: ['spawn']
+    try:
+        StressTest(local_server, processes=2)
+        raise AssertionError('should raise ValueError without fork')
+    except ValueError:
+        pass
+    finally:
+        multiprocessing.get_all_start_methods = get_all_start_methods
+
+
+def test_record_replay(local_server, tmp_path):
+    import requests
+    from torequests.aiohttp_dummy import Requests as AiohttpRequests
+    from torequests.replay import Recorder, ReplayServer, load_records
+
+    path = str(tmp_path / 'records')
+    with Recorder(path, mode='w') as recorder:
+        req = tPool(recorder=recorder)
+        req.get(local_server + '/?sleep=0.2&body=slow').x
+        req.get(local_server + '/?status=404').x
+
+        async def test():
+            async with Requests(recorder=recorder) as req:
+                await req.post(local_server + '/post', data=b'x')
+            async with AiohttpRequests(recorder=recorder) as req:
+                await req.get(local_server + '/?body=slow', headers={'X-Body': ''})
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(test())
+        loop.close()
+        # the coroutines record in the writer thread
+        recorder.flush()
+        assert recorder.count == 4
+        assert recorder._writer.name == 'Recorder-writer'
+    records = list(load_records(path))
+    assert [(r['method'], r['status'], r['size']) for r in records] == [
+        ('GET', 200, 4), ('GET', 404, 2), ('POST', 200, 2), ('GET', 200, 4)
+    ]
+    assert records[0]['latency'] >= 0.2
+    # the same bodies are saved only once
+    assert len(os.listdir(os.path.join(path, 'bodies'))) == 2
+
+    with ReplayServer(path, latency='record', latency_scale=0.5) as server:
+        req = tPool()
+        start = time.time()
+        resp = req.get(server.url + '/?sleep=0.2&body=slow').x
+        assert time.time() - start >= 0.1
+        assert (resp.status_code, resp.text) == (200, 'slow')
+        assert resp.headers['Content-Type'] == 'text/plain'
+        assert req.get(server.url + '/?status=404').x.status_code == 404
+        assert req.post(server.url + '/post').x.text == 'ok'
+        assert req.get(server.url + '/unknown').x.status_code == 404
+        # as a proxy, matched by host and path
+        resp = req.get(local_server + '/post',
+                       proxies={'http': server.url}).x
+        assert resp.status_code == 404
+        resp = req.post(local_server + '/post',
+                        proxies={'http': server.url}).x
+        assert resp.text == 'ok'
+    # the recorder is not kept alive by its writer thread
+    import gc
+    from torequests.replay import _recorders
+
+    recorder = Recorder(path, mode='w')
+    resp = requests.get(local_server + '/?body=gc')
+    for _ in range(3):
+        recorder.record_response(resp, 0.1, wait=False)
+    writer = recorder._writer
+    assert recorder in _recorders
+    del recorder
+    gc.collect()
+    writer.join(1)
+    assert not writer.is_alive() and not _recorders
+    assert len(list(load_records(path))) == 3
+
+
+def test_stagger_aiter():
+    from torequests.utils import stagger_iter
+
+    async def gen():
+        for index in range(6):
+            yield index
+
+    async def test():
+        return [
+            item async for item in stagger_iter(
+                gen(), lambda i: i % 2, weights=lambda group: group + 1)
+        ]
+
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(test()) == [0, 1, 3, 2, 5, 4]
+    loop.close()
+
+
+def test_loop_executors():
+    loop = Loop()
+
+    async def test():
+        pool = loop.get_executor(kind='thread', size=2)
+        assert await loop.run_in_thread_pool(None, abs, -1) == 1
+        assert loop.get_executor() is pool
+        assert await loop.map_in_executor(abs, range(-5, 5),
+                                          chunksize=3) == [
+                                              5, 4, 3, 2, 1, 0, 1, 2, 3, 4
+                                          ]
+        result = await loop.map_in_executor(abs, range(-100, 0),
+                                            kind='process',
+                                            size=2)
+        assert result == list(range(100, 0, -1))
+        assert len(loop._executors) == 2
+        return pool
+
+    pool = loop.loop.run_until_complete(test())
+    loop.shutdown_executors()
+    assert pool._shutdown and not loop._executors
+
+
 def test_coros(capsys):
     with capsys.disabled():
 
@@ -295,3 +703,96 @@ def test_workshop():
 
     loop = asyncio.get_event_loop()
     loop.run_until_complete(_test())
+
+
+def test_mock_server_profiles(mock_server):
+    from torequests.aiohttp_dummy import Requests as AiohttpRequests
+
+    async def test():
+        async with Requests() as req:
+            resp = await req.get(mock_server + '/')
+            assert resp.text == 'ok'
+            resp = await req.get(mock_server + '/?size=200k&encoding=gzip')
+            assert resp.headers['Content-Encoding'] == 'gzip'
+            assert len(resp.content) == 200 * 1024
+            start = time.time()
+            resp = await req.get(mock_server +
+                                 '/?size=40&chunk_size=10&drip=0.05')
+            assert len(resp.content) == 40
+            assert time.time() - start >= 0.15
+            resp = await req.get(mock_server +
+                                 '/?error_rate=1&error_status=429&retry_after=2')
+            assert (resp.status_code, resp.headers['Retry-After']) == (429, '2')
+            resp = await req.get(mock_server + '/?reset_rate=1', retry=0)
+            assert not resp.ok
+            resp = await req.get(
+                mock_server + '/?reset_rate=1&size=1m&reset_after=10k',
+                retry=0)
+            assert not resp.ok
+        async with AiohttpRequests() as req:
+            resp = await req.get(mock_server + '/?size=1m&chunked=1')
+            assert len(resp.content) == 1024 * 1024
+            statuses = set()
+            for seed in range(20):
+                resp = await req.get(
+                    mock_server +
+                    '/?latency=uniform:0,0.01&error_rate=0.5&error_status=429,503&seed=%s'
+                    % seed)
+                statuses.add(resp.status_code)
+            assert statuses == {200, 429, 503}
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(test())
+    loop.close()
+
+
+def test_response_text_and_json_backend(local_server):
+    import json
+
+    import requests
+
+    from torequests.configs import Config, set_json_backend
+    from torequests.utils import find_jsons
+
+    calls = []
+
+    def loads(data):
+        calls.append(type(data))
+        return json.loads(data)
+
+    async def test():
+        async with Requests() as req:
+            resp = await req.get(local_server + '/?body=<meta charset="gbk">')
+            # sniffed from the first KB, the text is decoded only once
+            assert resp.encoding == 'gbk'
+            assert resp.text is resp.text
+            resp.encoding = 'utf-8'
+            assert resp.text == '<meta charset="gbk">'
+            resp = await req.get(local_server + '/?body={"a": "1"}')
+            assert resp.json() == {'a': '1'}
+            assert resp.json(loads=json.loads) == {'a': '1'}
+
+    assert set_json_backend(loads) == __name__
+    try:
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(test())
+        loop.close()
+        # parsed from the bytes
+        assert calls == [bytes]
+        resp = tPool().get(local_server + '/?body=[1, 2]').x
+        assert type(resp).__name__ == '_Response'
+        assert resp.history == [] and resp.json() == [1, 2]
+        assert calls[-1] is str
+        # the decode errors are the same as requests
+        try:
+            tPool().get(local_server + '/?body={x}').x.json()
+            raise AssertionError('should raise JSONDecodeError')
+        except requests.exceptions.JSONDecodeError as error:
+            assert isinstance(error, json.JSONDecodeError)
+        assert list(find_jsons('x{"a": 1}[1]{x}', return_as='object')) == [{
+            'a': 1
+        }, [1]]
+        assert len(calls) == 6
+    finally:
+        set_json_backend('json')
+    assert Config.json_loads is json.loads
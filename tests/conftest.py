@@ -0,0 +1,71 @@
+#! coding:utf-8
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """GET / POST return b'ok', `?sleep=0.1` to delay the response,
+    `?body=x` and the `X-Body` header are joined as the response body."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        query = dict(parse_qsl(urlparse(self.path).query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if 'sleep' in query:
+            time.sleep(float(query['sleep']))
+        body = (query.get('body', '') +
+                self.headers.get('X-Body', '')).encode('utf-8') or b'ok'
+        self.send_response(int(query.get('status', 200)))
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+def _wait_until(predicate, timeout=5, interval=0.01):
+    """Poll until predicate() is true, return False after timeout seconds."""
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+@pytest.fixture
+def wait_until():
+    """Poll with a deadline instead of a fixed sleep, which is flaky on a loaded CI."""
+    return _wait_until
+
+
+@pytest.fixture(scope='session')
+def local_server():
+    """Base url of a local http server for the tests without network."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%s' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='session')
+def mock_server():
+    """Base url of tests/mock_server.py, the behavior is set by the query."""
+    from .mock_server import run_in_thread
+    url, stop = run_in_thread()
+    yield url
+    stop()
@@ -1,14 +1,222 @@
-from starlette.applications import Starlette
-from starlette.responses import PlainTextResponse
+"""Mock server for the tests and benchmarks, returns 'ok' instantly by default.
 
-app = Starlette()
+The behavior can be set by the query of each request, or by the defaults of
+a json config file (`--config`), the query goes first:
 
+    latency: fixed seconds `0.1`, or a distribution `uniform:0.01,0.2`,
+        `normal:0.1,0.02`, `lognormal:-3,0.5`, `exp:0.1`.
+    size: body size, `512`, `10k`, `300m`, `1g`.
+    status: response status, default 200.
+    chunked: `1` for the chunked body, `chunk_size` default 64k.
+    drip: seconds to sleep between the chunks (slow body), implies chunked.
+    error_rate: rate of the errors, `error_status` like `429,503` (random
+        choice), with the header `Retry-After: {retry_after}` (default 1).
+    reset_rate: rate of resetting the connection, after `reset_after` bytes
+        of the body (default 0, before the response).
+    encoding: `gzip`, `deflate` or `br` (needs brotli) for the content encoding.
+    seed: seed of the random for this request.
 
-@app.route("/")
-async def source_redirect(req):
-    return PlainTextResponse('ok')
+    python tests/mock_server.py --port 8080 --config profile.json
+    curl 'http://127.0.0.1:8080/?latency=normal:0.1,0.02&size=1m&error_rate=0.1&error_status=429,503'
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import zlib
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'm': 1024**2, 'g': 1024**3}
+LATENCY_DISTRIBUTIONS = {
+    'uniform': lambda rand, a, b: rand.uniform(a, b),
+    'normal': lambda rand, mu, sigma: rand.normalvariate(mu, sigma),
+    'lognormal': lambda rand, mu, sigma: rand.lognormvariate(mu, sigma),
+    'exp': lambda rand, mean: rand.expovariate(1 / mean),
+}
+DEFAULT_PROFILE = {
+    'latency': '0',
+    'size': None,
+    'status': '200',
+    'chunked': '0',
+    'chunk_size': '64k',
+    'drip': '0',
+    'error_rate': '0',
+    'error_status': '503',
+    'retry_after': '1',
+    'reset_rate': '0',
+    'reset_after': '0',
+    'encoding': None,
+    'seed': None,
+}
+# the body is made by repeating this block, so huge bodies cost no memory
+BLOCK = b'0123456789abcdef' * 4096
+
+
+def parse_size(value):
+    """'10k' -> 10240"""
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([bkmg]?)\s*$', str(value).lower())
+    if not match:
+        raise ValueError('bad size: %r' % value)
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def sample_latency(value, rand):
+    """'0.1' or 'normal:0.1,0.02', the negative samples will be 0."""
+    if ':' not in value:
+        return max(float(value), 0)
+    name, args = value.split(':', 1)
+    args = [float(i) for i in args.split(',')]
+    return max(LATENCY_DISTRIBUTIONS[name](rand, *args), 0)
+
+
+def get_profile(query, defaults=None):
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(defaults or {})
+    profile.update((key, query[key]) for key in DEFAULT_PROFILE if key in query)
+    return profile
+
+
+def iter_body(size, chunk_size):
+    while size > 0:
+        length = min(size, chunk_size)
+        size -= length
+        yield (BLOCK * (length // len(BLOCK) + 1))[:length]
+
+
+def get_compressor(encoding):
+    if encoding == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if encoding == 'deflate':
+        return zlib.compressobj(6, zlib.DEFLATED, 15)
+    if encoding == 'br':
+        if brotli is None:
+            raise web.HTTPNotImplemented(text='brotli is not installed')
+        return brotli.Compressor()
+    raise web.HTTPBadRequest(text='unknown encoding: %s' % encoding)
+
+
+def compress(compressor, data, flush=False):
+    if hasattr(compressor, 'compress'):
+        result = compressor.compress(data)
+    else:
+        result = compressor.process(data)
+    if flush:
+        result += compressor.flush() if hasattr(
+            compressor, 'flush') else compressor.finish()
+    return result
+
+
+def reset(request):
+    transport = request.transport
+    if transport is not None:
+        transport.abort()
+
+
+async def handle(request):
+    profile = get_profile(request.query, request.app['defaults'])
+    rand = random.Random(profile['seed']) if profile['seed'] else random
+    if request.can_read_body:
+        await request.read()
+    latency = sample_latency(str(profile['latency']), rand)
+    if latency:
+        await asyncio.sleep(latency)
+    reset_after = parse_size(profile['reset_after'])
+    resetting = rand.random() < float(profile['reset_rate'])
+    if resetting and not reset_after:
+        reset(request)
+        return web.Response()
+    status = int(profile['status'])
+    headers = {'Content-Type': 'text/plain'}
+    if rand.random() < float(profile['error_rate']):
+        status = int(rand.choice(str(profile['error_status']).split(',')))
+        headers['Retry-After'] = str(profile['retry_after'])
+    if profile['size'] is None:
+        chunks = [b'ok']
+    else:
+        chunks = iter_body(parse_size(profile['size']),
+                           parse_size(profile['chunk_size']))
+    drip = float(profile['drip'])
+    chunked = drip or profile['chunked'] not in ('0', 0, False)
+    compressor = None
+    if profile['encoding']:
+        compressor = get_compressor(profile['encoding'])
+        headers['Content-Encoding'] = profile['encoding']
+    if not (chunked or compressor or resetting) and profile['size'] is None:
+        return web.Response(status=status, body=b'ok', headers=headers)
+    resp = web.StreamResponse(status=status, headers=headers)
+    if chunked or compressor:
+        resp.enable_chunked_encoding()
+    else:
+        resp.content_length = 2 if profile['size'] is None else parse_size(
+            profile['size'])
+    await resp.prepare(request)
+    sent = 0
+    for chunk in chunks:
+        if resetting and sent + len(chunk) >= reset_after:
+            await resp.write(chunk[:reset_after - sent])
+            reset(request)
+            return resp
+        sent += len(chunk)
+        if compressor:
+            chunk = compress(compressor, chunk)
+        if chunk:
+            await resp.write(chunk)
+        if drip:
+            await asyncio.sleep(drip)
+    if compressor:
+        await resp.write(compress(compressor, b'', flush=True))
+    await resp.write_eof()
+    return resp
+
+
+def create_app(defaults=None):
+    app = web.Application()
+    app['defaults'] = defaults or {}
+    app.router.add_route('*', '/{tail:.*}', handle)
+    return app
+
+
+def run_in_thread(defaults=None, host='127.0.0.1', port=0):
+    """Run the mock server in a daemon thread, return (base_url, stop_function)."""
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(create_app(defaults), access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, host, port)
+    loop.run_until_complete(site.start())
+    port = runner.addresses[0][1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    return 'http://%s:%s' % (host, port), stop
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, port=9090)
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9090)
+    parser.add_argument('--config',
+                        help='json file of the default profile, like {"latency": "exp:0.05"}')
+    args = parser.parse_args()
+    defaults = None
+    if args.config:
+        with open(args.config) as f:
+            defaults = json.load(f)
+    web.run_app(create_app(defaults),
+                host=args.host,
+                port=args.port,
+                access_log=None)
@@ -1,7 +1,9 @@
 #! coding:utf-8
 import sys
+from concurrent.futures import CancelledError
 
 import torequests
+from torequests.exceptions import FailureException
 from torequests.logs import print_info
 
 
@@ -71,6 +73,144 @@ def test_workshop():
     assert fc.run(as_completed=True) != list(range(1, 10))
 
 
+def test_compact_pool():
+    import time
+    from concurrent.futures import TimeoutError, as_completed
+    from torequests.main import CompactFuture, Pool
+
+    pool = Pool(2, compact=True, default_callback=lambda f: f.x * 10)
+
+    def work(i):
+        time.sleep(0.05)
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    tasks = [pool.submit(work, i) for i in range(5)]
+    assert all(isinstance(task, CompactFuture) for task in tasks)
+    assert not hasattr(tasks[0], '__dict__')
+    assert not pool.all_tasks
+    # pool.x waits for the pending counter in compact mode
+    assert pool.x == []
+    assert sorted(f.x for f in as_completed(tasks[:3])) == [0, 1, 2]
+    assert tasks[1].cx == 10
+    assert isinstance(tasks[3].x, FailureException)
+    assert tasks[4].task_cost_time > 0
+    timeout_task = Pool(1, timeout=0.01, compact=True).submit(time.sleep, 0.5)
+    assert isinstance(timeout_task.x, FailureException)
+    # each waiter waits on an Event of its own future, removed after timeout
+    from threading import Event
+    release = Event()
+    slow_pool = Pool(2, compact=True)
+    slow_task = slow_pool.submit(release.wait, 5)
+    fast_task = slow_pool.submit(time.sleep, 0.01)
+    try:
+        slow_task.result(timeout=0.05)
+        raise AssertionError('should raise TimeoutError')
+    except TimeoutError:
+        pass
+    assert not slow_task._events
+    assert fast_task.result(timeout=5) is None
+    release.set()
+    assert slow_task.result(timeout=5) is True
+    assert slow_pool._compact_group.wait_all(5) == 0
+
+
+def test_autoscale_pool(wait_until):
+    from threading import Event
+    from torequests.main import tPool
+
+    req = tPool(4, min_workers=1, keepalive=0.2)
+    adapter = req.session.get_adapter('http://')
+    pool_kw = adapter.poolmanager.connection_pool_kw
+    assert req.pool.workers == 1
+    release = Event()
+    tasks = [req.pool.submit(release.wait, 5) for _ in range(8)]
+    assert wait_until(lambda: req.pool.workers == 4)
+    assert pool_kw['maxsize'] == 4
+    release.set()
+    assert all(task.x is True for task in tasks)
+    # shrink to min_workers after keepalive
+    assert wait_until(
+        lambda: req.pool.workers == 1 and pool_kw['maxsize'] == 1)
+    assert req.pool.submit(lambda: 1).x == 1
+    req.close(wait=True)
+    assert req.pool.workers == 0
+
+
+def test_tPool_host_frequencies():
+    import time
+    from torequests.main import tPool
+
+    # two closed ports as two hosts, fail fast without network
+    slow_url, fast_url = 'http://127.0.0.1:1/', 'http://127.0.0.1:2/'
+    req = tPool(2, frequencies={'127.0.0.1:1': (1, 0.6)})
+    start = time.time()
+    slow_tasks = [req.get(slow_url) for _ in range(3)]
+    fast_task = req.get(fast_url)
+    # the waiting requests of the slow host do not hold the threads
+    assert isinstance(fast_task.x, FailureException)
+    assert time.time() - start < 0.5
+    req.x
+    end_times = sorted(task.task_end_time for task in slow_tasks)
+    assert end_times[1] - end_times[0] > 0.55
+    assert end_times[2] - end_times[1] > 0.55
+    assert req.get_frequency(fast_url) is req.frequency
+    assert req.set_frequency('127.0.0.1:2', 1, 1).to_list() == [1, 1]
+    # tasks not ready yet are cancelled while closing
+    waiting = [req.get(fast_url) for _ in range(2)]
+    req.close()
+    assert isinstance(waiting[1].x.error, CancelledError)
+
+
+def test_tPool_proxy_pool(local_server):
+    from torequests.main import tPool
+    from torequests.utils import ProxyPool
+
+    # the local server responds any absolute url, works as a http proxy
+    bad_proxy, good_proxy = '127.0.0.1:1', local_server.split('://')[1]
+    proxy_pool = ProxyPool([bad_proxy, good_proxy],
+                           max_failures=1,
+                           eject_seconds=60)
+    req = tPool(2, proxy_pool=proxy_pool)
+    # retry with the other proxy
+    tasks = [req.get('http://example.invalid/', retry=1) for _ in range(2)]
+    assert [task.x.text for task in tasks] == ['ok', 'ok']
+    stats = proxy_pool.stats
+    assert stats[bad_proxy]['failure'] == 1
+    assert stats[bad_proxy]['ejected'] == 1
+    assert stats[good_proxy]['success'] == 2
+    assert stats[good_proxy]['latency'] > 0
+    # the bad proxy is ejected
+    assert req.get('http://example.invalid/').x.text == 'ok'
+    assert proxy_pool.stats[bad_proxy]['failure'] == 1
+    # no proxy available
+    proxy_pool.remove_proxy(good_proxy)
+    proxy_pool.timeout = 0.1
+    failure = req.get('http://example.invalid/').x
+    assert isinstance(failure, FailureException)
+    assert failure.name == 'ProxyUnavailable'
+    req.close()
+
+
+def test_lazy_imports():
+    import os
+    import subprocess
+    code = '''
+import sys
+import torequests, torequests.utils, torequests.crawlers
+print(sorted(m for m in ('requests', 'aiohttp') if m in sys.modules))
+torequests.tPool
+print(sorted(m for m in ('requests', 'aiohttp') if m in sys.modules))
+'''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=root).decode('utf-8')
+    assert output.split() == ['[]', "['requests']"]
+    assert torequests.tPool is torequests.main.tPool
+    assert 'tPool' in dir(torequests)
+
+
 # ================================= PYTHON 3 only ========================
 
 PY3 = sys.version_info[0] == 3
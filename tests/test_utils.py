@@ -74,6 +74,78 @@ https://www.google.com'''
     assert args.get('method') == 'post'
 
 
+def test_curlparse_fast_parser():
+    from torequests.utils import _Curl
+
+    curl = r"""curl 'http://a.com/x' -X 'POST' -H 'a: b' -H $'c: \'d\'' -b 'e=f' --data-raw '{"a": 1}' -m 3 --insecure"""
+    args_list = _Curl.split(curl)
+    assert args_list[7] == "c: 'd'"
+    fast_args = _Curl._fast_parse_args(args_list)
+    assert fast_args == _Curl.parser.parse_known_args(args_list)
+    # the uncommon args fallback to argparse
+    assert _Curl._fast_parse_args(_Curl.split('curl -sSL http://a.com')) is _Curl._fallback
+    assert curlparse('curl http://a.com --comp -H a:b')['headers'] == {'A': 'b'}
+    # cached results are copied
+    result = curlparse(curl)
+    result['headers']['a'] = 'changed'
+    assert curlparse(curl)['headers'] == {'A': 'b', 'C': "'d'"}
+    assert curlparse(curl, cache=False) == curlparse(curl)
+
+
+def test_iter_requests(tmp_path):
+    import json
+
+    har = {
+        'log': {
+            'entries': [{
+                'request': {
+                    'method': 'POST',
+                    'url': 'https://a.com/post?a=1',
+                    'headers': [{'name': ':authority', 'value': 'a.com'},
+                                {'name': 'content-type', 'value': 'text/plain'},
+                                {'name': 'content-length', 'value': '4'}],
+                    'postData': {'mimeType': 'text/plain', 'text': 'test'},
+                }
+            }, {
+                'request': {'method': 'GET', 'url': 'https://a.com/', 'headers': []}
+            }]
+        }
+    }
+    har_path = tmp_path / 'session.har'
+    har_path.write_text(json.dumps(har))
+    assert list(iter_requests(str(har_path))) == [{
+        'method': 'post',
+        'url': 'https://a.com/post?a=1',
+        'headers': {'Content-Type': 'text/plain'},
+        'data': b'test'
+    }, {
+        'method': 'get',
+        'url': 'https://a.com/'
+    }]
+    curl_path = tmp_path / 'requests.txt'
+    curl_path.write_text("""# comment
+curl 'https://a.com/1' \\
+  -H 'a: b' ;
+curl 'https://a.com/2' --data-raw '{
+  "a": 1
+}'
+
+https://a.com/3
+""")
+    assert list(iter_requests(str(curl_path))) == [{
+        'url': 'https://a.com/1',
+        'headers': {'A': 'b'},
+        'method': 'get'
+    }, {
+        'url': 'https://a.com/2',
+        'data': b'{\n  "a": 1\n}',
+        'method': 'post'
+    }, {
+        'url': 'https://a.com/3',
+        'method': 'get'
+    }]
+
+
 def test_slice_by_size():
     assert list(slice_by_size(range(10), 6)) == [
         (0, 1, 2, 3, 4, 5),
@@ -263,6 +335,47 @@ def test_unique():
                        list(range(5)))) == [4, 3, 2, 1, 0]
 
 
+def test_unique_backends(tmp_path):
+    urls = ['http://a.com/?b=2&a=1', 'http://a.com/?a=1&b=2', 'http://a.com/1']
+    bf = BloomFilter(capacity=1000, error_rate=0.001, normalize_url=True)
+    assert list(unique(urls, backend=bf)) == [urls[0], urls[2]]
+    assert urls[1] in bf and 'http://a.com/2' not in bf
+    assert len(bf) == 2
+    bf_path = str(tmp_path / 'seen.bloom')
+    bf.save(bf_path)
+    assert not BloomFilter.load(bf_path).add(urls[2])
+    # false positive rate
+    bf = BloomFilter(capacity=10000, error_rate=0.01)
+    assert sum(bf.add(i) for i in range(10000)) > 9900
+    assert sum(i in bf for i in range(10000, 20000)) < 300
+    assert unique([1, 2, 1], backend='bloom', return_as=list) == [1, 2]
+    # normalize_url works for every backend
+    for backend in (None, 'bloom', BloomFilter()):
+        assert unique(urls, backend=backend, normalize_url=True,
+                      return_as=list) == [urls[0], urls[2]]
+    assert unique(urls, key=str.upper, backend='bloom', normalize_url=True,
+                  return_as=list) == [urls[0], urls[2]]
+    # on-disk exact set, reloaded between runs
+    db_path = str(tmp_path / 'seen.sqlite')
+    with DiskSet(db_path, normalize_url=True, commit_interval=2) as seen:
+        assert unique(urls, key=str.upper, backend=seen, return_as=list) == [
+            urls[0], urls[2]
+        ]
+    with DiskSet(db_path, normalize_url=True) as seen:
+        assert len(seen) == 2
+        assert 'HTTP://A.COM/1' in seen
+        assert list(
+            unique(urls + ['http://a.com/2'], key=str.upper,
+                   backend=seen)) == ['http://a.com/2']
+    # the uncommitted keys are committed while garbage collected
+    seen = DiskSet(db_path, commit_interval=100)
+    assert seen.add('http://a.com/3')
+    del seen
+    seen = DiskSet(db_path)
+    assert 'http://a.com/3' in seen
+    seen.close()
+
+
 def test_regex():
     reg = Regex()
 
@@ -280,6 +393,40 @@ def test_regex():
     assert len(reg.search("non-http://helloworld2")) == 2
 
 
+def test_regex_compiled():
+    patterns = [
+        (r"^https?://www\.a\.com/item/\d+", 0),
+        (r"//m\.a\.(com|net)/list", 0),
+        (r"http.*HELLOWORLD", re.I),
+        (r"a|b", 0),
+        (r"(?i)STRASSE", 0),
+        (r"x(abc)?yzz", 0),
+    ]
+    strings = [
+        "https://www.a.com/item/1", "http://m.a.net/list", "ftp://m.a.com/list",
+        "http://helloworld", "non-http://HelloWorld", "ccc", "xyzz",
+        "xabcyzz", "stra\u017f\u017fe", "", "http://www.a.com/item/x"
+    ]
+    regs = [Regex(compiled=compiled) for compiled in (False, True)]
+    for index, (pattern, flags) in enumerate(patterns):
+        for reg in regs:
+            reg.register(pattern, "obj%s" % index, flags=flags)
+    for string in strings:
+        results = [(reg.match(string), reg.search(string), reg.find(string))
+                   for reg in regs]
+        assert results[0] == results[1], string
+    assert "obj4" in regs[1].search("stra\u017f\u017fe")
+    # ensure_mapping only checks the new pattern
+    reg = Regex(ensure_mapping=True, compiled=True)
+    reg.register(r"^http://a\.com/\d+", "a", instances="http://a.com/1")
+    reg.register(r"^http://b\.com/\d+", "b", instances=["http://b.com/1"])
+    try:
+        reg.register(r"com/1", "c")
+        raise AssertionError("should raise one-to-many AssertionError")
+    except AssertionError as error:
+        assert "matches more than one pattern" in str(error)
+
+
 def test_clean_request():
     from torequests.crawlers import CleanRequest
 
@@ -289,6 +436,89 @@ def test_clean_request():
     assert c.x == {"url": "https://p.3.cn", "method": "get"}
 
 
+def test_clean_request_group(local_server):
+    from copy import deepcopy
+    from torequests.crawlers import CleanRequest
+
+    headers = dict(('X-%s' % i, str(i)) for i in range(60))
+    headers['X-Body'] = 'y'
+    headers['Cookie'] = 'a=1; b=2'
+    request = {
+        'method': 'post',
+        'url': local_server + '/?a=1&body=x&b=2&c=3',
+        'headers': headers,
+        'data': {'d': 1, 'e': 2},
+    }
+    results = {}
+    for strategy in ('group', None):
+        kwargs = {'strategy': strategy} if strategy else {}
+        c = CleanRequest(deepcopy(request),
+                         logger_function=lambda text: None,
+                         **kwargs)
+        # 'field' by default
+        results[c.strategy] = (c.x, c.probes)
+    expect = {
+        'method': 'post',
+        'url': local_server + '/?body=x',
+        'headers': {'X-Body': 'y'},
+    }
+    assert results['group'][0] == results['field'][0] == expect
+    # 60 + 1 headers, 4 qsl, 2 form keys, 1 total data, the Cookie is not necessary
+    assert results['field'][1] == 68
+    assert results['group'][1] < 34
+    try:
+        CleanRequest(local_server, strategy='binary')
+        raise AssertionError('should raise ValueError for unknown strategy')
+    except ValueError:
+        pass
+
+
+def test_fingerprinters(local_server):
+    from torequests.crawlers import (CleanRequest, JsonStructureHash, MinHash,
+                                     SimHash, StreamingHash)
+    from torequests.utils import md5
+
+    text = ' '.join('word%s' % i for i in range(100))
+    for fingerprinter in (SimHash(), MinHash()):
+        fp = fingerprinter.hash_text(text)
+        assert fingerprinter.similarity(fp, fp) == 1
+        assert fingerprinter.similarity(
+            fp, fingerprinter.hash_text(text + ' nonce 1')) > 0.9
+        assert fingerprinter.similarity(
+            fp, fingerprinter.hash_text('another page')) < 0.7
+    content = b'a' * 10 + b'b' * 10
+    assert StreamingHash(chunk_size=3).hash_chunks([content]) == '%s-20' % md5(
+        content, n=8, skip_encode=True)
+    assert StreamingHash(max_size=10).hash_chunks(
+        [b'a' * 5, b'a' * 5, b'c' * 10]) == StreamingHash().hash_chunks(
+            [b'a' * 10])[:-2] + '20'
+    json_hash = JsonStructureHash()
+    assert json_hash.hash_json({'a': [1, {'Timestamp': 1}]}) == json_hash.hash_json(
+        {'a': [1, {'Timestamp': 2}]})
+    assert json_hash.hash_json({'a': 1}) != json_hash.hash_json({'a': 2})
+    assert JsonStructureHash(keep_values=False).hash_json(
+        {'a': 1}) == JsonStructureHash(keep_values=False).hash_json({'a': 2})
+
+    # the X-Body header only appends a nonce to the long body
+    request = {
+        'method': 'get',
+        'url': local_server + '/?body=' + text.replace(' ', '+'),
+        'headers': {'X-Body': ' nonce 1', 'X-A': '1'},
+    }
+    c = CleanRequest(dict(request), logger_function=lambda text: None)
+    assert c.x['headers'] == {'X-Body': ' nonce 1'}
+    c = CleanRequest(dict(request),
+                     fingerprinter='simhash',
+                     threshold=0.8,
+                     logger_function=lambda text: None)
+    assert 'headers' not in c.x
+    try:
+        CleanRequest(local_server, fingerprinter='sha1')
+        raise AssertionError('should raise ValueError for unknown fingerprinter')
+    except ValueError:
+        pass
+
+
 def test_failure():
     from torequests.exceptions import FailureException
 
@@ -413,6 +643,135 @@ def test_ensure_request():
             ss._shutdown()
 
 
+def test_saver_journal():
+    import json
+    import os
+    import time
+    path = "test_journal.json"
+    ss = Saver(path, journal=True, journal_max_size=200)
+    try:
+        ss.a = 1
+        ss._update({"b": 2, "c": 3})
+        del ss["b"]
+        # the mutations only append records to the journal
+        with open(path) as f:
+            assert f.read() == "{}"
+        assert os.path.getsize(ss._journal_path) > 0
+        ss._reload()
+        assert ss._cache == {"a": 1, "c": 3}
+        assert not os.path.isfile(ss._journal_path)
+        # compact in background while the journal is larger than journal_max_size
+        for i in range(20):
+            ss["key_%s" % i] = i
+        for _ in range(50):
+            if not ss._compacting:
+                break
+            time.sleep(0.1)
+        with open(path) as f:
+            assert len(f.read()) > 20
+        ss._reload()
+        assert len(ss) == 22 and ss.key_19 == 19
+    finally:
+        ss._shutdown()
+        Saver._instances.pop(path, None)
+    # the records in one flush_interval are written with one fsync
+    ss = Saver(path, journal=True, flush_interval=0.2)
+    try:
+        for i in range(10):
+            ss[str(i)] = i
+        assert not os.path.isfile(ss._journal_path)
+
+        def journal_lines():
+            if not os.path.isfile(ss._journal_path):
+                return 0
+            with open(ss._journal_path) as f:
+                return len(f.readlines())
+
+        for _ in range(100):
+            if journal_lines() == 10:
+                break
+            time.sleep(0.05)
+        assert journal_lines() == 10
+        ss._reload()
+        assert ss._cache == {str(i): i for i in range(10)}
+        # BORG: init the same path again keeps the buffered records
+        ss.buffered = 1
+        assert Saver(path, journal=True, flush_interval=0.2).buffered == 1
+        # flushed and replayed into the file by the reload
+        with open(path) as f:
+            assert '"buffered"' in f.read()
+        # the old journal of a failed compaction is merged, not overwritten
+        with open(ss._journal_path + ".old", "w") as f:
+            f.write('["set", "old", 1]\n')
+        ss._flush_interval = 0
+        ss._journal_max_size = 0
+        ss._compact = lambda snapshot: None
+        ss.new = 2
+        with open(ss._journal_path + ".old") as f:
+            lines = f.read().splitlines()
+        assert lines[0] == '["set", "old", 1]' and lines[-1] == '["set", "new", 2]'
+        object.__delattr__(ss, "_compact")
+        ss._compacting = False
+        ss._reload()
+        assert ss.old == 1 and ss.new == 2 and ss.buffered == 1
+        # reloading waits for the running compaction of an older snapshot
+        compact = ss._compact
+        ss._compact = lambda snapshot: time.sleep(0.3) or compact(snapshot)
+        ss.before = 1
+        assert ss._compacting
+        ss._journal_max_size = 1024 * 1024
+        ss.after = 2
+        Saver(path, journal=True, journal_max_size=1024 * 1024)
+        assert not ss._compacting
+        object.__delattr__(ss, "_compact")
+        with open(path) as f:
+            cache = json.load(f)
+        assert cache["before"] == 1 and cache["after"] == 2
+        assert not os.path.isfile(ss._journal_path + ".old")
+    finally:
+        ss._shutdown()
+        Saver._instances.pop(path, None)
+
+
+def _saver_sqlite_worker(path, index):
+    ss = Saver(path, save_mode="sqlite")
+    ss._update({"%s_%s" % (index, i): i for i in range(50)})
+    for i in range(20):
+        ss["single_%s_%s" % (index, i)] = [index, i]
+
+
+def test_saver_sqlite():
+    from multiprocessing import Process
+    path = "test_saver.db"
+    ss = Saver(path, save_mode="sqlite")
+    try:
+        ss.a = {"b": [1, 2]}
+        ss._update({"c": 3, "d": 4})
+        assert ss.a == ss["a"] == {"b": [1, 2]}
+        assert ss.not_exist is None
+        assert "c" in ss and len(ss) == 3
+        assert ss._pop("c") == 3 and ss._pop("c", 0) == 0
+        del ss.d
+        assert dict(ss._items()) == {"a": {"b": [1, 2]}}
+        # concurrent writers from several processes
+        workers = [
+            Process(target=_saver_sqlite_worker, args=(path, index))
+            for index in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert len(ss) == 1 + 3 * 70
+        assert ss["single_2_19"] == [2, 19]
+        assert ss._popitem()
+        ss._clear()
+        assert not ss
+    finally:
+        ss._shutdown()
+        Saver._instances.pop(path, None)
+
+
 def test_find_one():
     string = "abcd"
     assert find_one("a.*", string)[0] == "abcd"
@@ -443,6 +802,93 @@ def test_cooldown():
     assert cd.all_items == [1, 2]
 
 
+def test_cooldown_heap():
+    cd = Cooldown(range(10), interval=0.2)
+    assert cd.remove_items([0, 1, 2]) == 7
+    assert cd.all_items == [3, 4, 5, 6, 7, 8, 9]
+    assert [cd.get(0) for _ in range(7)] == [3, 4, 5, 6, 7, 8, 9]
+    assert cd.get(0, 'default') == 'default'
+    # update_item resets the use_at, so 5 will be ready at first
+    assert cd.update_item(5, time.time() - 1)
+    assert not cd.update_item(100)
+    assert cd.get(0, exclude={5}) is None
+    assert cd.get(0) == 5
+    # get sleeps until the next item is ready
+    start = time.time()
+    assert cd.get(1) == 3
+    assert 0.1 < time.time() - start < 1
+    assert cd.get(1, exclude={4}) == 6
+    # duplicated items are kept
+    cd.add_item(3)
+    assert cd.size == 8
+    assert cd.remove_item(3) == 6
+    # unhashable items, removed by equality like the old versions
+    accounts = [{'user': 'a'}, {'user': 'b'}, {'user': 'a'}]
+    cd = Cooldown(accounts, interval=1)
+    assert [cd.get(0) for _ in range(3)] == accounts
+    assert cd.get(0) is None
+    assert cd.update_item({'user': 'b'}, time.time() - 1)
+    assert cd.get(0) is accounts[1]
+    # the snapshot queue of TimeItem
+    assert [item.data for item in cd.queue.queue] == [
+        accounts[0], accounts[2], accounts[1]
+    ]
+    assert cd.queue.qsize() == 3
+    assert cd.remove_item({'user': 'a'}) == 1
+    assert cd.all_items == [accounts[1]]
+
+
+def test_async_cooldown():
+    import asyncio
+    import threading
+    from torequests.dummy import AsyncCooldown
+
+    async def test():
+        cd = AsyncCooldown([1, 2], interval=0.2)
+        assert [await cd.get(0), await cd.get(0)] == [1, 2]
+        assert await cd.get(0, 'default') == 'default'
+        start = time.time()
+        assert [await cd.get(1), await cd.get(1)] == [1, 2]
+        assert 0.1 < time.time() - start < 1
+        # wake up once a new item is added, before the timeout returns None
+        asyncio.get_event_loop().call_later(0.05, cd.add_item, 3)
+        assert await cd.get(5) == 3
+        # wake up by the items added from other threads
+        timer = threading.Timer(0.05, cd.add_item, (4,))
+        timer.start()
+        assert await cd.get(5) == 4
+
+    asyncio.get_event_loop().run_until_complete(test())
+
+
+def test_proxy_pool():
+    proxy_pool = ProxyPool(['a', 'b', 'c'], interval=1, max_failures=2)
+    # the same scores, the one waited the longest first
+    assert proxy_pool.get(0) == 'a'
+    proxy_pool.cooldown.update_item('a', 0)
+    proxy_pool.report('a', False, 0.1)
+    proxy_pool.report('b', True, 0.5)
+    proxy_pool.report('c', True, 0.1)
+    # ordered by the success rate and latency of the ready proxies
+    assert [proxy_pool.get(0) for _ in range(4)] == ['c', 'b', 'a', None]
+    assert proxy_pool.get(0, exclude={'c'}) is None
+    assert proxy_pool.blocking_timeout == proxy_pool.max_blocking_timeout
+    proxy_pool.timeout = 0.1
+    assert proxy_pool.blocking_timeout == 0.1
+    proxy_pool.add_proxy('c')
+    assert proxy_pool.size == 3
+    # only the first max_choices ready proxies are compared, for a large pool
+    proxy_pool = ProxyPool(range(20000), max_choices=8)
+    choices = []
+    choose = proxy_pool._choose
+    proxy_pool._choose = lambda proxies: choices.append(len(proxies)) or choose(
+        proxies)
+    start = time.time()
+    assert [proxy_pool.get(0) for _ in range(2000)] == list(range(2000))
+    assert max(choices) == 8
+    assert time.time() - start < 1
+
+
 def test_curlrequests():
     r = curlrequests(
         '''curl 'https://httpbin.org/get' -H 'Connection: keep-alive' -H 'Cache-Control: max-age=0' -H 'DNT: 1' -H 'Upgrade-Insecure-Requests: 1' -H 'User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/77.0.3865.120 Safari/537.36' -H 'Sec-Fetch-Mode: navigate' -H 'Sec-Fetch-User: ?1' -H 'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3' -H 'Sec-Fetch-Site: none' -H 'Accept-Encoding: gzip, deflate, br' -H 'Accept-Language: zh-CN,zh;q=0.9' --compressed''',
@@ -559,6 +1005,37 @@ def test_find_jsons():
                    }]]
 
 
+def test_iter_jsons():
+    # brackets inside the strings, the JSON inside invalid brackets
+    assert list(find_jsons('a[ {"a": "]"} , x] "q {"b":[1]} [[[ {"c":1}')) == [
+        '{"a": "]"}', '{"b":[1]}', '{"c":1}'
+    ]
+    assert list(find_jsons('{"a": "x\n{"b": 1}', return_as='index')) == [(9, 17)]
+    chunks = [b'xx{"a": "\\', b'"}", "b": "\xe4', b'\xb8\xad"}[1,', b'2]']
+    assert list(iter_jsons(chunks, return_as='object')) == [{
+        'a': '"}',
+        'b': u'\u4e2d'
+    }, [1, 2]]
+    scanner = JsonScanner(return_as='index')
+    assert scanner.feed('[1, {"a": ') == []
+    assert scanner.feed('1}') == []
+    assert scanner.feed(']{"b": [') == [(0, 13)]
+    # the JSON inside unclosed brackets
+    assert scanner.feed('2]') == []
+    assert scanner.close() == [(19, 22)]
+    # an unclosed bracket is dropped after max_size
+    scanner = JsonScanner(return_as='object', max_size=20)
+    assert scanner.feed('{"bad": [1], ') == []
+    assert scanner.feed('x' * 20) == [[1]]
+    assert scanner._chunks == [] and scanner._stack == []
+    assert scanner.feed('{"a": 1}') == [{'a': 1}]
+    # the inner brackets are kept
+    scanner = JsonScanner(return_as='index', max_size=10)
+    assert scanner.feed('{xxxxxxxx[1, ') == []
+    assert scanner.feed('2]') == [(9, 15)]
+    assert scanner.close() == []
+
+
 def test_update_url():
     assert update_url(
         'http://httpbin.org/get?a=1&b=2',
@@ -579,3 +1056,29 @@ def test_stagger_sort():
             group_key=lambda i: i[0],
         ))
     assert result == [('a', 0), ('b', 0), ('a', 1), ('b', 1), ('a', 2)], result
+
+
+def test_stagger_iter():
+    items = [('a', 0), ('b', 0), ('a', 1), ('a', 2), ('b', 1), ('c', 0)]
+    group_key = lambda i: i[0]
+    assert list(stagger_iter(items, group_key)) == [('a', 0), ('b', 0),
+                                                    ('c', 0), ('a', 1),
+                                                    ('b', 1), ('a', 2)]
+    assert list(stagger_iter(items, group_key, weights={'a': 2})) == [
+        ('a', 0), ('a', 1), ('b', 0), ('c', 0), ('a', 2), ('b', 1)
+    ]
+    # the same result as stagger_sort
+    items = [(index % 7, index) for index in range(100)]
+    assert list(stagger_iter(items, group_key)) == list(
+        stagger_sort(items, group_key, sort_key=group_key))
+    # bounded window
+    pending = []
+
+    def gen():
+        for item in items:
+            pending.append(item)
+            yield item
+
+    for item in stagger_iter(gen(), group_key, window=10):
+        pending.remove(item)
+        assert len(pending) <= 10
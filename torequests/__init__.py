@@ -1,8 +1,6 @@
 #! coding: utf-8
 import logging
-from .main import (Async, NewFuture, Pool, ProcessPool, delete,
-                   disable_warnings, get, get_results_generator, head, options,
-                   patch, post, put, request, run_after_async, threads, tPool)
+import sys
 
 __all__ = [
     "Pool", "ProcessPool", "NewFuture", "Async", "threads",
@@ -11,3 +9,24 @@ __all__ = [
 ]
 __version__ = '6.0.0'
 logging.getLogger("torequests").addHandler(logging.NullHandler())
+
+if sys.version_info >= (3, 7):
+    # PEP 562, `import torequests` will not import requests / urllib3 until
+    # the names of main are used.
+
+    def __getattr__(name):
+        if name in __all__:
+            from . import main
+            value = getattr(main, name)
+            globals()[name] = value
+            return value
+        raise AttributeError("module %r has no attribute %r" %
+                             (__name__, name))
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
+else:
+    from .main import (Async, NewFuture, Pool, ProcessPool, delete,
+                       disable_warnings, get, get_results_generator, head,
+                       options, patch, post, put, request, run_after_async,
+                       threads, tPool)
@@ -0,0 +1,132 @@
+# aiohttp patches, imported by dummy and aiohttp_dummy only, to keep aiohttp
+# (and the uvloop policy) out of the other entry points.
+import codecs
+import re
+from logging import getLogger
+
+from aiohttp import ClientResponse
+
+from .configs import loads_bytes
+
+logger = getLogger("torequests")
+# the longer BOM first, utf-32-le starts with the BOM of utf-16-le
+BOMS = ((codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16'))
+CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+META_CHARSET_RE = re.compile(
+    br'<meta[^>]+charset=["\']?([\w.:-]+)|<\?xml[^>]+encoding=["\']([\w.:-]+)',
+    re.I)
+
+try:
+    import uvloop
+    from asyncio import set_event_loop_policy
+    set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    logger.debug("Not found uvloop, using the default event loop.")
+
+
+class NewResponse(ClientResponse):
+    """Wrap aiohttp's ClientResponse like requests's Response."""
+    # 'strict' / 'ignore' / 'replace'
+    DEFAULT_DECODE_ERRORS = 'strict'
+    referer_info = None
+
+    def __init__(self, method, url, **kwargs) -> None:
+        # the keyword arguments differ between aiohttp versions (writer / stream_writer ...)
+        self._encoding = None
+        self._text = None
+        super().__init__(method, url, **kwargs)
+
+    @property
+    def url(self):
+        return self._url
+
+    @property
+    def status_code(self):
+        return self.status
+
+    def __repr__(self):
+        return "<%s [%s]>" % (self.__class__.__name__, self.status)
+
+    def __bool__(self):
+        return self.ok
+
+    def __iter__(self):
+        """Allows you to use a response as an iterator."""
+        return self.iter_content(128)
+
+    @property
+    def ok(self):
+        return self.status in range(200, 400)
+
+    @property
+    def is_redirect(self):
+        """True if this Response is a well-formed HTTP redirect that could have
+        been processed automatically (by :meth:`Session.resolve_redirects`).
+        """
+        return "location" in self.headers and self.status in range(300, 400)
+
+    @property
+    def encoding(self):
+        if not self._encoding:
+            self._encoding = self.guess_encoding()
+        return self._encoding
+
+    @encoding.setter
+    def encoding(self, encoding):
+        self._encoding = encoding
+        self._text = None
+        return encoding
+
+    @staticmethod
+    def _lookup(encoding):
+        if isinstance(encoding, bytes):
+            encoding = encoding.decode('ascii', 'ignore')
+        try:
+            return codecs.lookup(encoding).name
+        except LookupError:
+            return None
+
+    def guess_encoding(self):
+        """The charset of Content-Type, the BOM, utf-8 for JSON, the charset of
+        <meta> / <?xml> in the first 1KB, then the get_encoding of aiohttp."""
+        content_type = self.headers.get('Content-Type', '')
+        match = CHARSET_RE.search(content_type)
+        if match and self._lookup(match.group(1)):
+            return self._lookup(match.group(1))
+        body = self._body or b''
+        for bom, encoding in BOMS:
+            if body.startswith(bom):
+                return encoding
+        if 'json' in content_type.lower():
+            return 'utf-8'
+        match = META_CHARSET_RE.search(body[:1024])
+        if match and self._lookup(match.group(1) or match.group(2)):
+            return self._lookup(match.group(1) or match.group(2))
+        return self.get_encoding()
+
+    @property
+    def text(self):
+        """Decoded only once, reset by setting the encoding."""
+        if self._text is None:
+            self._text = self._body.decode(self.encoding,
+                                           self.DEFAULT_DECODE_ERRORS)
+        return self._text
+
+    def json(self, encoding=None, loads=None):
+        """Parse the body by the JSON backend of `torequests.configs.set_json_backend`,
+        the UTF-8 body is parsed as bytes without decoding."""
+        if loads is not None:
+            return loads(
+                self._body.decode(encoding or self.encoding,
+                                  errors=self.DEFAULT_DECODE_ERRORS))
+        return loads_bytes(self._body, encoding or self.encoding,
+                           self.DEFAULT_DECODE_ERRORS)
+
+    def release(self) -> None:
+        super().release()
+        # set content as bytes
+        setattr(self, 'content', self._body)
+        # set url as string
+        setattr(self, '_url', str(self._url))
@@ -2,12 +2,9 @@
 import asyncio
 from functools import wraps
 from inspect import isawaitable
-from json import loads
 from logging import getLogger
 from typing import Coroutine, Tuple, Type
 
-from aiohttp import ClientResponse
-
 # python3.7+ 's asyncio.all_tasks'
 try:
     _py36_all_task_patch = asyncio.all_tasks
@@ -17,12 +14,29 @@ except (ImportError, AttributeError):
 logger = getLogger("torequests")
 NotSet = object()
 
-try:
-    import uvloop
-    from asyncio import set_event_loop_policy
-    set_event_loop_policy(uvloop.EventLoopPolicy())
-except ImportError:
-    logger.debug("Not found uvloop, using the default event loop.")
+
+def __getattr__(name):
+    # NewResponse is moved to _aiohttp_patch, which imports aiohttp
+    if name == 'NewResponse':
+        from ._aiohttp_patch import NewResponse
+        return NewResponse
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def _set_event(loop, event):
+    """Set the asyncio.Event of the loop, from any thread."""
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        event.set()
+        return
+    try:
+        loop.call_soon_threadsafe(event.set)
+    except RuntimeError:
+        # the loop is closed, nobody is waiting
+        pass
 
 
 def _new_future_await(self):
@@ -33,82 +47,6 @@ def _new_future_await(self):
     return self.x
 
 
-class NewResponse(ClientResponse):
-    """Wrap aiohttp's ClientResponse like requests's Response."""
-    # 'strict' / 'ignore' / 'replace'
-    DEFAULT_DECODE_ERRORS = 'strict'
-    referer_info = None
-
-    def __init__(self, method, url, *, writer, continue100, timer, request_info,
-                 traces, loop, session) -> None:
-        self._encoding = None
-        super().__init__(method=method,
-                         url=url,
-                         writer=writer,
-                         continue100=continue100,
-                         timer=timer,
-                         request_info=request_info,
-                         traces=traces,
-                         loop=loop,
-                         session=session)
-
-    @property
-    def url(self):
-        return self._url
-
-    @property
-    def status_code(self):
-        return self.status
-
-    def __repr__(self):
-        return "<%s [%s]>" % (self.__class__.__name__, self.status)
-
-    def __bool__(self):
-        return self.ok
-
-    def __iter__(self):
-        """Allows you to use a response as an iterator."""
-        return self.iter_content(128)
-
-    @property
-    def ok(self):
-        return self.status in range(200, 400)
-
-    @property
-    def is_redirect(self):
-        """True if this Response is a well-formed HTTP redirect that could have
-        been processed automatically (by :meth:`Session.resolve_redirects`).
-        """
-        return "location" in self.headers and self.status in range(300, 400)
-
-    @property
-    def encoding(self):
-        if not self._encoding:
-            self._encoding = self.get_encoding()
-        return self._encoding
-
-    @encoding.setter
-    def encoding(self, encoding):
-        self._encoding = encoding
-        return encoding
-
-    @property
-    def text(self):
-        return self._body.decode(self.encoding, self.DEFAULT_DECODE_ERRORS)
-
-    def json(self, encoding=None, loads=loads):
-        return loads(
-            self._body.decode(encoding or self.encoding,
-                              errors=self.DEFAULT_DECODE_ERRORS))
-
-    def release(self) -> None:
-        super().release()
-        # set content as bytes
-        setattr(self, 'content', self._body)
-        # set url as string
-        setattr(self, '_url', str(self._url))
-
-
 def retry(tries=1,
           exceptions: Tuple[Type[BaseException]] = (Exception,),
           catch_exception=False):
@@ -159,3 +97,65 @@ async def _ensure_can_be_await(obj):
     if isawaitable(obj):
         return await obj
     return obj
+
+
+async def _frontier_anext(frontier, poll_interval=1):
+    """Wait for the next ready request of crawlers.Frontier."""
+    if frontier._event is None:
+        frontier._loop = asyncio.get_running_loop()
+        frontier._event = asyncio.Event()
+    event = frontier._event
+    idle_since = frontier.TIMER()
+    while 1:
+        # clear before checking, so the adding while checking will not be missed
+        event.clear()
+        request, wait = frontier.pop_ready()
+        if request is not None:
+            return request
+        now = frontier.TIMER()
+        if wait is None:
+            if frontier.closed:
+                raise StopAsyncIteration
+            if frontier.idle_timeout is not None:
+                remaining = idle_since + frontier.idle_timeout - now
+                if remaining <= 0:
+                    raise StopAsyncIteration
+                wait = min(poll_interval, remaining)
+            else:
+                wait = poll_interval
+        else:
+            idle_since = now
+        try:
+            await asyncio.wait_for(event.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _stagger_aiter(items, stagger, window):
+    """Async version of utils.stagger_iter."""
+    async for item in items:
+        stagger.push(item)
+        if window and stagger.size >= window:
+            yield stagger.pop()
+    while stagger.size:
+        yield stagger.pop()
+
+
+async def _stress_open_loop(stress_test, offsets):
+    """Fire the requests of crawlers.StressTest at the scheduled time, no matter how many requests are still in flight."""
+    tasks = set()
+    start_time = stress_test.schedule_start_time
+    for offset in offsets:
+        if stress_test._sending_finished():
+            break
+        scheduled_time = start_time + offset
+        # sleep(0) while falling behind, let the in-flight requests go on.
+        await asyncio.sleep(max(scheduled_time - stress_test.TIMER(), 0))
+        task = stress_test._send(scheduled_time)
+        if task is None:
+            break
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    stress_test.schedule_end_time = stress_test.TIMER()
+    if tasks:
+        await asyncio.wait(tasks)
@@ -3,11 +3,13 @@
 from asyncio import TimeoutError, get_event_loop, sleep
 from concurrent.futures._base import Error
 from inspect import isawaitable
+from time import time
 from typing import Callable, Optional, Union
 
 from aiohttp import ClientError, ClientSession
 
-from ._py3_patch import (NewResponse, NotSet, _ensure_can_be_await,
+from ._aiohttp_patch import NewResponse
+from ._py3_patch import (NotSet, _ensure_can_be_await,
                          _exhaust_simple_coro, logger)
 from .exceptions import FailureException, ValidationError
 
@@ -18,6 +20,7 @@ class Requests:
     Removes the frequency_controller & sync usage (task.x) & compatible args of requests for good performance, but remains retry / callback / referer_info.
 
     referer_info: sometimes used for callback.
+    recorder: None or :class:`torequests.replay.Recorder`, record the successful responses for replaying.
     """
 
     def __init__(self,
@@ -25,12 +28,14 @@ class Requests:
                  catch_exception: bool = True,
                  retry_exceptions: tuple = (ClientError, Error, TimeoutError,
                                             ValidationError),
+                 recorder=None,
                  **kwargs):
         # ensure running loop to use unique loop.
         if not get_event_loop().is_running():
             raise RuntimeError('Please init Requests in a running loop.')
         self.catch_exception = catch_exception
         self.retry_exceptions = retry_exceptions
+        self.recorder = recorder
         if session:
             self.session = session
         else:
@@ -71,6 +76,7 @@ class Requests:
         error = Exception()
         for retries in range(retry + 1):
             try:
+                request_start = time()
                 async with self.session.request(method, url, **kwargs) as resp:
                     if encoding:
                         setattr(resp, 'encoding', encoding)
@@ -80,6 +86,12 @@ class Requests:
                         raise ValidationError(response_validator.__name__)
                     await resp.read()
                     resp.release()
+                    if self.recorder:
+                        # sha1 and file writing in the writer thread
+                        self.recorder.record_response(resp,
+                                                      time() - request_start,
+                                                      request_start,
+                                                      wait=False)
                     return resp
             except self.retry_exceptions as err:
                 error = err
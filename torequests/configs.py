@@ -1,4 +1,6 @@
 #! coding:utf-8
+import codecs
+import json
 import time
 
 
@@ -9,3 +11,65 @@ class Config:
     # EAST8 = +8, WEST8 = -8
     TIMEZONE = int(-time.timezone / 3600)
     wait_futures_before_exiting = True
+    #: name of the process-wide JSON backend, changed by `set_json_backend`
+    json_backend = 'json'
+    #: loads the JSON str / bytes, used by the response.json() of tPool / dummy.Requests / aiohttp_dummy.Requests and find_jsons
+    json_loads = staticmethod(json.loads)
+
+
+#: the JSON backends to try for set_json_backend('auto'), faster first
+JSON_BACKENDS = ('orjson', 'ujson', 'json')
+_UTF8_NAMES = {'utf-8', 'utf-8-sig'}
+
+
+def set_json_backend(backend='auto'):
+    """Set the process-wide JSON backend, which parses the bytes body directly.
+
+    :param backend: 'auto' for the fastest installed one of JSON_BACKENDS,
+        'orjson' / 'ujson' / 'json', or a function loads str and bytes.
+    :return: the name of the backend.
+
+    Basic Usage::
+
+        from torequests.configs import set_json_backend
+
+        set_json_backend('orjson')
+        # tPool().get(url).x.json() / (await dummy.Requests().get(url)).json() use orjson now
+    """
+    if callable(backend):
+        name = getattr(backend, '__module__', None) or repr(backend)
+        loads = backend
+    else:
+        names = JSON_BACKENDS if backend == 'auto' else (backend,)
+        for name in names:
+            if name not in JSON_BACKENDS:
+                raise ValueError('backend should be one of %s or callable, but given %r' %
+                                 (('auto',) + JSON_BACKENDS, backend))
+            try:
+                loads = __import__(name).loads
+                break
+            except ImportError:
+                if backend != 'auto':
+                    raise
+    Config.json_backend = name
+    Config.json_loads = staticmethod(loads)
+    return name
+
+
+def loads_bytes(data, encoding=None, errors='strict'):
+    """Load the JSON bytes by the JSON backend, only the non-UTF-8 bytes will be decoded first.
+
+    :param encoding: the encoding of the data, guessed by the leading bytes if not given.
+    """
+    if not encoding:
+        detect_encoding = getattr(json, 'detect_encoding', None)
+        encoding = detect_encoding(data) if detect_encoding else 'utf-8'
+    try:
+        encoding = codecs.lookup(encoding).name
+    except LookupError:
+        pass
+    if encoding not in _UTF8_NAMES or errors != 'strict':
+        return Config.json_loads(data.decode(encoding, errors))
+    if data[:3] == codecs.BOM_UTF8:
+        data = data[3:]
+    return Config.json_loads(data)
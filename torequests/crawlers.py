@@ -2,36 +2,283 @@
 
 from __future__ import division
 
+import hashlib
 import json
-import os
+import math
+import multiprocessing
+import re
+import sys
 import time
+from collections import Counter
 from copy import deepcopy
-from functools import wraps
+from functools import partial, wraps
+from heapq import heappop, heappush, nsmallest
+from itertools import count as itertools_count
+from itertools import islice
+from threading import Lock
 
+from .exceptions import FailureException
+from .frequency_controller.sync_tools import Frequency
 from .logs import print_info
 from .utils import (Counts, ensure_dict_key_title, ensure_request, md5,
-                    parse_qsl, timepass, ttime, unparse_qsl, urlparse,
-                    urlunparse)
+                    parse_qsl, sort_url_query, timepass, ttime, unparse_qsl,
+                    urlparse, urlunparse)
 from .versions import PY2, PY3, PY35_PLUS
 
 if PY3:
     unicode = str
     from http.cookies import SimpleCookie
     from json.decoder import JSONDecodeError
+    from queue import Empty
 
 elif PY2:
     from Cookie import SimpleCookie
+    from Queue import Empty
     JSONDecodeError = ValueError
 
 if PY35_PLUS:
-    from .dummy import Requests
-else:
-    from .main import tPool as Requests
+    from asyncio import new_event_loop
+    from ._py3_patch import _frontier_anext, _set_event, _stress_open_loop
 
-__all__ = 'CleanRequest StressTest'.split(' ')
+
+
+def _get_requests_class():
+    # imported on demand, dummy needs aiohttp and main needs requests
+    if PY35_PLUS:
+        from .dummy import Requests
+    else:
+        from .main import tPool as Requests
+    return Requests
+
+
+def __getattr__(name):
+    if name == 'Requests':
+        return _get_requests_class()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+__all__ = ('CleanRequest StressTest RateSchedule LatencyHistogram StressStats '
+           'Fingerprinter StreamingHash SimHash MinHash JsonStructureHash '
+           'Frontier').split(' ')
+
+
+class Fingerprinter(object):
+    """Base class of the response fingerprinters for CommonRequests.
+
+    A fingerprinter is a callable like `ensure_response`, failed responses
+    are returned as they are. `similarity` returns 0.0 ~ 1.0 for two
+    fingerprints, to be compared with the `threshold` of CommonRequests.
+    """
+
+    def __call__(self, r):
+        if hasattr(r, 'x'):
+            r = r.x
+        if r:
+            return self.fingerprint(r)
+        return r
+
+    def fingerprint(self, resp):
+        raise NotImplementedError
+
+    def similarity(self, fingerprint1, fingerprint2):
+        return 1.0 if fingerprint1 == fingerprint2 else 0.0
+
+    @staticmethod
+    def get_shingles(text, ngram=3):
+        """Lower-case word n-grams of the text."""
+        tokens = re.findall(r'\w+', text.lower(), flags=re.U)
+        if len(tokens) <= ngram:
+            return set([' '.join(tokens)]) if tokens else set()
+        return set(' '.join(tokens[index:index + ngram])
+                   for index in range(len(tokens) - ngram + 1))
+
+    @staticmethod
+    def hash64(string):
+        return int(hashlib.md5(string.encode('utf-8')).hexdigest()[:16], 16)
+
+
+class StreamingHash(Fingerprinter):
+    """`md5-length` fingerprint updated chunk by chunk, without copying the
+    large body. The same as the default fingerprint of CommonRequests if
+    `max_size` is None, else only the first `max_size` bytes are hashed.
+
+    Basic Usage::
+
+        >>> from torequests.crawlers import StreamingHash
+        >>> StreamingHash().hash_chunks([b'a' * 10, b'b' * 10])
+        '22f38cc2-20'
+    """
+
+    def __init__(self, chunk_size=1024 * 1024, max_size=None):
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+
+    def hash_chunks(self, chunks):
+        """Fingerprint of an iterable of bytes, like `resp.iter_content()`."""
+        hasher = hashlib.md5()
+        hashed = size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            if self.max_size is not None:
+                if hashed >= self.max_size:
+                    continue
+                chunk = chunk[:self.max_size - hashed]
+            hashed += len(chunk)
+            hasher.update(chunk)
+        return '%s-%s' % (hasher.hexdigest()[12:20], size)
+
+    def fingerprint(self, resp):
+        content = memoryview(resp.content)
+        return self.hash_chunks(
+            content[index:index + self.chunk_size]
+            for index in range(0, len(content), self.chunk_size))
+
+
+class SimHash(Fingerprinter):
+    """SimHash over the word n-grams of the response text, the similarity is
+    the rate of the same bits.
+
+    Basic Usage::
+
+        >>> from torequests.crawlers import SimHash
+        >>> simhash = SimHash()
+        >>> text = ' '.join('word%s' % i for i in range(100))
+        >>> simhash.similarity(simhash.hash_text(text + ' time 1'), simhash.hash_text(text + ' time 2')) > 0.9
+        True
+    """
+
+    def __init__(self, bits=64, ngram=3):
+        if not 0 < bits <= 64:
+            raise ValueError('bits should be 1 ~ 64')
+        self.bits = bits
+        self.ngram = ngram
+
+    def hash_text(self, text):
+        shingles = self.get_shingles(text, self.ngram)
+        if not shingles:
+            return 0
+        mask = (1 << self.bits) - 1
+        template = '0%sb' % self.bits
+        rows = [format(self.hash64(shingle) & mask, template)
+                for shingle in shingles]
+        # the bit is 1 if more than half of the shingles have 1 at this bit,
+        # count by the columns instead of looping every bit of every shingle.
+        half = len(rows) / 2
+        return int(
+            ''.join('1' if column.count('1') > half else '0'
+                    for column in zip(*rows)), 2)
+
+    def fingerprint(self, resp):
+        return self.hash_text(resp.text)
+
+    def similarity(self, fingerprint1, fingerprint2):
+        return 1 - bin(fingerprint1 ^ fingerprint2).count('1') / self.bits
+
+
+class MinHash(Fingerprinter):
+    """Bottom-k MinHash signature (the `size` smallest hashes) of the word
+    n-grams of the response text, the similarity is the estimated Jaccard
+    similarity. Only one hash for each n-gram, instead of `size` hashes.
+
+    Basic Usage::
+
+        >>> from torequests.crawlers import MinHash
+        >>> minhash = MinHash()
+        >>> text = ' '.join('word%s' % i for i in range(100))
+        >>> minhash.similarity(minhash.hash_text(text + ' time 1'), minhash.hash_text(text + ' time 2')) > 0.9
+        True
+    """
+
+    def __init__(self, size=64, ngram=3):
+        self.size = size
+        self.ngram = ngram
+
+    def hash_text(self, text):
+        return tuple(
+            nsmallest(self.size, set(
+                self.hash64(shingle)
+                for shingle in self.get_shingles(text, self.ngram))))
+
+    def fingerprint(self, resp):
+        return self.hash_text(resp.text)
+
+    def similarity(self, fingerprint1, fingerprint2):
+        if not (fingerprint1 and fingerprint2):
+            return 1.0 if fingerprint1 == fingerprint2 else 0.0
+        set1, set2 = set(fingerprint1), set(fingerprint2)
+        # the smallest hashes of the union are a sample of the union
+        sample = nsmallest(self.size, set1 | set2)
+        same = sum(1 for value in sample if value in set1 and value in set2)
+        return same / len(sample)
+
+
+class JsonStructureHash(Fingerprinter):
+    """Hash of the JSON response without the volatile keys (case-insensitive),
+    fallback to the `md5-length` of the content if it's not JSON.
+
+    :param ignore_keys: keys to be ignored in any depth.
+    :param keep_values: False to hash the keys and the types of values only.
+
+    Basic Usage::
+
+        >>> from torequests.crawlers import JsonStructureHash
+        >>> h = JsonStructureHash()
+        >>> h.hash_json({'data': [1, 2], 'ts': 1}) == h.hash_json({'ts': 2, 'data': [1, 2]})
+        True
+        >>> JsonStructureHash(keep_values=False).hash_json({'data': [1, 2]})
+        '100af20b-json'
+    """
+    IGNORE_KEYS = ('time', 'timestamp', 'ts', '_t', 't', 'nonce', 'date',
+                   'expires', 'request_id', 'requestid', 'trace_id',
+                   'traceid', 'server_time', 'servertime', 'cost', 'took')
+
+    def __init__(self, ignore_keys=None, keep_values=True):
+        self.ignore_keys = set(
+            key.lower() for key in (self.IGNORE_KEYS
+                                    if ignore_keys is None else ignore_keys))
+        self.keep_values = keep_values
+
+    def _normalize(self, obj):
+        if isinstance(obj, dict):
+            return sorted([
+                unicode(key), self._normalize(value)
+            ] for key, value in obj.items()
+                          if unicode(key).lower() not in self.ignore_keys)
+        if isinstance(obj, list):
+            return [self._normalize(item) for item in obj]
+        if self.keep_values:
+            return obj
+        return type(obj).__name__
+
+    def hash_json(self, obj):
+        string = json.dumps(self._normalize(obj), sort_keys=True)
+        return '%s-json' % md5(string, n=8)
+
+    def fingerprint(self, resp):
+        try:
+            return self.hash_json(json.loads(resp.text))
+        except ValueError:
+            return '%s-%s' % (md5(resp.content, n=8, skip_encode=True),
+                              len(resp.content))
+
+
+#: names of the fingerprinters for CommonRequests(fingerprinter=name)
+FINGERPRINTERS = {
+    'stream': StreamingHash,
+    'simhash': SimHash,
+    'minhash': MinHash,
+    'json': JsonStructureHash,
+}
 
 
 class CommonRequests(object):
+    """The responses are the same as the original response if their
+    fingerprints are the same, or their similarity >= `threshold`.
+
+    :param fingerprinter: a Fingerprinter, or the name in FINGERPRINTERS
+        ('stream', 'simhash', 'minhash', 'json'), `ensure_response` goes first.
+    :param threshold: 0.0 ~ 1.0, only works with the fingerprinter.
+    """
 
     def __init__(self,
                  request,
@@ -42,11 +289,15 @@ class CommonRequests(object):
                  timeout=10,
                  logger_function=None,
                  encoding=None,
+                 fingerprinter=None,
+                 threshold=1.0,
                  **kwargs):
         #: If not set, will use print_info, logger_function should handle result(str) and **kwargs
         self.logger_function = logger_function or print_info
+        #: the args to create self.req
+        self.req_kwargs = dict(n=n, interval=interval, **kwargs)
         #: torequests's async requests tool.
-        self.req = Requests(n=n, interval=interval, **kwargs)
+        self.req = _get_requests_class()(**self.req_kwargs)
         #: default encoding or detected by response
         self.encoding = encoding
         request = ensure_request(request)
@@ -59,8 +310,18 @@ class CommonRequests(object):
         self.retry = retry
         #: default timeout
         self.timeout = timeout
+        if isinstance(fingerprinter, (str, unicode)):
+            if fingerprinter not in FINGERPRINTERS:
+                raise ValueError('fingerprinter should be one of %s, but given %r'
+                                 % (sorted(FINGERPRINTERS), fingerprinter))
+            fingerprinter = FINGERPRINTERS[fingerprinter]()
+        #: Fingerprinter for the similarity of responses.
+        self.fingerprinter = fingerprinter
+        #: the min similarity of the unchanged responses.
+        self.threshold = threshold
         #: function to check the same response.
-        self.ensure_response = ensure_response or self._ensure_response
+        self.ensure_response = (ensure_response or fingerprinter or
+                                self._ensure_response)
         self.init_original_response()
 
     def _ensure_response(self, r):
@@ -86,10 +347,20 @@ class CommonRequests(object):
         self.original_response = self.ensure_response(r1)
         return self.original_response
 
+    def is_unchanged(self, fingerprint):
+        """Check the result of self.ensure_response with the original response."""
+        if fingerprint == self.original_response:
+            return True
+        if (self.threshold >= 1 or not fingerprint or
+                not hasattr(self.ensure_response, 'similarity')):
+            return False
+        return self.ensure_response.similarity(
+            fingerprint, self.original_response) >= self.threshold
+
     def check_response_unchanged(self, resp):
         if hasattr(resp, 'x'):
             resp = resp.x
-        return self.ensure_response(resp) == self.original_response
+        return self.is_unchanged(self.ensure_response(resp))
 
 
 class CleanRequest(CommonRequests):
@@ -102,7 +373,14 @@ class CleanRequest(CommonRequests):
         >>> c = CleanRequest(request)
         >>> c.x
         {'url': 'https://p.3.cn', 'method': 'get'}
+
+    The default `strategy='field'` sends one probe for each arg.
+    `strategy='group'` removes the args by halves (group testing), only the
+    groups which change the response will be split again, so the probes are
+    about O(k*log(n)) for k necessary args of n. And the removed args are
+    verified together at last.
     """
+    STRATEGIES = ('field', 'group')
 
     def __init__(self,
                  request,
@@ -113,9 +391,18 @@ class CleanRequest(CommonRequests):
                  timeout=10,
                  logger_function=None,
                  encoding='utf-8',
+                 strategy='field',
                  **kwargs):
         """request: dict or curl-string or url.
-        Cookie need to be set in headers."""
+        Cookie need to be set in headers.
+        strategy: 'field' or 'group'."""
+        if strategy not in self.STRATEGIES:
+            raise ValueError('strategy should be one of %s, but given %r' %
+                             (self.STRATEGIES, strategy))
+        #: 'group' for group testing, 'field' for one probe each arg.
+        self.strategy = strategy
+        #: count of the probe requests.
+        self.probes = 0
         #: request args which can be ignored.
         self.ignore = {
             'qsl': [],
@@ -165,7 +452,7 @@ class CleanRequest(CommonRequests):
             'original_response should not be failed. %s' % self.request)
         self.original_response = self.ensure_response(r1)
         self.encoding = self.encoding or resp.encoding
-        if no_cookie_resp == self.original_response:
+        if no_cookie_resp is not None and self.is_unchanged(no_cookie_resp):
             self.ignore['headers'].append('Cookie')
             self.is_cookie_necessary = False
         return self.original_response
@@ -182,6 +469,7 @@ class CleanRequest(CommonRequests):
         return cls._join_url(parsed_url, sorted(qsl, **kwargs))
 
     def _add_task(self, key, value, request):
+        self.probes += 1
         task = [
             key, value,
             self.req.request(
@@ -279,56 +567,145 @@ class CleanRequest(CommonRequests):
             self._add_task('headers', key, new_request)
         return self
 
-    def reset_new_request(self):
-        """Remove the non-sense args from the self.ignore, return self.new_request"""
-        raw_url = self.new_request['url']
+    def _apply_ignore(self, request, ignore):
+        """Return a copy of the request without the args of ignore."""
+        new_request = deepcopy(request)
+        raw_url = new_request['url']
         parsed_url = urlparse(raw_url)
         qsl = parse_qsl(parsed_url.query)
         new_url = self._join_url(
-            parsed_url, [i for i in qsl if i not in self.ignore['qsl']])
-        self.new_request['url'] = new_url
-        self.logger_function('ignore: %s' % self.ignore)
-        if 'headers' in self.new_request:
-            for key in self.ignore['headers']:
-                self.new_request['headers'].pop(key)
-
-        if not self.new_request.get('headers'):
-            self.new_request.pop('headers', None)
-        if self.ignore['Cookie'] and 'Cookie' not in self.ignore['headers']:
-            headers = self.new_request['headers']
+            parsed_url, [i for i in qsl if i not in ignore['qsl']])
+        new_request['url'] = new_url
+        if 'headers' in new_request:
+            for key in ignore['headers']:
+                new_request['headers'].pop(key)
+
+        if not new_request.get('headers'):
+            new_request.pop('headers', None)
+        if ignore['Cookie'] and 'Cookie' not in ignore['headers']:
+            headers = new_request['headers']
             headers = {key.title(): headers[key] for key in headers}
             if 'Cookie' in headers:
                 cookies = SimpleCookie(headers['Cookie'])
                 new_cookie = '; '.join([
                     i[1].OutputString()
                     for i in cookies.items()
-                    if i[0] not in self.ignore['Cookie']
+                    if i[0] not in ignore['Cookie']
                 ])
-                self.new_request['headers']['Cookie'] = new_cookie
+                new_request['headers']['Cookie'] = new_cookie
 
-        if self.new_request['method'] == 'post':
-            data = self.new_request.get('data')
+        if new_request['method'] == 'post':
+            data = new_request.get('data')
             if data:
                 if isinstance(data, dict):
-                    for key in self.ignore['form_data']:
+                    for key in ignore['form_data']:
                         data.pop(key)
-                if (not data) or self.ignore['total_data']:
+                if (not data) or ignore['total_data']:
                     # not need data any more
-                    self.new_request.pop('data', None)
-                if self.has_json_data and 'data' in self.new_request:
+                    new_request.pop('data', None)
+                if self.has_json_data and 'data' in new_request:
                     json_data = json.loads(data.decode(self.encoding))
-                    for key in self.ignore['json_data']:
+                    for key in ignore['json_data']:
                         json_data.pop(key)
-                    self.new_request['data'] = json.dumps(json_data).encode(
+                    new_request['data'] = json.dumps(json_data).encode(
                         self.encoding)
+        return new_request
+
+    def reset_new_request(self):
+        """Remove the non-sense args from the self.ignore, return self.new_request"""
+        self.logger_function('ignore: %s' % self.ignore)
+        self.new_request = self._apply_ignore(self.new_request, self.ignore)
         return self.new_request
 
+    def get_fields(self):
+        """Return the removable args as (key, value) list, key is the same as self.ignore."""
+        fields = [('qsl', qs) for qs in parse_qsl(urlparse(
+            self.request['url']).query)]
+        data = self.request.get('data')
+        if data and self.request['method'] == 'post':
+            fields.append(('total_data', data))
+            if isinstance(data, dict):
+                fields.extend(('form_data', key) for key in data)
+            else:
+                try:
+                    json_data = json.loads(data.decode(self.encoding))
+                    if isinstance(json_data, dict):
+                        fields.extend(('json_data', key) for key in json_data)
+                        self.has_json_data = True
+                except (JSONDecodeError, UnicodeDecodeError):
+                    pass
+        headers = self.request.get('headers')
+        if isinstance(headers, dict):
+            if headers.get('Cookie') and self.is_cookie_necessary:
+                fields.extend(('Cookie', key)
+                              for key in SimpleCookie(headers['Cookie']))
+            fields.extend(('headers', key)
+                          for key in headers
+                          if key != 'Cookie' and key not in self.ignore['headers'])
+        return fields
+
+    def _build_request(self, fields):
+        ignore = deepcopy(self.ignore)
+        for key, value in fields:
+            ignore[key].append(value)
+        return self._apply_ignore(self.request, ignore)
+
+    def _probe(self, groups):
+        """Send the requests without each group of fields, return if the responses unchanged."""
+        self.probes += len(groups)
+        tasks = [
+            self.req.request(retry=self.retry,
+                             timeout=self.timeout,
+                             callback=self.check_response_unchanged,
+                             **self._build_request(fields))
+            for fields in groups
+        ]
+        self.req.x
+        return [bool(task.x and task.cx) for task in tasks]
+
+    def clean_by_group(self, fields=None):
+        """Group testing: try to remove the groups of fields, split the group
+        into halves if the response changed, and the groups of the same round
+        are probed concurrently. Add the removable fields to self.ignore, return self."""
+        fields = self.get_fields() if fields is None else fields
+        removed = []
+        groups = [fields] if fields else []
+        while groups:
+            # each group is removed together with the removed ones
+            base = [field for group in removed for field in group]
+            next_groups = []
+            for group, unchanged in zip(
+                    groups, self._probe([base + group for group in groups])):
+                if unchanged:
+                    removed.append(group)
+                elif len(group) > 1:
+                    half = len(group) // 2
+                    next_groups.extend([group[:half], group[half:]])
+            groups = next_groups
+        if len(removed) > 1 and not self._probe(
+            [[field for group in removed for field in group]])[0]:
+            # the groups removed in the same round changed the response
+            # together, verify them one by one.
+            verified = []
+            for group in removed:
+                if self._probe([verified + group])[0]:
+                    verified.extend(group)
+            removed = [verified]
+        for group in removed:
+            for key, value in group:
+                self.ignore[key].append(value)
+        return self
+
     def clean_all(self):
         """Clean the url + post-data + headers, return self."""
         return self.clean_url().clean_post_data().clean_headers()
 
     def result(self):
         """Whole task, clean_all + reset_new_request, return self.new_request."""
+        if not self.tasks and self.strategy == 'group':
+            self.clean_by_group()
+            self.logger_function('%s probes of request.' % self.probes)
+            return self.reset_new_request()
         if not self.tasks:
             self.clean_all()
         tasks_length = len(self.tasks)
@@ -353,21 +730,432 @@ class CleanRequest(CommonRequests):
         return json.dumps(self.request, ensure_ascii=0)
 
 
+class LatencyHistogram(object):
+    """Compact latency histogram with logarithmic buckets, the relative error
+    of the percentiles is less than `precision`, and the memory only grows
+    with the count of buckets (about 1000 buckets from 1us to 1000s).
+
+    Basic Usage::
+
+        >>> from torequests.crawlers import LatencyHistogram
+        >>> h = LatencyHistogram()
+        >>> for i in range(1, 1001):
+        ...     h.record(i / 1000)
+        >>> h.count, round(h.percentile(50), 2), round(h.percentile(90), 2), h.max
+        (1000, 0.5, 0.9, 1.0)
+        >>> h2 = LatencyHistogram.from_dict(h.to_dict())
+        >>> h2.merge(h).count
+        2000
+    """
+
+    def __init__(self, precision=0.01, min_value=0.000001):
+        self.precision = precision
+        self.min_value = min_value
+        # the middle of each bucket is less than precision away from its edges
+        self._log_base = math.log(1 + 2 * precision)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_base) + 1
+
+    def _value(self, index):
+        if index == 0:
+            return self.min_value
+        return self.min_value * math.exp((index - 0.5) * self._log_base)
+
+    def record(self, value, count=1):
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        if self.count:
+            return self.total / self.count
+
+    def percentile(self, percent):
+        """The value which `percent`% of the values are less than or equal to, None if empty."""
+        if not self.count:
+            return None
+        rank = max(int(math.ceil(self.count * percent / 100)), 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(self._value(index), self.min), self.max)
+
+    def merge(self, other):
+        """Merge another histogram with the same precision into self."""
+        if (self.precision, self.min_value) != (other.precision,
+                                                other.min_value):
+            raise ValueError('can not merge histograms with different buckets')
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                if self.min is None or value < self.min:
+                    self.min = value
+                if self.max is None or value > self.max:
+                    self.max = value
+        return self
+
+    def clear(self):
+        self.buckets.clear()
+        self.count = 0
+        self.total = 0
+        self.min = self.max = None
+
+    def summary(self, percents=(50, 90, 99), ndigits=4):
+        result = {'count': self.count}
+        for percent in percents:
+            value = self.percentile(percent)
+            result['p%s' % percent] = None if value is None else round(
+                value, ndigits)
+        for key in ('min', 'max', 'mean'):
+            value = getattr(self, key)
+            result[key] = None if value is None else round(value, ndigits)
+        return result
+
+    def to_dict(self):
+        return {
+            'precision': self.precision,
+            'min_value': self.min_value,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            # the keys of json object should be string
+            'buckets': dict((str(k), v) for k, v in self.buckets.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(precision=data['precision'],
+                        min_value=data['min_value'])
+        histogram.buckets = dict(
+            (int(k), v) for k, v in data['buckets'].items())
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+class StressStats(object):
+    """Statistics of StressTest: the latency histogram, and the counts of
+    status codes, response fingerprints and errors.
+
+    :param precision: the precision of LatencyHistogram.
+    """
+    TIMER = time.time
+
+    def __init__(self, precision=0.01):
+        self.histogram = LatencyHistogram(precision)
+        #: the histogram since the last interval summary
+        self.interval_histogram = LatencyHistogram(precision)
+        self.statuses = Counter()
+        self.fingerprints = Counter()
+        self.errors = Counter()
+        self.count = 0
+        self.succ = 0
+        self.start_time = self.TIMER()
+        self.interval_start_time = self.start_time
+        self._lock = Lock()
+
+    def record(self, cost, succ, status=None, fingerprint=None, error=None):
+        with self._lock:
+            self.count += 1
+            if succ:
+                self.succ += 1
+            self.histogram.record(cost)
+            self.interval_histogram.record(cost)
+            if status is not None:
+                self.statuses[str(status)] += 1
+            if fingerprint is not None:
+                self.fingerprints[fingerprint] += 1
+            if error is not None:
+                self.errors[error] += 1
+
+    def merge(self, other):
+        """Merge the StressStats of another worker into self."""
+        with self._lock:
+            self.histogram.merge(other.histogram)
+            self.statuses.update(other.statuses)
+            self.fingerprints.update(other.fingerprints)
+            self.errors.update(other.errors)
+            self.count += other.count
+            self.succ += other.succ
+        return self
+
+    def to_dict(self):
+        return {
+            'histogram': self.histogram.to_dict(),
+            'statuses': dict(self.statuses),
+            'fingerprints': dict(self.fingerprints),
+            'errors': dict(self.errors),
+            'count': self.count,
+            'succ': self.succ,
+            'start_time': self.start_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = LatencyHistogram.from_dict(data['histogram'])
+        stats = cls(precision=histogram.precision)
+        stats.histogram = histogram
+        stats.statuses.update(data['statuses'])
+        stats.fingerprints.update(data['fingerprints'])
+        stats.errors.update(data['errors'])
+        stats.count = data['count']
+        stats.succ = data['succ']
+        stats.start_time = data['start_time']
+        return stats
+
+    @property
+    def interval_passed(self):
+        return self.TIMER() - self.interval_start_time
+
+    def interval_summary(self):
+        """Summary since the last interval summary, then start a new interval."""
+        with self._lock:
+            now = self.TIMER()
+            passed = now - self.interval_start_time
+            result = self.interval_histogram.summary()
+            result['rps'] = round(result['count'] / passed, 2) if passed else 0
+            result['total'] = self.count
+            result['errors'] = dict(self.errors)
+            self.interval_histogram.clear()
+            self.interval_start_time = now
+        return result
+
+    @staticmethod
+    def format_summary(summary):
+        text = '[%s] %s req/s, p50: %ss, p90: %ss, p99: %ss, max: %ss' % (
+            summary['total'], summary['rps'], summary['p50'], summary['p90'],
+            summary['p99'], summary['max'])
+        if summary['errors']:
+            text += ', errors: %s' % summary['errors']
+        return text
+
+    def report(self, passed=None):
+        """The machine-readable summary of all the responses."""
+        if passed is None:
+            passed = self.TIMER() - self.start_time
+        result = self.histogram.summary()
+        result.update({
+            'total': self.count,
+            'succ': self.succ,
+            'succ_rate': round(self.succ / self.count, 4) if self.count else 0,
+            'passed': round(passed, 3),
+            'rps': round(self.count / passed, 2) if passed > 0 else 0,
+            'statuses': dict(self.statuses),
+            'fingerprints': dict(self.fingerprints),
+            'errors': dict(self.errors),
+            'histogram': self.histogram.to_dict(),
+        })
+        return result
+
+
+class _SharedCounts(object):
+    """Counter shared by the worker processes, the same usage as utils.Counts."""
+
+    def __init__(self, context, lock):
+        self._value = context.RawValue('q', 0)
+        self._lock = lock
+
+    @property
+    def x(self):
+        with self._lock:
+            self._value.value += 1
+            return self._value.value
+
+    @property
+    def now(self):
+        return self._value.value
+
+    def add_until(self, limit):
+        """Add 1 and return True if the counter is less than limit."""
+        with self._lock:
+            if self._value.value >= limit:
+                return False
+            self._value.value += 1
+            return True
+
+
+class RateSchedule(object):
+    """Target request rate of the open-loop StressTest, made of segments which
+    ramp from `start_rate` to `end_rate` (req/s) in `duration` seconds.
+
+    :param segments: list of (start_rate, end_rate, duration), only the last
+        segment's duration can be None (run forever), and then it should be constant.
+
+    Basic Usage::
+
+        >>> from torequests.crawlers import RateSchedule
+        >>> RateSchedule.constant(100, duration=60)
+        RateSchedule([(100, 100, 60)])
+        >>> RateSchedule.ramp(10, 200, duration=30)
+        RateSchedule([(10, 200, 30)])
+        >>> RateSchedule.step([(50, 10), (100, 10), (200, None)])
+        RateSchedule([(50, 50, 10), (100, 100, 10), (200, 200, None)])
+        >>> [round(i, 3) for i in RateSchedule.ramp(0, 10, 1)]
+        [0, 0.447, 0.632, 0.775, 0.894]
+    """
+
+    def __init__(self, segments):
+        segments = [tuple(segment) for segment in segments]
+        if not segments:
+            raise ValueError('segments should not be null')
+        for index, (start_rate, end_rate, duration) in enumerate(segments):
+            if start_rate < 0 or end_rate < 0:
+                raise ValueError('rate should not be negative: %s' %
+                                 (segments[index],))
+            if duration is None:
+                if index != len(segments) - 1 or start_rate != end_rate:
+                    raise ValueError(
+                        'only the last constant segment can run forever')
+            elif duration <= 0:
+                raise ValueError('duration should be positive: %s' %
+                                 (segments[index],))
+        self.segments = segments
+
+    @classmethod
+    def constant(cls, rate, duration=None):
+        return cls([(rate, rate, duration)])
+
+    @classmethod
+    def ramp(cls, start_rate, end_rate, duration):
+        return cls([(start_rate, end_rate, duration)])
+
+    @classmethod
+    def step(cls, steps):
+        """steps: list of (rate, duration)"""
+        return cls([(rate, rate, duration) for rate, duration in steps])
+
+    @classmethod
+    def ensure_schedule(cls, rate):
+        """RateSchedule / number (constant rate) / list of (rate, duration) steps."""
+        if isinstance(rate, cls):
+            return rate
+        if isinstance(rate, (int, float)):
+            return cls.constant(rate)
+        return cls.step(rate)
+
+    @property
+    def duration(self):
+        """Total seconds of the schedule, float('inf') if run forever."""
+        return sum(float('inf') if duration is None else duration
+                   for _, _, duration in self.segments)
+
+    def _iter_segments(self):
+        offset = 0
+        for start_rate, end_rate, duration in self.segments:
+            duration = float('inf') if duration is None else duration
+            yield offset, start_rate, end_rate, duration
+            offset += duration
+
+    def rate_at(self, elapsed):
+        """The target rate (req/s) at `elapsed` seconds, 0 after the schedule ends."""
+        for offset, start_rate, end_rate, duration in self._iter_segments():
+            if elapsed < offset + duration:
+                if start_rate == end_rate:
+                    return start_rate
+                return start_rate + (end_rate - start_rate) * (
+                    elapsed - offset) / duration
+        return 0
+
+    def expected_count(self, elapsed):
+        """The count of requests should be sent in the first `elapsed` seconds."""
+        count = 0
+        for offset, start_rate, end_rate, duration in self._iter_segments():
+            if elapsed <= offset:
+                break
+            passed = min(elapsed - offset, duration)
+            if start_rate == end_rate:
+                count += start_rate * passed
+            else:
+                count += start_rate * passed + (
+                    end_rate - start_rate) * passed * passed / (2 * duration)
+        return count
+
+    def __iter__(self):
+        """Yield the send time offsets (seconds from the beginning) of each request.
+        The k-th request is scheduled at the moment the expected count reaches k."""
+        index = 0
+        count_before = 0
+        for offset, start_rate, end_rate, duration in self._iter_segments():
+            if start_rate == end_rate:
+                total = start_rate * duration
+            else:
+                total = (start_rate + end_rate) * duration / 2
+            # a = (r1 - r0) / 2D, b = r0: solve a * t^2 + b * t = count
+            a = (end_rate - start_rate) / (2 * duration)
+            b = start_rate
+            while 1:
+                count = index - count_before
+                if count >= total:
+                    break
+                if count <= 0:
+                    passed = 0
+                elif a == 0:
+                    passed = count / b
+                else:
+                    root = math.sqrt(max(b * b + 4 * a * count, 0))
+                    passed = 2 * count / (b + root)
+                yield offset + passed
+                index += 1
+            count_before += total
+
+    def __repr__(self):
+        return 'RateSchedule(%s)' % self.segments
+
+
 class StressTest(CommonRequests):
     """StressTest for a request(dict/curl-string/url).
 
+    The responses are recorded by StressStats instead of being printed one by
+    one, the summary is printed every `report_interval` seconds, and `self.x`
+    returns the final report after the test stops.
+
     Basic Usage::
 
         >>> from torequests.crawlers import StressTest
-        >>> StressTest('http://p.3.cn', retry=2, timeout=2).x
-        [2018-09-06 00:19:40](L481): [1] response: f3f97a64-612, start at 2018-09-06 00:19:40 (+00:00:00), 0.040s, 24.98 req/s [100.00 %]
-        [2018-09-06 00:19:40](L481): [2] response: f3f97a64-612, start at 2018-09-06 00:19:40 (+00:00:00), 0.041s, 48.16 req/s [100.00 %]
-        [2018-09-06 00:19:40](L481): [3] response: f3f97a64-612, start at 2018-09-06 00:19:40 (+00:00:00), 0.045s, 65.89 req/s [100.00 %]
-        [2018-09-06 00:19:40](L481): [4] response: f3f97a64-612, start at 2018-09-06 00:19:40 (+00:00:00), 0.046s, 85.96 req/s [100.00 %]
-        [2018-09-06 00:19:40](L481): [5] response: f3f97a64-612, start at 2018-09-06 00:19:40 (+00:00:00), 0.048s, 104.09 req/s [100.00 %]
-        [2018-09-06 00:19:40](L481): [6] response: f3f97a64-612, start at 2018-09-06 00:19:40 (+00:00:00), 0.051s, 117.57 req/s [100.00 %]
-        [2018-09-06 00:19:40](L481): [7] response: f3f97a64-612, start at 2018-09-06 00:19:40 (+00:00:00), 0.053s, 131.98 req/s [100.00 %]
+        >>> StressTest('http://p.3.cn', retry=2, timeout=2, total_time=3).x
+        [2018-09-06 00:19:41] crawlers.py(763): [258] 257.82 req/s, p50: 0.0381s, p90: 0.0462s, p99: 0.0833s, max: 0.1041s
+        [2018-09-06 00:19:42] crawlers.py(763): [531] 272.12 req/s, p50: 0.0372s, p90: 0.0448s, p99: 0.0612s, max: 0.0726s
+        [2018-09-06 00:19:43] crawlers.py(745): shutdown for: total_time: 3
+        [2018-09-06 00:19:43] crawlers.py(763): [800] 266.32 req/s, p50: 0.0376s, p90: 0.0455s, p99: 0.0815s, max: 0.1041s
+        {'count': 800, 'p50': 0.0376, 'p90': 0.0455, 'p99': 0.0815, 'min': 0.0301, 'max': 0.1041, 'mean': 0.0388, 'total': 800, 'succ': 800, 'succ_rate': 1.0, ...}
+
+    Open-loop Usage::
+
+        # fire 200 req/s no matter how many requests are still in flight,
+        # the cost is measured from the scheduled send time.
+        >>> StressTest('http://p.3.cn', n=1000, rate=200, total_time=60).x
+        # ramp from 10 to 500 req/s in 60 seconds
+        >>> StressTest('http://p.3.cn', n=1000, rate=RateSchedule.ramp(10, 500, 60)).x
+        # 50 req/s for 10 seconds, then 100 req/s for 10 seconds
+        >>> StressTest('http://p.3.cn', n=1000, rate=[(50, 10), (100, 10)]).x
+
+    Multi-process Usage::
+
+        # 4 worker processes share 2000 req/s, 500 in-flight requests for each
+        >>> StressTest('http://p.3.cn', n=500, rate=2000, total_time=60, processes=4).x
     """
+    TIMER = time.time
 
     def __init__(self,
                  request,
@@ -383,11 +1171,32 @@ class StressTest(CommonRequests):
                  shutdown=None,
                  shutdown_changed=True,
                  chunk_size=100,
+                 rate=None,
+                 report_interval=1,
+                 report_path=None,
+                 processes=1,
                  **kwargs):
         """request: dict or curl-string or url.
-        logger_function: should handle result and **kwargs, which have `cost`
-        Cookie need to be set in headers."""
-        logger_function = logger_function or self._logger_function
+        logger_function: None for no log of each response, or it should handle
+        result and **kwargs, which have `cost`.
+        Cookie need to be set in headers.
+        rate: None for the closed-loop mode, which sends the next chunk after
+        the previous one finished. Or a RateSchedule / number (req/s) / list of
+        (rate, duration) steps for the open-loop mode, and `n` should be large
+        enough to hold the in-flight requests.
+        report_interval: seconds between the summaries, 0 for no summary.
+        report_path: the final report will be dumped to this json file.
+        processes: fork N worker processes with their own loops, `n` and the
+        closed-loop `chunk_size` are for each worker, the open-loop schedule
+        is shared by the workers in turn. The counters and the stop signal are
+        shared, the stats of the workers are merged into one report.
+        The workers inherit this StressTest by fork, so ValueError is raised
+        for processes > 1 where fork is not available or not safe (Windows /
+        macOS)."""
+        #: the multiprocessing context of the worker processes
+        self._fork_context = None
+        if processes > 1:
+            self._fork_context = self._get_fork_context()
         super(StressTest, self).__init__(
             request=request,
             n=n,
@@ -398,6 +1207,8 @@ class StressTest(CommonRequests):
             logger_function=logger_function,
             encoding=encoding,
             **kwargs)
+        # no log for each response by default, it's slow with huge amounts of responses
+        self.logger_function = logger_function
         #: counter for all response fetched
         self.counter = Counts()
         #: counter for success response fetched
@@ -410,17 +1221,44 @@ class StressTest(CommonRequests):
         self.total_tries = total_tries or float('inf')
         #: the limit of time run-time, stop the script while reaching.
         self.total_time = total_time or float('inf')
-        #: shutdown function, ``os._exit(0)`` if not set.
-        self.shutdown = shutdown or self._shutdown
+        #: function called after stopping, no more requests will be sent, and
+        #: self.x returns the report after the in-flight requests finished.
+        self.shutdown = shutdown
         #: shutdown if response changed.
         self.shutdown_changed = shutdown_changed
         #: fetch requests chunk_size each time, default 100
         self.chunk_size = chunk_size
         #: StressTest callback function, will be wrapped.
         self.st_callback = self.st_callback_wrapper(self.ensure_response)
+        #: RateSchedule of the open-loop mode, None for the closed-loop mode.
+        self.schedule = None if rate is None else RateSchedule.ensure_schedule(
+            rate)
+        #: counter for the requests sent
+        self.sent_counter = Counts()
+        self.schedule_start_time = None
+        self.schedule_end_time = None
+        self.report_interval = report_interval
+        self.report_path = report_path
+        #: StressStats of the responses
+        self.stats = StressStats()
+        #: the reason of stopping, None while running
+        self.stop_reason = None
+        self.processes = processes
+        #: index of the worker process, None for the main process
+        self.worker_index = None
+        #: shared by the worker processes to stop sending
+        self._shared_stopped = None
 
-    def _shutdown(self):
-        return os._exit(0)
+    @staticmethod
+    def _get_fork_context():
+        get_all_start_methods = getattr(multiprocessing,
+                                        'get_all_start_methods', None)
+        if (get_all_start_methods is None or sys.platform == 'darwin' or
+                'fork' not in get_all_start_methods()):
+            raise ValueError(
+                'processes > 1 needs the fork start method, which is not '
+                'available or not safe on %s' % sys.platform)
+        return multiprocessing.get_context('fork')
 
     @property
     def speed(self):
@@ -439,53 +1277,473 @@ class StressTest(CommonRequests):
         """This attribute returns the seconds after starting up."""
         return time.time() - self.start_time
 
-    def _logger_function(self, text, **kwargs):
-        cost = kwargs.get("cost", None)
-        cost = ' %.3fs,' % cost if cost is not None else ''
-        log_str = '[%s] response: %s, start at %s (+%s),%s %.2f req/s [%s]' % (
-            self.counter.now, text, self.start_time_readable,
-            timepass(self.passed), cost, self.speed, self.succ_rate)
-        print_info(log_str)
+    @property
+    def stopped(self):
+        return self.stop_reason is not None or bool(
+            self._shared_stopped and self._shared_stopped.value)
+
+    def stop(self, reason):
+        """Stop sending new requests, the in-flight requests will go on."""
+        if self.stop_reason is None:
+            self.stop_reason = reason
+            if self._shared_stopped is not None:
+                self._shared_stopped.value = 1
+            print_info('shutdown for: %s' % reason)
+            if self.shutdown:
+                self.shutdown()
+
+    def _parse_result(self, r, result):
+        """Return (status, fingerprint, error) of the response."""
+        if hasattr(r, 'x'):
+            r = r.x
+        if isinstance(r, FailureException):
+            return None, None, r.name
+        status = getattr(r, 'status', None) or getattr(r, 'status_code',
+                                                       None)
+        if not isinstance(result, (str, unicode)):
+            result = repr(result)
+        return status, result, None
 
     def st_callback_wrapper(self, func):
-        """add shutdown checker for origin callback function."""
+        """add stats and shutdown checker for origin callback function."""
 
         @wraps(func)
-        def wrapper(r):
-            # if tries end or timeout or shutdown_changed => shutdown
+        def wrapper(r, scheduled_time=None):
             result = func(r)
             self.counter.x
-            succ = result == self.original_response
-            if self.counter.now >= self.total_tries:
-                print_info('shutdown for: total_tries: %s' % self.total_time)
-                self.shutdown()
-            if self.passed >= self.total_time:
-                print_info('shutdown for: total_time: %s' % self.total_time)
-                self.shutdown()
+            # open-loop mode measures the cost from the scheduled send time
+            start_time = r.task_start_time if scheduled_time is None else scheduled_time
+            cost = time.time() - start_time
+            succ = self.is_unchanged(result)
             if succ:
                 self.succ_counter.x
-            elif self.shutdown_changed:
-                print_info('shutdown for: shutdown_changed: %s => %s' %
-                           (self.original_response, result))
-                self.shutdown()
-            self.logger_function(result, cost=time.time() - r.task_start_time)
+            status, fingerprint, error = self._parse_result(r, result)
+            self.stats.record(cost, succ, status, fingerprint, error)
+            if self.logger_function:
+                self.logger_function(result, cost=cost)
+            # if tries end or timeout or shutdown_changed => shutdown
+            if self.counter.now >= self.total_tries:
+                self.stop('total_tries: %s' % self.total_tries)
+            elif self.passed >= self.total_time:
+                self.stop('total_time: %s' % self.total_time)
+            elif not succ and self.shutdown_changed:
+                self.stop('shutdown_changed: %s => %s' %
+                          (self.original_response, result))
+            if self.report_interval and self.stats.interval_passed >= self.report_interval:
+                text = self.stats.format_summary(self.stats.interval_summary())
+                if self.worker_index is not None:
+                    text = 'worker-%s %s' % (self.worker_index, text)
+                print_info(text)
             return result
 
         return wrapper
 
     def start(self):
-        """Start the task cycle."""
-        while 1:
-            tasks = [
-                self.req.request(
-                    callback=self.st_callback,
-                    retry=self.retry,
-                    timeout=self.timeout,
-                    **self.request) for _ in range(self.chunk_size)
-            ]
+        """Start the task cycle, return self.report() after stopping."""
+        if self.processes > 1:
+            return self.start_processes()
+        self.stats = StressStats()
+        if self.schedule is not None:
+            self.start_open_loop()
+        else:
+            self.start_closed_loop()
+        return self.finish()
+
+    def start_closed_loop(self):
+        """Send requests chunk by chunk, until stopped."""
+        while not self.stopped:
+            # do not send the requests more than total_tries
+            remaining = self.total_tries - self.sent_counter.now
+            if remaining <= 0:
+                break
+            for _ in range(int(min(self.chunk_size, remaining))):
+                if self._send() is None:
+                    break
             self.req.x
 
+    def _sending_finished(self):
+        return (self.stopped or
+                self.sent_counter.now >= self.total_tries or
+                self.TIMER() - self.schedule_start_time >= self.total_time)
+
+    def _count_sent(self):
+        """Count the request to be sent, False if reaching total_tries."""
+        if self._shared_stopped is not None:
+            # other workers are sending at the same time
+            return self.sent_counter.add_until(self.total_tries)
+        if self.sent_counter.now >= self.total_tries:
+            return False
+        self.sent_counter.x
+        return True
+
+    def _send(self, scheduled_time=None):
+        """Send a request, None if reaching total_tries."""
+        if not self._count_sent():
+            return None
+        if scheduled_time is None:
+            callback = self.st_callback
+        else:
+            callback = partial(self.st_callback, scheduled_time=scheduled_time)
+        return self.req.request(callback=callback,
+                                retry=self.retry,
+                                timeout=self.timeout,
+                                **self.request)
+
+    def _sync_open_loop(self, offsets):
+        for offset in offsets:
+            if self._sending_finished():
+                break
+            scheduled_time = self.schedule_start_time + offset
+            delay = scheduled_time - self.TIMER()
+            if delay > 0:
+                time.sleep(delay)
+            if self._send(scheduled_time) is None:
+                break
+        self.schedule_end_time = self.TIMER()
+        self.req.x
+
+    def start_open_loop(self, offsets=None, start_time=None):
+        """Send requests at the time of self.schedule, until the schedule
+        finished or stopped, then wait for the in-flight requests.
+
+        offsets: the part of self.schedule for this worker, defaults to all.
+        start_time: the same beginning of the schedule for all the workers."""
+        offsets = self.schedule if offsets is None else offsets
+        self.schedule_start_time = start_time or self.TIMER()
+        if PY35_PLUS:
+            self.req.loop.run_until_complete(_stress_open_loop(self, offsets))
+        else:
+            self._sync_open_loop(offsets)
+        if self.stop_reason is None and not self.stopped:
+            self.stop_reason = 'schedule finished'
+
+    def rate_report(self):
+        """Achieved vs target RPS of the open-loop mode.
+
+        target_rps: the scheduled requests per second while sending.
+        achieved_rps: the sent requests per second, lower than target_rps if
+        the client could not keep up with the schedule."""
+        if self.schedule_start_time is None:
+            return {}
+        end_time = self.schedule_end_time or self.TIMER()
+        send_time = end_time - self.schedule_start_time
+        if send_time > 0:
+            # sending slower than the schedule should not lower the target
+            window = min(send_time, self.schedule.duration)
+            target_rps = round(self.schedule.expected_count(window) / window, 2)
+            achieved_rps = round(self.sent_counter.now / send_time, 2)
+        else:
+            target_rps = achieved_rps = 0
+        return {
+            'sent': self.sent_counter.now,
+            'responses': self.counter.now,
+            'send_time': round(send_time, 3),
+            'target_rps': target_rps,
+            'achieved_rps': achieved_rps,
+        }
+
+    def _run_worker(self, index, shared_start_time, barrier, queue):
+        self.worker_index = index
+        try:
+            # the loop and the session of the main process can not be shared
+            if PY35_PLUS:
+                self.req = _get_requests_class()(loop=new_event_loop(),
+                                                 **self.req_kwargs)
+            else:
+                self.req = _get_requests_class()(**self.req_kwargs)
+            # start together after all the workers are ready
+            barrier.wait()
+            self.stats = StressStats()
+            if self.schedule is not None:
+                # the k-th request belongs to the worker k % processes
+                self.start_open_loop(
+                    islice(self.schedule, index, None, self.processes),
+                    shared_start_time.value)
+            else:
+                self.start_closed_loop()
+            result = {
+                'stats': self.stats.to_dict(),
+                'stop_reason': self.stop_reason,
+                'schedule_end_time': self.schedule_end_time,
+            }
+        except Exception as error:
+            barrier.abort()
+            self.stop('worker-%s error: %r' % (index, error))
+            result = {'error': repr(error)}
+        queue.put(result)
+
+    def start_processes(self):
+        """Fork self.processes workers, merge their stats and return self.finish()."""
+        context = self._fork_context
+        lock = context.Lock()
+        self.counter = _SharedCounts(context, lock)
+        self.succ_counter = _SharedCounts(context, lock)
+        self.sent_counter = _SharedCounts(context, lock)
+        self._shared_stopped = context.RawValue('b', 0)
+        shared_start_time = context.RawValue('d', 0)
+
+        def set_start_time():
+            shared_start_time.value = self.TIMER()
+
+        barrier = context.Barrier(self.processes, action=set_start_time)
+        queue = context.Queue()
+        workers = [
+            context.Process(target=self._run_worker,
+                            args=(index, shared_start_time, barrier, queue))
+            for index in range(self.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        results = self._collect_results(workers, queue, barrier)
+        for worker in workers:
+            worker.join()
+        self.stats = StressStats()
+        self.stats.start_time = shared_start_time.value or self.stats.start_time
+        end_times = []
+        for result in results:
+            if 'error' in result:
+                self.stop_reason = self.stop_reason or 'worker error: %s' % result[
+                    'error']
+                continue
+            self.stats.merge(StressStats.from_dict(result['stats']))
+            self.stop_reason = self.stop_reason or result['stop_reason']
+            if result['schedule_end_time']:
+                end_times.append(result['schedule_end_time'])
+        if self.schedule is not None:
+            self.schedule_start_time = self.stats.start_time
+            self.schedule_end_time = max(end_times) if end_times else None
+        return self.finish()
+
+    def _collect_results(self, workers, queue, barrier, poll_interval=1):
+        """Get the results of the workers, the crashed workers never post them."""
+        results = []
+        while len(results) < len(workers):
+            try:
+                results.append(queue.get(timeout=poll_interval))
+                continue
+            except Empty:
+                pass
+            if any(worker.exitcode for worker in workers):
+                # stop the others waiting for the barrier or sending
+                barrier.abort()
+                self._shared_stopped.value = 1
+            if not any(worker.is_alive() for worker in workers):
+                # the results posted before exiting are in the pipe already
+                try:
+                    while len(results) < len(workers):
+                        results.append(queue.get(timeout=0.1))
+                except Empty:
+                    break
+        if len(results) < len(workers):
+            results.append({
+                'error': 'worker exited without result, exitcodes: %s' %
+                         [worker.exitcode for worker in workers]
+            })
+        return results
+
+    def report(self):
+        """The machine-readable report of the stress test."""
+        result = self.stats.report()
+        result.update({
+            'url': self.request.get('url'),
+            'method': self.request.get('method'),
+            'start_time': self.start_time_readable,
+            'stop_reason': self.stop_reason,
+            'sent': self.sent_counter.now,
+            'original_response': self.original_response,
+        })
+        if self.schedule is not None:
+            result['open_loop'] = self.rate_report()
+        if self.processes > 1:
+            result['processes'] = self.processes
+        return result
+
+    def finish(self):
+        """Print the final summary, dump the report to self.report_path, and return the report."""
+        report = self.report()
+        print_info(StressStats.format_summary(report))
+        if report.get('open_loop'):
+            print_info('open-loop: sent %(sent)s in %(send_time)ss, '
+                       'target %(target_rps)s req/s, achieved '
+                       '%(achieved_rps)s req/s' % report['open_loop'])
+        if self.report_path:
+            with open(self.report_path, 'w') as f:
+                json.dump(report, f, indent=2, default=repr)
+        return report
+
     @property
     def x(self):
         """This attribute returns self.start()"""
         return self.start()
+
+
+class Frontier(object):
+    """Crawl frontier with one queue for each host, only yields the requests whose hosts are ready.
+
+    The hosts are kept in a heap of the ready time of their Frequency, so the
+    requests of a busy host will not hold the `Requests` while the other hosts
+    are idle. The requests are deduplicated, and the higher priority ones go first.
+
+    :param frequencies: None or {host: Frequency obj} or {host: [n, interval]}
+    :param default_host_frequency: the frequency of the hosts not in frequencies, (1, 1) by default, None for unlimited.
+    :param dedup: True (a set), False, or the object whose `add(key)` returns True for the new key, like `utils.BloomFilter` / `utils.DiskSet`.
+    :param key: function to get the dedup key of the request dict, method + sorted url + data by default.
+    :param idle_timeout: stop the async iteration after idle seconds without any request, None to wait until `close`.
+
+    Basic Usage::
+
+        import asyncio
+        from torequests.crawlers import Frontier
+        from torequests.dummy import Requests
+
+
+        async def main():
+            frontier = Frontier(default_host_frequency=(2, 1), idle_timeout=3)
+            frontier.add('http://httpbin.org/get?a=1')
+            frontier.add('http://httpbin.org/get?a=2', priority=1)
+            frontier.add('http://example.com/')
+            async with Requests() as req:
+                async for request in frontier:
+                    # callback could frontier.add the new links
+                    req.request(**request, callback=lambda r: print(r.url))
+
+        asyncio.run(main())
+    """
+    TIMER = time.time
+
+    def __init__(self,
+                 frequencies=None,
+                 default_host_frequency=(1, 1),
+                 dedup=True,
+                 key=None,
+                 idle_timeout=None):
+        self.frequencies = {
+            host: Frequency.ensure_frequency(frequency)
+            for host, frequency in (frequencies or {}).items()
+        }
+        self.default_host_frequency = default_host_frequency
+        self.seen = set() if dedup is True else (dedup or None)
+        self.key = key or self.default_key
+        self.idle_timeout = idle_timeout
+        self.closed = False
+        # host -> heap of (-priority, sequence, request)
+        self._queues = {}
+        # heap of (ready_at, sequence, host), the hosts waiting for their frequencies
+        self._waiting = []
+        # heap of (-priority, sequence, host), the ready hosts
+        self._ready = []
+        # host -> 'waiting' / 'ready'
+        self._states = {}
+        # host -> sequence of its live entry in self._ready, the others are stale
+        self._ready_sequences = {}
+        self._counter = itertools_count()
+        self._size = 0
+        self._lock = Lock()
+        # asyncio.Event for the async iterator, set while adding
+        self._event = None
+        self._loop = None
+
+    @staticmethod
+    def default_key(request):
+        return "%s %s %s" % (request["method"], sort_url_query(request["url"]),
+                             request.get("data") or "")
+
+    def get_frequency(self, host):
+        frequency = self.frequencies.get(host)
+        if frequency is None:
+            frequency = self.frequencies.setdefault(
+                host,
+                Frequency.ensure_frequency(self.default_host_frequency or
+                                           (None,)))
+        return frequency
+
+    def _is_new(self, key):
+        if isinstance(self.seen, set):
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+            return True
+        return self.seen.add(key)
+
+    def add(self, request, priority=0):
+        """Add the request (url / curl / dict), return False if it's a duplicate one.
+
+        :param priority: the requests with higher priority go first.
+        """
+        request = ensure_request(request)
+        host = urlparse(request["url"]).netloc
+        with self._lock:
+            if self.seen is not None and not self._is_new(self.key(request)):
+                return False
+            queue = self._queues.setdefault(host, [])
+            heappush(queue, (-priority, next(self._counter), request))
+            self._size += 1
+            state = self._states.get(host)
+            if state is None:
+                self._schedule(host)
+            elif state == "ready" and queue[0][2] is request:
+                # the ready host has a new head with higher priority
+                self._push_ready(host, -priority)
+        self._wake_up()
+        return True
+
+    def add_many(self, requests, priority=0):
+        """Add the requests, return the count of the new ones."""
+        return sum(self.add(request, priority) for request in requests)
+
+    def _wake_up(self):
+        # add / close may be called from the threads other than the loop's
+        if self._event is not None:
+            _set_event(self._loop, self._event)
+
+    def _push_ready(self, host, priority):
+        sequence = next(self._counter)
+        heappush(self._ready, (priority, sequence, host))
+        self._ready_sequences[host] = sequence
+        self._states[host] = "ready"
+
+    def _schedule(self, host):
+        ready_at = self.get_frequency(host).next_ready_at()
+        heappush(self._waiting, (ready_at, next(self._counter), host))
+        self._states[host] = "waiting"
+
+    def pop_ready(self, now=None):
+        """Return (request, 0) of a ready host without blocking, or (None, seconds to wait).
+        The seconds is None if the frontier is empty."""
+        with self._lock:
+            now = self.TIMER() if now is None else now
+            waiting, ready = self._waiting, self._ready
+            while waiting and waiting[0][0] <= now:
+                host = heappop(waiting)[2]
+                self._push_ready(host, self._queues[host][0][0])
+            while ready:
+                _, sequence, host = heappop(ready)
+                if self._ready_sequences.get(host) != sequence:
+                    # stale entry, replaced by the one with higher priority
+                    continue
+                del self._ready_sequences[host]
+                queue = self._queues[host]
+                request = heappop(queue)[2]
+                self._size -= 1
+                self.get_frequency(host).reserve()
+                if queue:
+                    self._schedule(host)
+                else:
+                    del self._queues[host]
+                    del self._states[host]
+                return request, 0
+            return None, (waiting[0][0] - now if waiting else None)
+
+    def close(self):
+        """Stop the async iteration after the rest requests are yielded."""
+        self.closed = True
+        self._wake_up()
+
+    def __len__(self):
+        return self._size
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return _frontier_anext(self)
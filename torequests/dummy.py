@@ -1,24 +1,65 @@
-from asyncio import (Future, Queue, Task, TimeoutError, as_completed, gather,
-                     get_event_loop, iscoroutine, new_event_loop, sleep, wait,
-                     wait_for)
+from asyncio import Event as AsyncEvent
+from asyncio import (CancelledError, Future, Queue, Task, TimeoutError,
+                     as_completed, gather, get_event_loop, get_running_loop,
+                     iscoroutine, new_event_loop, run_coroutine_threadsafe,
+                     set_event_loop, sleep, wait, wait_for)
 from asyncio.futures import _chain_future
-from concurrent.futures import ALL_COMPLETED
-from functools import wraps
+from collections import deque
+from concurrent.futures import ALL_COMPLETED, ThreadPoolExecutor
+from functools import partial, wraps
+from threading import Event, Lock, Thread, current_thread
 from time import sleep as time_sleep
 from time import time as time_time
 from typing import (Callable, Coroutine, Dict, List, Optional, Sequence, Set,
                     Union)
 from urllib.parse import urlparse
+from weakref import WeakSet
 
 from aiohttp import BasicAuth, ClientError, ClientSession, ClientTimeout
 
-from ._py3_patch import (NewResponse, NotSet, _ensure_can_be_await,
-                         _exhaust_simple_coro, _py36_all_task_patch, logger)
-from .exceptions import FailureException, ValidationError
+from ._aiohttp_patch import NewResponse
+from ._py3_patch import (NotSet, _ensure_can_be_await,
+                         _exhaust_simple_coro, _py36_all_task_patch,
+                         _set_event, logger)
+from .exceptions import FailureException, ProxyUnavailable, ValidationError
 from .frequency_controller.async_tools import AsyncFrequency as Frequency
-from .main import Error, NewFuture, Pool, ProcessPool
+from .main import Error, NewExecutorPoolMixin, NewFuture, Pool, ProcessPool
+from .utils import Cooldown
 
-__all__ = "NewTask Loop Asyncme coros Requests Workshop".split(" ")
+__all__ = "NewTask CompactTask Loop Asyncme coros Requests SyncRequests AsyncCooldown Workshop".split(
+    " ")
+
+
+def _run_chunk(func, chunk):
+    """Used by Loop.map_in_executor, module level function for pickling."""
+    return [func(item) for item in chunk]
+
+
+async def _get_proxy(proxy_pool, exclude=None):
+    """Wait for a ready proxy of the ProxyPool without blocking the loop, None if timeout.
+    Wake up once the proxies are added or updated, instead of polling."""
+    timeout = proxy_pool.timeout
+    deadline = None if timeout is None else time_time() + timeout
+    event = AsyncEvent()
+    wake_up = partial(_set_event, get_running_loop(), event)
+    proxy_pool.cooldown.add_listener(wake_up)
+    try:
+        while 1:
+            event.clear()
+            proxy, wait = proxy_pool.try_get(exclude)
+            if proxy is not None:
+                return proxy
+            if deadline is not None:
+                remaining = deadline - time_time()
+                if remaining <= 0:
+                    return None
+                wait = remaining if wait is None else min(wait, remaining)
+            try:
+                await wait_for(event.wait(), timeout=wait)
+            except TimeoutError:
+                pass
+    finally:
+        proxy_pool.cooldown.remove_listener(wake_up)
 
 
 class NewTask(Task):
@@ -115,8 +156,70 @@ class NewTask(Task):
             object.__setattr__(self, name, value)
 
 
+class CompactTask(Task):
+    """Lightweight NewTask for submitting huge amounts of coroutines, used by `Loop(compact=True)`.
+
+    Use `__slots__` instead of `__dict__`, keep no extra_args, and store the
+    callbacks as they are, one shared function invokes them instead of
+    wrapping each callback in a new closure for each task.
+    Same api as NewTask: x / cx / callback_result / task_cost_time.
+    """
+
+    __slots__ = ("_callback", "_callback_result", "task_start_time",
+                 "task_end_time")
+    _PENDING = NewTask._PENDING
+    _CANCELLED = NewTask._CANCELLED
+    _FINISHED = NewTask._FINISHED
+    _RESPONSE_ARGS = NewTask._RESPONSE_ARGS
+
+    def __init__(self,
+                 coro,
+                 *,
+                 loop=None,
+                 callback: Union[Callable, Sequence] = None):
+        assert iscoroutine(coro), repr(coro)
+        super().__init__(coro, loop=loop)
+        self._callback_result = NotSet
+        self.task_start_time = time_time()
+        self.task_end_time = 0.0
+        if callback:
+            if isinstance(callback, (list, set)):
+                callback = tuple(callback)
+            self._callback = callback
+            self.add_done_callback(CompactTask._invoke_callbacks)
+        else:
+            self._callback = None
+
+    @staticmethod
+    def _invoke_callbacks(task: 'CompactTask'):
+        """Set the task_end_time and the last callback's result as self._callback_result."""
+        task.task_end_time = time_time()
+        callback = task._callback
+        for fn in (callback if isinstance(callback, tuple) else (callback,)):
+            try:
+                task._callback_result = fn(task)
+            except Exception as e:
+                logger.error("exception calling callback for %s" % e)
+
+    @property
+    def task_cost_time(self):
+        if self.task_end_time:
+            return self.task_end_time - self.task_start_time
+        return 0.0
+
+    _done_callbacks = NewTask._done_callbacks
+    cx = NewTask.cx
+    callback_result = NewTask.callback_result
+    x = NewTask.x
+    __getattr__ = NewTask.__getattr__
+    __setattr__ = NewTask.__setattr__
+
+
 class Loop:
-    """Handle the event loop like a thread pool."""
+    """Handle the event loop like a thread pool.
+
+    :param compact: `True` will submit CompactTask instead of NewTask, less memory for huge amounts of tasks.
+    """
 
     def __init__(self,
                  n: int = None,
@@ -124,8 +227,11 @@ class Loop:
                  timeout: Optional[float] = None,
                  default_callback: Optional[Callable] = None,
                  loop=None,
+                 compact: bool = False,
                  **kwargs):
         self._loop = loop
+        self._executors: Dict[str, Union[Pool, ProcessPool]] = {}
+        self.compact = compact
         self.default_callback = default_callback
         self.async_running = False
         self._timeout = timeout
@@ -164,15 +270,76 @@ class Loop:
         return self.loop.run_in_executor(executor, func, *args)
 
     def run_in_thread_pool(self, pool_size=None, func=None, *args):
-        """If `kwargs` needed, try like this: `func=lambda: foo(*args, **kwargs)`"""
-        executor = Pool(pool_size)
+        """If `kwargs` needed, try like this: `func=lambda: foo(*args, **kwargs)`
+
+        The thread pool is shared by the calls, pool_size only works while creating it."""
+        executor = self.get_executor(kind="thread", size=pool_size)
         return self.loop.run_in_executor(executor, func, *args)
 
     def run_in_process_pool(self, pool_size=None, func=None, *args):
-        """If `kwargs` needed, try like this: `func=lambda: foo(*args, **kwargs)`"""
-        executor = ProcessPool(pool_size)
+        """If `kwargs` needed, try like this: `func=lambda: foo(*args, **kwargs)`
+
+        The process pool is shared by the calls, pool_size only works while creating it."""
+        executor = self.get_executor(kind="process", size=pool_size)
         return self.loop.run_in_executor(executor, func, *args)
 
+    def get_executor(self,
+                     name: Optional[str] = None,
+                     kind: str = "thread",
+                     size: Optional[int] = None) -> Union[Pool, ProcessPool]:
+        """Return the executor of the name, create a new one if not exists.
+
+        :param name: name of the executor, defaults to the kind.
+        :param kind: "thread" for Pool, "process" for ProcessPool.
+        :param size: max_workers of the new executor, ignored if the executor exists.
+        """
+        name = name or kind
+        executor = self._executors.get(name)
+        if executor is None:
+            if kind == "thread":
+                executor = Pool(size)
+            elif kind == "process":
+                executor = ProcessPool(size)
+            else:
+                raise ValueError('kind should be "thread" or "process"')
+            self._executors[name] = executor
+        return executor
+
+    def shutdown_executors(self, wait=True):
+        """Shutdown all the executors created by self.get_executor."""
+        executors = list(self._executors.values())
+        self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+    async def map_in_executor(self,
+                              func: Callable,
+                              iterable,
+                              chunksize: Optional[int] = None,
+                              name: Optional[str] = None,
+                              kind: str = "thread",
+                              size: Optional[int] = None) -> list:
+        """Similar to executor.map, but await the list of results.
+        The items are sent to the executor in chunks, to amortize the pickling cost of process pool.
+
+        :param chunksize: items for each call, defaults to len(items) / (max_workers * 4)
+        """
+        executor = self.get_executor(name=name, kind=kind, size=size)
+        items = list(iterable)
+        if not items:
+            return []
+        if not chunksize:
+            chunksize = max(1, len(items) // (executor._max_workers * 4))
+        futures = [
+            self.loop.run_in_executor(executor, _run_chunk, func,
+                                      items[index:index + chunksize])
+            for index in range(0, len(items), chunksize)
+        ]
+        result = []
+        for chunk_result in await gather(*futures):
+            result.extend(chunk_result)
+        return result
+
     def run_coroutine_threadsafe(self, coro, loop=None, callback=None):
         """Be used when loop running in a single non-main thread."""
         if not iscoroutine(coro):
@@ -250,6 +417,8 @@ class Loop:
         callback = callback or self.default_callback
         if self.async_running:
             return self.run_coroutine_threadsafe(coro, callback=callback)
+        elif self.compact:
+            return CompactTask(coro, loop=self.loop, callback=callback)
         else:
             return NewTask(coro, loop=self.loop, callback=callback)
 
@@ -316,7 +485,8 @@ class Loop:
             time_sleep(interval)
 
     def close(self):
-        """Close the event loop."""
+        """Close the event loop and the executors."""
+        self.shutdown_executors()
         self.loop.close()
 
     @property
@@ -369,6 +539,9 @@ class Requests(Loop):
     :param default_callback: None
     :param frequencies: None or {host: Frequency obj} or {host: [n, interval]}
     :param default_host_frequency: None, or tuple like: (2, 1). global_frequency is shared by hosts, default_host_frequency will be setdefault as a new one.
+    :param compact: `True` will return CompactTask instead of NewTask, less memory for huge amounts of requests.
+    :param proxy_pool: None or :class:`torequests.utils.ProxyPool`, each request will be sent through a ready proxy, and the retries will choose different proxies. The attempt fails as ProxyUnavailable after waiting `proxy_pool.timeout` seconds. Ignored if the `proxies` / `proxy` arg is given.
+    :param recorder: None or :class:`torequests.replay.Recorder`, record the successful responses for replaying.
     :param kwargs: will used for aiohttp.ClientSession.
 
     Basic Usage::
@@ -441,11 +614,17 @@ class Requests(Loop):
                  *,
                  loop=None,
                  return_exceptions: Optional[bool] = None,
+                 compact: bool = False,
+                 proxy_pool=None,
+                 recorder=None,
                  **kwargs):
         super().__init__(
             loop=loop,
             default_callback=default_callback,
+            compact=compact,
         )
+        self.proxy_pool = proxy_pool
+        self.recorder = recorder
         # Requests object use its own frequency control, instead of the parent class's.
         self.n = n
         self.interval = interval
@@ -534,10 +713,25 @@ class Requests(Loop):
         kwargs["method"] = method
         kwargs = self.fix_aiohttp_request_args(kwargs)
         error = Exception()
+        # the proxy arg has a higher priority than the proxy_pool
+        proxy_pool = None if "proxy" in kwargs else self.proxy_pool
+        tried_proxies = set()
         for retries in range(retry + 1):
+            if proxy_pool:
+                # reserve the proxy before taking the slot of frequency
+                proxy = await _get_proxy(
+                    proxy_pool, proxy_pool.next_exclude(tried_proxies))
+                if proxy is None:
+                    error = ProxyUnavailable("no proxy available for %s" % url)
+                    continue
+                tried_proxies.add(proxy)
+                kwargs["proxy"] = proxy_pool.proxy_url(proxy)
             async with frequency:
+                if proxy_pool:
+                    proxy_start = time_time()
                 try:
                     session = await self.session
+                    request_start = time_time()
                     async with session.request(**kwargs) as resp:
                         if encoding:
                             resp.encoding = encoding
@@ -547,29 +741,48 @@ class Requests(Loop):
                             raise ValidationError(response_validator.__name__)
                         await resp.read()
                         resp.release()
+                        if proxy_pool:
+                            proxy_pool.report(proxy, True,
+                                              time_time() - proxy_start)
+                        if self.recorder:
+                            # sha1 and file writing in the writer thread
+                            self.recorder.record_response(
+                                resp,
+                                time_time() - request_start,
+                                request_start,
+                                wait=False)
                         return resp
                 except self.retry_exceptions as err:
                     error = err
+                    if proxy_pool:
+                        proxy_pool.report(proxy, False,
+                                          time_time() - proxy_start)
                     logger.debug(
                         "Retry %s for the %s time, Exception: %r . kwargs= %s" %
                         (url, retries + 1, err, kwargs))
                     if retry_interval:
                         await sleep(retry_interval)
                     continue
+                except Exception:
+                    if proxy_pool:
+                        proxy_pool.report(proxy, False,
+                                          time_time() - proxy_start)
+                    raise
+        if proxy_pool:
+            kwargs.pop("proxy", None)
+        kwargs["retry"] = retry
+        if referer_info is not NotSet:
+            kwargs["referer_info"] = referer_info
+        if encoding:
+            kwargs["encoding"] = encoding
+        logger.debug("Retry %s times failed again: %s." % (retry, error))
+        failure = FailureException(error)
+        setattr(failure, 'request', kwargs)
+        setattr(failure, 'referer_info', referer_info)
+        if self.catch_exception:
+            return failure
         else:
-            kwargs["retry"] = retry
-            if referer_info is not NotSet:
-                kwargs["referer_info"] = referer_info
-            if encoding:
-                kwargs["encoding"] = encoding
-            logger.debug("Retry %s times failed again: %s." % (retry, error))
-            failure = FailureException(error)
-            setattr(failure, 'request', kwargs)
-            setattr(failure, 'referer_info', referer_info)
-            if self.catch_exception:
-                return failure
-            else:
-                raise failure
+            raise failure
 
     def request(self,
                 method: str,
@@ -692,6 +905,7 @@ class Requests(Loop):
                             **kwargs)
 
     async def close(self):
+        self.shutdown_executors(wait=False)
         if self._closed:
             return
         if self._session is None:
@@ -747,6 +961,307 @@ class Requests(Loop):
         return kwargs
 
 
+def _run_loop_forever(loop, started: Event):
+    set_event_loop(loop)
+    loop.call_soon(started.set)
+    loop.run_forever()
+    # stopped by shutdown, or by __del__ in the loop thread which can not wait
+    if not loop.is_closed():
+        loop.close()
+
+
+class SyncRequests(NewExecutorPoolMixin):
+    """Run the Requests in a background thread, for the sync code without driving the event loop.
+
+    The requests are returned as NewFuture like tPool, and the submissions are
+    sent to the loop thread in batches, only one `call_soon_threadsafe` for the
+    requests submitted before the loop takes them.
+
+    The callbacks run in a thread pool of `callback_workers` threads, a slow
+    callback will not block the requests in the loop thread.
+
+    :param timeout: default timeout for NewFuture.x
+    :param callback_workers: max threads of the callbacks.
+    :param args / kwargs: the same as :class:`Requests <Requests>`
+
+    Basic Usage::
+
+        from torequests.dummy import SyncRequests
+
+        with SyncRequests(n=100) as req:
+            tasks = [req.get('http://p.3.cn', callback=lambda f: f.x.status_code) for _ in range(1000)]
+            req.x
+            print([task.cx for task in tasks][:3])
+            # [200, 200, 200]
+    """
+
+    def __init__(self,
+                 *args,
+                 timeout: Optional[float] = None,
+                 callback_workers: int = 4,
+                 **kwargs):
+        self._timeout = timeout
+        self._callback_executor = ThreadPoolExecutor(
+            callback_workers, thread_name_prefix="SyncRequests-callback")
+        self._all_futures = WeakSet()
+        self._pending: deque = deque()
+        self._tasks: Set[Task] = set()
+        self._lock = Lock()
+        self._flush_scheduled = False
+        self._shutdown = False
+        self.loop = new_event_loop()
+        started = Event()
+        self._thread = Thread(target=_run_loop_forever,
+                              args=(self.loop, started),
+                              name="SyncRequests-loop")
+        self._thread.daemon = True
+        self._thread.start()
+        started.wait()
+        self.req = Requests(*args, loop=self.loop, **kwargs)
+        self.catch_exception = self.req.catch_exception
+        self.default_callback = self.req.default_callback
+
+    @property
+    def all_tasks(self):
+        """Keep the same api for tPool, return self._all_futures actually"""
+        return self._all_futures
+
+    def submit(self, coro_function: Callable, *args, **kwargs) -> NewFuture:
+        """Run `coro_function(*args, **kwargs)` in the loop thread, return a NewFuture."""
+        callback = kwargs.pop("callback", None) or self.default_callback
+        future = NewFuture(self._timeout,
+                           callback=callback,
+                           catch_exception=self.catch_exception)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._pending.append((future, coro_function, args, kwargs))
+            self._all_futures.add(future)
+            if self._flush_scheduled:
+                return future
+            self._flush_scheduled = True
+        self.loop.call_soon_threadsafe(self._flush)
+        return future
+
+    def _flush(self):
+        """Create tasks for all the pending submissions, run in the loop thread."""
+        with self._lock:
+            self._flush_scheduled = False
+        pending = self._pending
+        while pending:
+            future, coro_function, args, kwargs = pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            task = self.loop.create_task(
+                self._run(future, coro_function, args, kwargs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    def _set_future(future, result, error):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def _finish(self, future, result=None, error=None):
+        """Set the future in the callback threads if it has callbacks, not to block the loop."""
+        if future._done_callbacks:
+            try:
+                self._callback_executor.submit(self._set_future, future,
+                                               result, error)
+                return
+            except RuntimeError:
+                # the executor has been shutdown
+                pass
+        self._set_future(future, result, error)
+
+    async def _run(self, future, coro_function, args, kwargs):
+        try:
+            result = await coro_function(*args, **kwargs)
+        except CancelledError as error:
+            self._finish(future, error=error)
+            raise
+        except Exception as error:
+            self._finish(future, error=error)
+        else:
+            self._finish(future, result)
+
+    def request(self,
+                method: str,
+                url: str,
+                callback: Optional[Callable] = None,
+                retry: int = 0,
+                response_validator: Optional[Callable] = None,
+                **kwargs) -> NewFuture:
+        """Similar to `requests.request`, but return as NewFuture."""
+        return self.submit(self.req._request,
+                           method,
+                           url=url,
+                           retry=retry,
+                           response_validator=response_validator,
+                           callback=callback,
+                           **kwargs)
+
+    def get(self,
+            url: str,
+            params: Optional[dict] = None,
+            callback: Optional[Callable] = None,
+            retry: int = 0,
+            response_validator: Optional[Callable] = None,
+            **kwargs) -> NewFuture:
+        return self.request("get",
+                            url=url,
+                            params=params,
+                            callback=callback,
+                            retry=retry,
+                            response_validator=response_validator,
+                            **kwargs)
+
+    def post(self,
+             url: str,
+             data=None,
+             callback: Optional[Callable] = None,
+             retry: int = 0,
+             response_validator: Optional[Callable] = None,
+             **kwargs) -> NewFuture:
+        return self.request("post",
+                            url=url,
+                            data=data,
+                            callback=callback,
+                            retry=retry,
+                            response_validator=response_validator,
+                            **kwargs)
+
+    def delete(self, url: str, callback: Optional[Callable] = None,
+               **kwargs) -> NewFuture:
+        return self.request("delete", url=url, callback=callback, **kwargs)
+
+    def put(self,
+            url: str,
+            data=None,
+            callback: Optional[Callable] = None,
+            **kwargs) -> NewFuture:
+        return self.request("put",
+                            url=url,
+                            data=data,
+                            callback=callback,
+                            **kwargs)
+
+    def head(self,
+             url: str,
+             callback: Optional[Callable] = None,
+             allow_redirects: bool = False,
+             **kwargs) -> NewFuture:
+        kwargs['allow_redirects'] = allow_redirects
+        return self.request("head", url=url, callback=callback, **kwargs)
+
+    def options(self, url: str, callback: Optional[Callable] = None,
+                **kwargs) -> NewFuture:
+        return self.request("options", url=url, callback=callback, **kwargs)
+
+    def patch(self, url: str, callback: Optional[Callable] = None,
+              **kwargs) -> NewFuture:
+        return self.request("patch", url=url, callback=callback, **kwargs)
+
+    async def _close(self, wait_tasks: bool):
+        # the pending submissions have been flushed before this coroutine
+        tasks = list(self._tasks)
+        if not wait_tasks:
+            for task in tasks:
+                task.cancel()
+        if tasks:
+            await gather(*tasks, return_exceptions=True)
+        await self.req.close()
+
+    def shutdown(self, wait=True):
+        """Wait for (or cancel if not wait) the running requests, close the session and stop the loop thread."""
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+        if self.loop.is_closed():
+            return
+        if current_thread() is self._thread:
+            # can not wait for the loop in its own thread (like __del__ by gc),
+            # stop it after closing, the loop thread will close the loop.
+            task = self.loop.create_task(self._close(False))
+            task.add_done_callback(lambda _: self.loop.stop())
+            self._callback_executor.shutdown(wait=False)
+            return
+        try:
+            run_coroutine_threadsafe(self._close(wait), self.loop).result()
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self._callback_executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def __del__(self):
+        try:
+            self.shutdown(wait=False)
+        except Exception:
+            pass
+
+
+class AsyncCooldown(Cooldown):
+    """Cooldown for the coroutines, `await cd.get()` without blocking the event loop.
+
+    Basic Usage::
+
+        from torequests.dummy import AsyncCooldown, Requests
+
+        proxies = AsyncCooldown(['127.0.0.1:1080', '127.0.0.1:1081'], interval=1)
+
+        async def crawl(req, url):
+            proxy = await proxies.get(timeout=5)
+            return await req.get(url, proxies={'http': proxy})
+    """
+
+    def __init__(self, init_items=None, interval=0, born_at_now=False):
+        self._event = None
+        self._loop = None
+        super().__init__(init_items=init_items,
+                         interval=interval,
+                         born_at_now=born_at_now)
+
+    def _notify(self):
+        # add_item / update_item may be called from other threads
+        if self._event is not None:
+            _set_event(self._loop, self._event)
+
+    async def get(self, timeout=None, default=None, exclude=None):
+        """Return the first ready item, wait at most `timeout` seconds, or return the default."""
+        deadline = None if timeout is None else time_time() + timeout
+        while 1:
+            now = time_time()
+            with self._condition:
+                ok, item, wait = self._pop_ready(now, exclude)
+                if ok:
+                    return item
+                if self._event is None:
+                    self._loop = get_running_loop()
+                    self._event = AsyncEvent()
+                self._event.clear()
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    return default
+                wait = remaining if wait is None else min(wait, remaining)
+            try:
+                await wait_for(self._event.wait(), timeout=wait)
+            except TimeoutError:
+                pass
+
+
 class Workshop:
     """Simple solution for producer-consumer problem.
     WARNING: callback should has its own timeout to avoid blocking to long.
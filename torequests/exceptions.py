@@ -61,3 +61,7 @@ class ImportErrorModule(CommonException, ImportError):
 
 class ValidationError(ValueError):
     pass
+
+
+class ProxyUnavailable(ValueError):
+    pass
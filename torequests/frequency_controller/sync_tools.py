@@ -31,8 +31,14 @@ class Frequency(object):
             assert result[4] - now > 2
             assert frequency.to_dict() == {'n': 2, 'interval': 1}
             assert frequency.to_list() == [2, 1]
+
+        Reserve Usage::
+
+            # reserve a slot without sleeping, and run the task after the returned timestamp
+            ready_at = frequency.reserve()
     """
-    __slots__ = ("gen", "repr", "lock", "__enter__", "n", "interval")
+    __slots__ = ("gen", "repr", "lock", "__enter__", "n", "interval", "_q",
+                 "_index")
     TIMER = time
 
     def __init__(self, n=None, interval=0):
@@ -41,6 +47,9 @@ class Frequency(object):
         self.repr = "Frequency({n}, {interval})".format(n=n, interval=interval)
         if n:
             self.lock = Lock()
+            # the last start time of each slot, shared by generator and reserve
+            self._q = [0] * n
+            self._index = 0
             # generator is a little faster than Queue, and using little memory
             self.gen = self.generator(n, interval)
             self.__enter__ = self._acquire
@@ -57,17 +66,33 @@ class Frequency(object):
         return {'n': self.n, 'interval': self.interval}
 
     def generator(self, n=2, interval=1):
-        q = [0] * n
         while 1:
-            for index, i in enumerate(q):
-                # or timeit.default_timer()
-                now = self.TIMER()
-                diff = now - i
-                if diff < interval:
-                    sleep(interval - diff)
-                now = self.TIMER()
-                q[index] = now
-                yield now
+            diff = self._reserve() - self.TIMER()
+            if diff > 0:
+                sleep(diff)
+            yield self.TIMER()
+
+    def _reserve(self):
+        # should be called with self.lock
+        index = self._index
+        self._index = (index + 1) % self.n
+        ready_at = max(self._q[index] + self.interval, self.TIMER())
+        self._q[index] = ready_at
+        return ready_at
+
+    def reserve(self):
+        """Take the next slot without sleeping, return the timestamp when the slot is ready."""
+        if not self.gen:
+            return self.TIMER()
+        with self.lock:
+            return self._reserve()
+
+    def next_ready_at(self):
+        """Return the timestamp when the next slot is ready, without taking it."""
+        if not self.gen:
+            return self.TIMER()
+        with self.lock:
+            return max(self._q[self._index] + self.interval, self.TIMER())
 
     @classmethod
     def ensure_frequency(cls, frequency):
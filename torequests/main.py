@@ -2,6 +2,7 @@
 # python2 requires: pip install futures
 
 import atexit
+from concurrent.futures import thread as futures_thread
 from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
                                 as_completed)
 from concurrent.futures._base import (CANCELLED, CANCELLED_AND_NOTIFIED,
@@ -9,19 +10,22 @@ from concurrent.futures._base import (CANCELLED, CANCELLED_AND_NOTIFIED,
                                       CancelledError, Error, Executor, Future,
                                       TimeoutError)
 from concurrent.futures.thread import _threads_queues, _WorkItem
-from functools import wraps
+from functools import partial, wraps
+from heapq import heappop, heappush
+from itertools import count
 from logging import getLogger
-from threading import Thread, Timer
+from threading import Condition, Event, Lock, Thread, Timer
 from time import sleep
 from time import time as time_time
-from weakref import WeakSet
+from weakref import WeakSet, ref
 
-from requests import PreparedRequest, RequestException, Session
+from requests import PreparedRequest, RequestException, Response, Session
 from requests.adapters import HTTPAdapter
+from requests.compat import urlparse
 from urllib3 import disable_warnings
 
-from .configs import Config
-from .exceptions import FailureException, ValidationError
+from .configs import Config, loads_bytes
+from .exceptions import FailureException, ProxyUnavailable, ValidationError
 from .frequency_controller.sync_tools import Frequency
 from .versions import PY2, PY3
 
@@ -29,11 +33,16 @@ try:
     from queue import Empty, Queue
 except ImportError:
     from Queue import Empty, Queue
+try:
+    # requests 2.27+
+    from requests.exceptions import JSONDecodeError as RequestsJSONDecodeError
+except ImportError:
+    RequestsJSONDecodeError = None
 if PY3:
     from concurrent.futures.process import BrokenProcessPool
 
 __all__ = [
-    "Pool", "ProcessPool", "NewFuture", "Async", "threads",
+    "Pool", "ProcessPool", "NewFuture", "CompactFuture", "Async", "threads",
     "get_results_generator", "run_after_async", "tPool", "get", "post",
     "options", "delete", "put", "head", "patch", "request", "disable_warnings",
     "Workshop"
@@ -97,6 +106,131 @@ class NewExecutorPoolMixin(Executor):
         return fs
 
 
+class _AutoscaleState(object):
+    """Worker counters shared by the autoscale Pool and its worker threads."""
+    __slots__ = ("lock", "min_workers", "keepalive", "workers", "idle")
+
+    def __init__(self, min_workers, keepalive):
+        self.lock = Lock()
+        self.min_workers = min_workers
+        self.keepalive = keepalive
+        self.workers = 0
+        self.idle = 0
+
+
+def _autoscale_worker(executor_reference, work_queue, state, initializer,
+                      initargs):
+    """Same as concurrent.futures.thread._worker, but exit after idle for state.keepalive seconds."""
+    if initializer is not None:
+        try:
+            initializer(*initargs)
+        except BaseException:
+            logger.critical("Exception in initializer:", exc_info=True)
+            executor = executor_reference()
+            if executor is not None:
+                executor._initializer_failed()
+            with state.lock:
+                state.workers -= 1
+            return
+    try:
+        while True:
+            with state.lock:
+                state.idle += 1
+            try:
+                work_item = work_queue.get(block=True, timeout=state.keepalive)
+            except Empty:
+                work_item = False
+            with state.lock:
+                state.idle -= 1
+                if work_item is False:
+                    if state.workers > state.min_workers and work_queue.empty():
+                        # idle for keepalive seconds, shrink the pool
+                        state.workers -= 1
+                        workers = state.workers
+                        break
+                    continue
+            if work_item is not None:
+                work_item.run()
+                del work_item
+                continue
+            executor = executor_reference()
+            if futures_thread._shutdown or executor is None or executor._shutdown:
+                if executor is not None:
+                    executor._shutdown = True
+                with state.lock:
+                    state.workers -= 1
+                work_queue.put(None)
+                return
+            del executor
+    except BaseException:
+        logger.critical("Exception in worker", exc_info=True)
+        with state.lock:
+            state.workers -= 1
+        return
+    executor = executor_reference()
+    if executor is not None:
+        executor._on_resize(workers)
+
+
+class _ReadyTimeScheduler(object):
+    """Keep the work items in a heap of ready time, send them to the Pool once they are ready."""
+
+    def __init__(self, executor):
+        self.heap = []
+        self.counter = count()
+        self.condition = Condition(Lock())
+        self.closed = False
+        t = Thread(
+            name="%s_scheduler" % (executor._thread_name_prefix or executor),
+            target=self._run,
+            args=(ref(executor, lambda _: self.close()),),
+        )
+        t.daemon = True
+        t.start()
+
+    def push(self, ready_at, work_item):
+        with self.condition:
+            heappush(self.heap, (ready_at, next(self.counter), work_item))
+            if self.heap[0][2] is work_item:
+                # wake up for the earlier ready time
+                self.condition.notify()
+
+    def close(self):
+        """Stop the scheduler thread and cancel all the waiting tasks."""
+        with self.condition:
+            self.closed = True
+            work_items = [item[2] for item in self.heap]
+            del self.heap[:]
+            self.condition.notify()
+        for w in work_items:
+            w.future.cancel()
+
+    def _run(self, executor_reference):
+        while 1:
+            with self.condition:
+                while not self.closed:
+                    if self.heap:
+                        timeout = self.heap[0][0] - time_time()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self.condition.wait(timeout)
+                if self.closed:
+                    return
+                now = time_time()
+                work_items = []
+                while self.heap and self.heap[0][0] <= now:
+                    work_items.append(heappop(self.heap)[2])
+            executor = executor_reference()
+            if executor is None:
+                for w in work_items:
+                    w.future.cancel()
+                return
+            executor._dispatch(work_items)
+            del executor
+
+
 class Pool(ThreadPoolExecutor, NewExecutorPoolMixin):
     """Let ThreadPoolExecutor use NewFuture instead of origin concurrent.futures.Future.
 
@@ -139,6 +273,12 @@ class Pool(ThreadPoolExecutor, NewExecutorPoolMixin):
             # use_submit: 2
             # use_decorator: 2
             # ['use_submit: 2', 'use_submit: 1', 'use_submit: 0', 'use_decorator: 2', 'use_decorator: 1', 'use_decorator: 0']
+
+    Autoscale Usage::
+
+            # keep 2 threads at least, grow up to 20 threads while tasks are queued,
+            # and the idle threads exit after 60 seconds.
+            pool = Pool(20, min_workers=2, keepalive=60)
     """
 
     def __init__(self,
@@ -152,6 +292,10 @@ class Pool(ThreadPoolExecutor, NewExecutorPoolMixin):
         if PY2 and n is None:
             # python2 n!=None
             n = (self._get_cpu_count() or 1) * 5
+        compact = kwargs.pop("compact", False)
+        min_workers = kwargs.pop("min_workers", None)
+        keepalive = kwargs.pop("keepalive", 60)
+        on_resize = kwargs.pop("on_resize", None)
         super(Pool, self).__init__(n, *args, **kwargs)
         #: set the default timeout
         self._timeout = timeout
@@ -161,6 +305,74 @@ class Pool(ThreadPoolExecutor, NewExecutorPoolMixin):
         self._all_futures = WeakSet()
         #: catch_exception=True will not raise exceptions, return object FailureException(exception)
         self.catch_exception = catch_exception
+        #: compact=True submits CompactFuture and skips the _all_futures registration
+        self._compact_group = _CompactGroup() if compact else None
+        #: heap of the tasks submitted by submit_at, lazy init
+        self._scheduler = None
+        #: min_workers is not None for the autoscale mode, on_resize(workers) is called while the threads grow or shrink
+        self.on_resize = on_resize
+        if min_workers is None:
+            self._autoscale = None
+        else:
+            self._autoscale = _AutoscaleState(
+                min(min_workers, self._max_workers), keepalive)
+            with self._shutdown_lock:
+                for _ in range(self._autoscale.min_workers):
+                    self._start_worker()
+
+    @property
+    def workers(self):
+        """The number of alive worker threads."""
+        if self._autoscale is None:
+            return len(self._threads)
+        return self._autoscale.workers
+
+    def _on_resize(self, workers):
+        if self.on_resize is not None:
+            try:
+                self.on_resize(workers)
+            except Exception as e:
+                logger.error("exception calling on_resize for %s" % e)
+
+    def _start_worker(self):
+        state = self._autoscale
+
+        def weakref_cb(_, q=self._work_queue):
+            q.put(None)
+
+        with state.lock:
+            state.workers += 1
+            workers = state.workers
+        t = Thread(
+            name="%s_%d" % (self._thread_name_prefix or self, workers),
+            target=_autoscale_worker,
+            args=(ref(self, weakref_cb), self._work_queue, state,
+                  getattr(self, "_initializer", None),
+                  getattr(self, "_initargs", ())),
+        )
+        t.daemon = True
+        t.start()
+        # forget the exited threads, reassign instead of mutating for the running shutdown
+        self._threads = set(
+            thread for thread in self._threads if thread.is_alive())
+        self._threads.add(t)
+        _threads_queues[t] = self._work_queue
+        self._on_resize(workers)
+
+    def _adjust_thread_count(self):
+        state = self._autoscale
+        if state is None:
+            return super(Pool, self)._adjust_thread_count()
+        with state.lock:
+            # grow only if the queued tasks are more than the idle threads
+            need_more = (state.workers < self._max_workers and
+                         self._work_queue.qsize() > state.idle)
+        if need_more:
+            self._start_worker()
+
+    @property
+    def compact(self):
+        return self._compact_group is not None
 
     @property
     def all_tasks(self):
@@ -169,24 +381,64 @@ class Pool(ThreadPoolExecutor, NewExecutorPoolMixin):
 
     def submit(self, func, *args, **kwargs):
         """Submit a function to the pool, `self.submit(function,arg1,arg2,arg3=3)`"""
+        return self.submit_at(None, func, *args, **kwargs)
+
+    def submit_at(self, ready_at, func, *args, **kwargs):
+        """Submit a function to the pool, but the threads will not receive it until `time.time() >= ready_at`.
+        The waiting tasks stay in a heap of ready time instead of sleeping in the threads.
+
+        WARNING: the tasks which are not ready will be cancelled while shutdown."""
 
         with self._shutdown_lock:
             if self._shutdown:
                 raise RuntimeError("cannot schedule new futures after shutdown")
             callback = kwargs.pop("callback", self.default_callback)
-            future = NewFuture(
-                self._timeout,
-                args,
-                kwargs,
-                callback=callback,
-                catch_exception=self.catch_exception,
-            )
+            if self._compact_group is not None:
+                future = CompactFuture(self._compact_group, self._timeout,
+                                       callback, self.catch_exception)
+            else:
+                future = NewFuture(
+                    self._timeout,
+                    args,
+                    kwargs,
+                    callback=callback,
+                    catch_exception=self.catch_exception,
+                )
+                self._all_futures.add(future)
             w = _WorkItem(future, func, args, kwargs)
-            self._work_queue.put(w)
-            self._adjust_thread_count()
-            self._all_futures.add(future)
+            if ready_at is not None and ready_at > time_time():
+                if self._scheduler is None:
+                    self._scheduler = _ReadyTimeScheduler(self)
+                self._scheduler.push(ready_at, w)
+            else:
+                self._work_queue.put(w)
+                self._adjust_thread_count()
             return future
 
+    def _dispatch(self, work_items):
+        """Called by the _ReadyTimeScheduler for the ready work items."""
+        with self._shutdown_lock:
+            if self._shutdown:
+                for w in work_items:
+                    w.future.cancel()
+                return
+            for w in work_items:
+                self._work_queue.put(w)
+                self._adjust_thread_count()
+
+    def shutdown(self, wait=True, *args, **kwargs):
+        result = super(Pool, self).shutdown(wait, *args, **kwargs)
+        if self._scheduler is not None:
+            self._scheduler.close()
+        return result
+
+    def wait_futures_done(self, tasks=None):
+        if not tasks and self._compact_group is not None:
+            # compact mode has no _all_futures, only wait for the pending count
+            self._compact_group.wait_all(self._timeout)
+            return []
+        return super(Pool, self).wait_futures_done(tasks)
+
 
 class ProcessPool(ProcessPoolExecutor, NewExecutorPoolMixin):
     """Simple ProcessPool covered ProcessPoolExecutor.
@@ -261,8 +513,19 @@ class ProcessPool(ProcessPoolExecutor, NewExecutorPoolMixin):
             self._pending_work_items[self._queue_count] = w
             self._work_ids.put(self._queue_count)
             self._queue_count += 1
-            self._result_queue.put(None)
-            self._start_queue_management_thread()
+            # python3.8+ wake up the management thread, python3.9+ renamed it to executor manager thread
+            wakeup = getattr(self, "_executor_manager_thread_wakeup",
+                             None) or getattr(
+                                 self, "_queue_management_thread_wakeup", None)
+            if wakeup is None:
+                self._result_queue.put(None)
+            else:
+                wakeup.wakeup()
+            if getattr(self, "_safe_to_dynamically_spawn_children", False):
+                self._adjust_process_count()
+            start_thread = getattr(self, "_start_executor_manager_thread",
+                                   None) or self._start_queue_management_thread
+            start_thread()
             if PY2:
                 self._adjust_process_count()
             self._all_futures.add(future)
@@ -379,6 +642,264 @@ class NewFuture(Future):
             return result
 
 
+class _CompactGroup(object):
+    """The Condition and pending counter shared by the CompactFutures of one Pool,
+    the condition is notified only when the pending count drops to 0."""
+    __slots__ = ("condition", "pending")
+
+    def __init__(self):
+        self.condition = Condition()
+        self.pending = 0
+
+    def wait_all(self, timeout=None):
+        """Block until all the futures of this group are done, return the pending count."""
+        with self.condition:
+            end_time = None if timeout is None else time_time() + timeout
+            while self.pending > 0:
+                if end_time is None:
+                    self.condition.wait()
+                else:
+                    remaining = end_time - time_time()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            return self.pending
+
+
+class CompactFuture(object):
+    """Lightweight NewFuture for submitting huge amounts of tasks, used by `Pool(compact=True)`.
+
+    All the futures of one Pool share one Condition (the lock), the threads
+    waiting for one future wait on their own Event, the args / kwargs are not
+    copied, the callback is stored as it is (no set, no wrapper), and the
+    futures are not registered into `Pool._all_futures`, so keep the futures
+    you need or use `pool.x` to wait for all of them.
+
+    It keeps the same api as NewFuture (x / cx / callback_result / result /
+    add_done_callback / task_cost_time ...) and works with `as_completed`,
+    but it is not a subclass of concurrent.futures.Future.
+    """
+
+    __slots__ = ("_group", "_state", "_result", "_exception", "_timeout",
+                 "_callback", "_callback_result", "_waiters_list",
+                 "_done_callbacks_list", "catch_exception", "task_start_time",
+                 "task_end_time", "_events")
+
+    if PY3:
+        from ._py3_patch import _new_future_await
+
+        __await__ = _new_future_await
+
+    def __init__(self, group, timeout=None, callback=None, catch_exception=True):
+        self._group = group
+        self._state = PENDING
+        self._result = None
+        self._exception = None
+        self._timeout = timeout
+        if isinstance(callback, list):
+            callback = tuple(callback)
+        self._callback = callback or None
+        self._callback_result = None
+        self._waiters_list = None
+        self._done_callbacks_list = None
+        self._events = None
+        self.catch_exception = catch_exception
+        self.task_start_time = time_time()
+        self.task_end_time = 0
+        with group.condition:
+            group.pending += 1
+
+    def __getattr__(self, name):
+        return getattr(self.x, name)
+
+    def __repr__(self):
+        return "<%s at %#x state=%s>" % (self.__class__.__name__, id(self),
+                                         self._state)
+
+    @property
+    def _condition(self):
+        return self._group.condition
+
+    @property
+    def _waiters(self):
+        if self._waiters_list is None:
+            self._waiters_list = []
+        return self._waiters_list
+
+    @property
+    def _done_callbacks(self):
+        if self._done_callbacks_list is None:
+            self._done_callbacks_list = []
+        return self._done_callbacks_list
+
+    @property
+    def _callbacks(self):
+        """Keep same api for NewTask."""
+        return self._done_callbacks
+
+    @property
+    def task_cost_time(self):
+        if self.task_end_time:
+            return self.task_end_time - self.task_start_time
+        return 0
+
+    def cancelled(self):
+        return self._state in (CANCELLED, CANCELLED_AND_NOTIFIED)
+
+    def running(self):
+        return self._state == RUNNING
+
+    def done(self):
+        return self._state in (CANCELLED, CANCELLED_AND_NOTIFIED, FINISHED)
+
+    def cancel(self):
+        with self._group.condition:
+            if self._state in (RUNNING, FINISHED):
+                return False
+            if self._state in (CANCELLED, CANCELLED_AND_NOTIFIED):
+                return True
+            self._state = CANCELLED
+            self._notify_done()
+        self._invoke_callbacks()
+        return True
+
+    def set_running_or_notify_cancel(self):
+        with self._group.condition:
+            if self._state == CANCELLED:
+                self._state = CANCELLED_AND_NOTIFIED
+                for waiter in self._waiters_list or ():
+                    waiter.add_cancelled(self)
+                return False
+            elif self._state == PENDING:
+                self._state = RUNNING
+                return True
+            raise RuntimeError("Future in unexpected state")
+
+    def _finish(self, result, exception):
+        with self._group.condition:
+            if self.done():
+                # timeout by self.x already, ignore the late result
+                return
+            self._result = result
+            self._exception = exception
+            self._state = FINISHED
+            for waiter in self._waiters_list or ():
+                if exception is None:
+                    waiter.add_result(self)
+                else:
+                    waiter.add_exception(self)
+            self._notify_done()
+        self._invoke_callbacks()
+
+    def _notify_done(self):
+        # should be called with self._group.condition
+        group = self._group
+        group.pending -= 1
+        if group.pending <= 0:
+            group.condition.notify_all()
+        if self._events:
+            for event in self._events:
+                event.set()
+            self._events = None
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+    def set_exception(self, exception):
+        self._finish(None, exception)
+
+    def _invoke_callbacks(self):
+        """Record the task_end_time, set result for self._callback_result."""
+        self.task_end_time = time_time()
+        callback = self._callback
+        if callback is not None:
+            for fn in (callback if isinstance(callback, tuple) else
+                       (callback,)):
+                try:
+                    self._callback_result = fn(self)
+                except Exception as e:
+                    logger.error("exception calling callback for %s" % e)
+        for fn in self._done_callbacks_list or ():
+            try:
+                fn(self)
+            except Exception as e:
+                logger.error("exception calling callback for %s" % e)
+
+    def add_done_callback(self, fn):
+        with self._group.condition:
+            if not self.done():
+                self._done_callbacks.append(fn)
+                return
+        try:
+            fn(self)
+        except Exception as e:
+            logger.error("exception calling callback for %s" % e)
+
+    def _wait(self, timeout):
+        # wait on an Event of this future, not woken up by the other futures
+        with self._group.condition:
+            if self.done():
+                return
+            event = Event()
+            if self._events is None:
+                self._events = []
+            self._events.append(event)
+        if not event.wait(timeout):
+            with self._group.condition:
+                if self._events and event in self._events:
+                    self._events.remove(event)
+
+    def result(self, timeout=None):
+        self._wait(timeout)
+        if self.cancelled():
+            raise CancelledError()
+        elif self._state == FINISHED:
+            if self._exception is not None:
+                raise self._exception
+            return self._result
+        raise TimeoutError()
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        if self.cancelled():
+            raise CancelledError()
+        elif self._state == FINISHED:
+            return self._exception
+        raise TimeoutError()
+
+    @property
+    def cx(self):
+        """Block the main thead until future finish, return the future.callback_result."""
+        return self.callback_result
+
+    @property
+    def callback_result(self):
+        """Block the main thead until future finish, return the future.callback_result."""
+        if self._state in (PENDING, RUNNING):
+            self.x
+        if self._callback is not None:
+            return self._callback_result
+        else:
+            return self.x
+
+    @property
+    def x(self):
+        """Block the main thead until future finish, return the future.result()."""
+        self._wait(self._timeout)
+        if not self.done():
+            # timeout
+            self.set_exception(TimeoutError())
+        if self.cancelled():
+            result = CancelledError()
+        elif self._exception is not None:
+            result = self._exception
+        else:
+            return self._result
+        if self.catch_exception:
+            return FailureException(result)
+        raise result
+
+
 def Async(f, n=None, timeout=None):
     """Concise usage for pool.submit.
 
@@ -475,6 +996,59 @@ class FailedRequest(PreparedRequest):
         self.prepare(**filted_kwargs)
 
 
+class _Response(Response):
+    """The requests.Response of tPool, json() uses the JSON backend of
+    `torequests.configs.set_json_backend` to parse the content bytes."""
+
+    def json(self, **kwargs):
+        if kwargs:
+            return super(_Response, self).json(**kwargs)
+        try:
+            return loads_bytes(self.content, self.encoding)
+        except ValueError as error:
+            if RequestsJSONDecodeError is None:
+                raise
+            # the same exception as requests.Response.json
+            raise RequestsJSONDecodeError(getattr(error, "msg", str(error)),
+                                          getattr(error, "doc", ""),
+                                          getattr(error, "pos", 0))
+
+
+class _HTTPAdapter(HTTPAdapter):
+    """HTTPAdapter of tPool, builds the _Response instead of requests.Response."""
+
+    def build_response(self, req, resp):
+        # built by requests, only the class is changed
+        response = super(_HTTPAdapter, self).build_response(req, resp)
+        if type(response) is Response:
+            response.__class__ = _Response
+        return response
+
+
+def _resize_connection_pools(session, size):
+    """Resize the pool_maxsize of the HTTPAdapters mounted on the session,
+    the idle connections out of the new size will be closed."""
+    size = max(size, 1)
+    for adapter in set(session.adapters.values()):
+        if not isinstance(adapter, HTTPAdapter):
+            continue
+        adapter._pool_maxsize = size
+        manager = adapter.poolmanager
+        manager.connection_pool_kw["maxsize"] = size
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            pool.pool.maxsize = size
+            while pool.pool.qsize() > size:
+                try:
+                    conn = pool.pool.get_nowait()
+                except Empty:
+                    break
+                if conn:
+                    conn.close()
+
+
 class tPool(object):
     """Async wrapper for requests.
 
@@ -484,6 +1058,16 @@ class tPool(object):
     :param session: individually given a available requests.Session instance if necessary.
     :param catch_exception: `True` will catch all exceptions and return as :class:`FailureException <FailureException>`
     :param default_callback: default_callback for tasks which not set callback param.
+    :param compact: `True` will return CompactFuture instead of NewFuture, less memory for huge amounts of requests.
+    :param min_workers: enable the autoscale mode of the pool, threads grow up to `n` while requests are queued, and shrink to `min_workers` after idle `keepalive` seconds. The connection pools of the HTTPAdapter will be resized to the number of threads.
+    :param keepalive: seconds for the idle threads to exit in the autoscale mode.
+    :param frequencies: None or {host: Frequency obj} or {host: [n, interval]}
+    :param default_host_frequency: None, or tuple like: (2, 1). global frequency is shared by hosts, default_host_frequency will be setdefault as a new one.
+    :param proxy_pool: None or :class:`torequests.utils.ProxyPool`, each request will be sent through a ready proxy, and the retries will choose different proxies. The attempt fails as ProxyUnavailable after waiting `proxy_pool.blocking_timeout` seconds. Ignored if the `proxies` arg is given.
+    :param recorder: None or :class:`torequests.replay.Recorder`, record the successful responses for replaying.
+
+    The requests are sent to the threads only when the slots of their hosts' frequencies are ready,
+    so the waiting requests will not hold the threads, but the retries will sleep in the threads.
 
     Usage::
 
@@ -519,20 +1103,76 @@ class tPool(object):
         catch_exception=True,
         default_callback=None,
         retry_exceptions=(RequestException, Error),
+        compact=False,
+        min_workers=None,
+        keepalive=60,
+        frequencies=None,
+        default_host_frequency=None,
+        proxy_pool=None,
+        recorder=None,
     ):
-        self.pool = Pool(n, timeout)
         self.session = session if session else Session()
         self.n = n or 10
         # adapt the concurrent limit.
-        custom_adapter = HTTPAdapter(pool_connections=self.n,
-                                     pool_maxsize=self.n)
+        custom_adapter = _HTTPAdapter(pool_connections=self.n,
+                                      pool_maxsize=self.n)
         self.session.mount("http://", custom_adapter)
         self.session.mount("https://", custom_adapter)
+        self.pool = Pool(
+            n,
+            timeout,
+            compact=compact,
+            min_workers=min_workers,
+            keepalive=keepalive,
+            on_resize=None if min_workers is None else partial(
+                _resize_connection_pools, self.session),
+        )
         self.interval = interval
         self.catch_exception = catch_exception
         self.default_callback = default_callback
         self.frequency = Frequency(self.n, self.interval)
+        self.frequencies = self.ensure_frequencies(frequencies)
+        self.default_host_frequency = default_host_frequency
         self.retry_exceptions = retry_exceptions
+        self.proxy_pool = proxy_pool
+        self.recorder = recorder
+
+    @staticmethod
+    def ensure_frequencies(frequencies):
+        """Ensure frequencies is dict of host-frequencies."""
+        if not frequencies:
+            return {}
+        if not isinstance(frequencies, dict):
+            raise ValueError("frequencies should be dict")
+        frequencies = {
+            host: Frequency.ensure_frequency(frequencies[host])
+            for host in frequencies
+        }
+        return frequencies
+
+    def set_frequency(self, host, n=None, interval=None):
+        """Set frequency for host with n and interval."""
+        frequency = Frequency(n or self.n,
+                              self.interval if interval is None else interval)
+        self.update_frequency({host: frequency})
+        return frequency
+
+    def update_frequency(self, frequencies):
+        """Update the frequencies with dict of new frequencies."""
+        self.frequencies.update(self.ensure_frequencies(frequencies))
+
+    def get_frequency(self, url):
+        """Return the frequency of url, host > default_host_frequency > global frequency."""
+        host = urlparse(url).netloc if url else ""
+        frequency = self.frequencies.get(host)
+        if not frequency:
+            if self.default_host_frequency:
+                frequency = self.frequencies.setdefault(
+                    host,
+                    Frequency.ensure_frequency(self.default_host_frequency))
+            else:
+                frequency = self.frequency
+        return frequency
 
     @property
     def all_tasks(self):
@@ -564,6 +1204,7 @@ class tPool(object):
                  retry=0,
                  response_validator=None,
                  retry_interval=0,
+                 frequency=None,
                  **kwargs):
         if not url:
             raise ValueError("url should not be null, but given: %s" % url)
@@ -573,25 +1214,62 @@ class tPool(object):
         referer_info = kwargs.pop("referer_info", None)
         encoding = kwargs.pop("encoding", None)
         error = Exception()
+        if frequency is None:
+            # not dispatched by self.request, wait for the frequency in this thread
+            frequency = self.get_frequency(url)
+            start = 0
+        else:
+            start = 1
+        # the proxies arg has a higher priority than the proxy_pool
+        proxy_pool = None if "proxies" in kwargs else self.proxy_pool
+        tried_proxies = set()
         for _ in range(retry + 1):
-            with self.frequency:
-                try:
-                    resp = self.session.request(**kwargs)
-                    if encoding:
-                        resp.encoding = encoding
-                    logger.debug("%s done, %s" % (url, kwargs))
-                    resp.referer_info = referer_info
-                    if response_validator and not response_validator(resp):
-                        raise ValidationError(response_validator.__name__)
-                    return resp
-                except self.retry_exceptions as e:
-                    error = e
-                    logger.debug(
-                        "Retry %s for the %s time, Exception: %r . kwargs= %s" %
-                        (url, _ + 1, e, kwargs))
-                    if retry_interval:
-                        sleep(retry_interval)
+            if _ >= start:
+                diff = frequency.reserve() - time_time()
+                if diff > 0:
+                    sleep(diff)
+            if proxy_pool:
+                # bounded, the waiting thread can not serve other requests
+                proxy = proxy_pool.get(
+                    timeout=proxy_pool.blocking_timeout,
+                    exclude=proxy_pool.next_exclude(tried_proxies))
+                if proxy is None:
+                    error = ProxyUnavailable("no proxy available for %s" % url)
                     continue
+                tried_proxies.add(proxy)
+                kwargs["proxies"] = proxy_pool.to_proxies(proxy)
+                proxy_start = time_time()
+            try:
+                request_start = time_time()
+                resp = self.session.request(**kwargs)
+                if encoding:
+                    resp.encoding = encoding
+                logger.debug("%s done, %s" % (url, kwargs))
+                resp.referer_info = referer_info
+                if response_validator and not response_validator(resp):
+                    raise ValidationError(response_validator.__name__)
+                if proxy_pool:
+                    proxy_pool.report(proxy, True, time_time() - proxy_start)
+                if self.recorder:
+                    self.recorder.record_response(
+                        resp, time_time() - request_start, request_start)
+                return resp
+            except self.retry_exceptions as e:
+                error = e
+                if proxy_pool:
+                    proxy_pool.report(proxy, False, time_time() - proxy_start)
+                logger.debug(
+                    "Retry %s for the %s time, Exception: %r . kwargs= %s" %
+                    (url, _ + 1, e, kwargs))
+                if retry_interval:
+                    sleep(retry_interval)
+                continue
+            except Exception:
+                if proxy_pool:
+                    proxy_pool.report(proxy, False, time_time() - proxy_start)
+                raise
+        if proxy_pool:
+            kwargs.pop("proxies", None)
         # for unofficial request args
         kwargs["retry"] = retry
         if referer_info:
@@ -614,13 +1292,16 @@ class tPool(object):
                 response_validator=None,
                 **kwargs):
         """Similar to `requests.request`, but return as NewFuture."""
-        return self.pool.submit(self._request,
-                                method=method,
-                                url=url,
-                                retry=retry,
-                                response_validator=response_validator,
-                                callback=callback or self.default_callback,
-                                **kwargs)
+        frequency = self.get_frequency(url)
+        return self.pool.submit_at(frequency.reserve(),
+                                   self._request,
+                                   method=method,
+                                   url=url,
+                                   retry=retry,
+                                   response_validator=response_validator,
+                                   frequency=frequency,
+                                   callback=callback or self.default_callback,
+                                   **kwargs)
 
     def get(self,
             url,
@@ -0,0 +1,423 @@
+#! coding:utf-8
+"""Record the responses of tPool / dummy.Requests / aiohttp_dummy.Requests,
+and replay them by a local http server for the offline benchmarks."""
+from __future__ import division
+
+import atexit
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from itertools import count
+from logging import getLogger
+from weakref import WeakSet, ref
+
+from .versions import PY2
+
+if PY2:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from Queue import Empty, Queue
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse
+else:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from queue import Empty, Queue
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse
+
+logger = getLogger("torequests")
+
+__all__ = 'Recorder ReplayServer load_records'.split(' ')
+
+#: the bodies are recorded after decoding, so the length and encoding will be reset.
+SKIP_HEADERS = {
+    'content-encoding', 'content-length', 'transfer-encoding', 'connection',
+    'keep-alive'
+}
+RECORDS_NAME = 'records.jsonl'
+BODIES_NAME = 'bodies'
+
+
+# the recorders with the writer threads, flushed at exit
+_recorders = WeakSet()
+
+
+@atexit.register
+def _flush_recorders():
+    for recorder in list(_recorders):
+        recorder.flush()
+
+
+def _write_records(recorder_ref, queue):
+    """The writer thread of Recorder, the recorder is only referenced while writing,
+    so it can be garbage collected (closed) without calling close."""
+    while 1:
+        args = queue.get()
+        recorder = None
+        try:
+            if args is None:
+                return
+            recorder = recorder_ref()
+            if recorder is None:
+                # collected, the rest records are written by its close
+                return
+            recorder.record(*args)
+        except Exception as error:
+            logger.error('record %s failed: %r' % (args[1], error))
+        finally:
+            recorder = None
+            queue.task_done()
+
+
+def load_records(path):
+    """Yield the records (dict) of the Recorder directory."""
+    with open(os.path.join(path, RECORDS_NAME)) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _get_path(url):
+    parsed = urlparse(url)
+    path = parsed.path or '/'
+    return path + '?' + parsed.query if parsed.query else path
+
+
+class Recorder(object):
+    """Record the responses into a directory:
+
+        records.jsonl: one response each line, with method, url, status,
+            headers, body (sha1), size, latency and start_time.
+        bodies/: the bodies named by sha1, the same body is stored only once.
+
+    The event loops record with `wait=False`, the sha1 and file writing run
+    in a writer thread, `flush` / `close` wait for the pending records.
+
+    :param path: the directory to save the records.
+    :param mode: 'a' to append the records, 'w' to overwrite.
+
+    Basic Usage::
+
+        from torequests.main import tPool
+        from torequests.replay import Recorder
+
+        with Recorder('./records') as recorder:
+            req = tPool(recorder=recorder)
+            req.get('http://p.3.cn').x
+        # dummy.Requests(recorder=recorder) / aiohttp_dummy.Requests(recorder=recorder)
+    """
+
+    def __init__(self, path, mode='a'):
+        self.path = path
+        self.bodies_path = os.path.join(path, BODIES_NAME)
+        if not os.path.isdir(self.bodies_path):
+            os.makedirs(self.bodies_path)
+        self._file = open(os.path.join(path, RECORDS_NAME), mode)
+        self._bodies = set(os.listdir(self.bodies_path))
+        self._lock = threading.Lock()
+        # the queue of the writer thread, started by the first `wait=False`
+        self._queue = None
+        self._writer = None
+        #: count of the responses recorded
+        self.count = 0
+
+    def save_body(self, body):
+        """Save the body if not exists, return the sha1 of body."""
+        key = hashlib.sha1(body).hexdigest()
+        if key not in self._bodies:
+            file_path = os.path.join(self.bodies_path, key)
+            temp_path = '%s.%s.tmp' % (file_path, threading.current_thread().ident)
+            with open(temp_path, 'wb') as f:
+                f.write(body)
+            os.rename(temp_path, file_path)
+            self._bodies.add(key)
+        return key
+
+    def record(self, method, url, status, headers, body, latency,
+               start_time=None):
+        """Record one response.
+
+        :param headers: list of (name, value).
+        :param latency: seconds from sending the request to reading the whole body.
+        :param start_time: timestamp of sending the request."""
+        body = body or b''
+        item = {
+            'method': method.upper(),
+            'url': url,
+            'status': status,
+            'headers': [[name, value]
+                        for name, value in headers
+                        if name.lower() not in SKIP_HEADERS],
+            'size': len(body),
+            'latency': round(latency, 6),
+            'start_time': start_time or time.time() - latency,
+        }
+        with self._lock:
+            item['body'] = self.save_body(body)
+            self._file.write(json.dumps(item) + '\n')
+            self.count += 1
+        return item
+
+    def record_response(self, resp, latency, start_time=None, wait=True):
+        """Record the Response of requests or the NewResponse of aiohttp.
+
+        :param wait: False to record it in the writer thread and return None, for the event loops.
+        """
+        method = getattr(resp, 'method', None) or resp.request.method
+        args = (method, str(resp.url), resp.status_code,
+                list(resp.headers.items()), resp.content, latency, start_time or
+                time.time() - latency)
+        if wait:
+            return self.record(*args)
+        self._ensure_writer().put(args)
+
+    def _ensure_writer(self):
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    queue = Queue()
+                    self._writer = threading.Thread(target=_write_records,
+                                                    args=(ref(self), queue),
+                                                    name='Recorder-writer')
+                    self._writer.daemon = True
+                    self._writer.start()
+                    self._queue = queue
+                    _recorders.add(self)
+        return self._queue
+
+    def flush(self):
+        """Wait for the records of the writer thread, and flush the file."""
+        if self._queue is not None:
+            self._queue.join()
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def _write_pending(self, queue):
+        while 1:
+            try:
+                args = queue.get_nowait()
+            except Empty:
+                return
+            try:
+                if args is not None:
+                    self.record(*args)
+            finally:
+                queue.task_done()
+
+    def close(self):
+        queue, writer = self._queue, self._writer
+        if queue is not None:
+            self._queue = self._writer = None
+            _recorders.discard(self)
+            if writer is threading.current_thread():
+                # collected in the writer thread, stop it after the pending records
+                self._write_pending(queue)
+                queue.put(None)
+            else:
+                queue.put(None)
+                writer.join()
+                # left by the writer stopped while collecting
+                self._write_pending(queue)
+        with self._lock:
+            self._file.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        replay = self.server.replay
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        # the path is an absolute url if the server is used as a proxy
+        record, latency = replay.find(self.command, self.path,
+                                      self.headers.get('Host'))
+        if record is None:
+            body = b'not recorded'
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if latency:
+            time.sleep(latency)
+        body = replay.get_body(record['body'])
+        self.send_response(record['status'])
+        for name, value in record['headers']:
+            # send_response has sent them
+            if name.lower() not in ('server', 'date'):
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = do_HEAD = do_OPTIONS = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayServer(object):
+    """Serve the responses recorded by Recorder with a local http server.
+
+    The request matches the records by (method, host, path) at first, it works
+    while the server is used as a proxy or the Host header is kept, then by
+    (method, path). The records of the same key are served in turn.
+
+    :param path: the directory of Recorder.
+    :param latency: 'record' to sleep the recorded latency of the response,
+        'sample' to sleep a random latency recorded with the same key, None for no delay.
+    :param latency_scale: multiply the latency, 0.5 to replay 2x faster.
+
+    Basic Usage::
+
+        from torequests.main import tPool
+        from torequests.replay import ReplayServer
+
+        with ReplayServer('./records', latency='sample') as server:
+            print(tPool().get(server.url + '/').x.status_code)
+            # or as a proxy
+            print(tPool().get('http://p.3.cn/', proxies={'http': server.url}).x.text)
+    """
+    LATENCY_MODES = ('record', 'sample', None)
+
+    def __init__(self,
+                 path,
+                 host='127.0.0.1',
+                 port=0,
+                 latency='record',
+                 latency_scale=1.0,
+                 seed=None):
+        if latency not in self.LATENCY_MODES:
+            raise ValueError('latency should be one of %s, but given %r' %
+                             (self.LATENCY_MODES, latency))
+        self.path = path
+        self.bodies_path = os.path.join(path, BODIES_NAME)
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        self.records = list(load_records(path))
+        self._index = {}
+        for record in self.records:
+            parsed = urlparse(record['url'])
+            path_key = _get_path(record['url'])
+            for key in ((record['method'], parsed.netloc, path_key),
+                        (record['method'], path_key)):
+                self._index.setdefault(key, []).append(record)
+        self._counters = dict((key, count()) for key in self._index)
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self.server = None
+        self._thread = None
+
+    def find(self, method, path, host=None):
+        """Return (record, latency) of the request, (None, 0) if not found."""
+        host = urlparse(path).netloc or host
+        path = _get_path(path)
+        records = key = None
+        for key in ((method, host, path), (method, path)):
+            records = self._index.get(key)
+            if records:
+                break
+        if not records:
+            return None, 0
+        with self._lock:
+            record = records[next(self._counters[key]) % len(records)]
+            if self.latency == 'sample':
+                latency = self.random.choice(records)['latency']
+            elif self.latency == 'record':
+                latency = record['latency']
+            else:
+                latency = 0
+        return record, latency * self.latency_scale
+
+    def get_body(self, key):
+        body = self._bodies.get(key)
+        if body is None:
+            with open(os.path.join(self.bodies_path, key), 'rb') as f:
+                body = f.read()
+            self._bodies[key] = body
+        return body
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self.server.server_address[:2]
+
+    def _ensure_server(self):
+        if self.server is None:
+            self.server = _ThreadingHTTPServer((self.host, self.port),
+                                               _ReplayHandler)
+            self.server.replay = self
+        return self.server
+
+    def serve_forever(self):
+        self._ensure_server().serve_forever()
+
+    def start(self):
+        """Serve in a daemon thread, return the base url."""
+        self._ensure_server()
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self.url
+
+    def shutdown(self):
+        if self.server is not None:
+            if self._thread is not None:
+                self.server.shutdown()
+                self._thread.join()
+            self.server.server_close()
+            self.server = self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Replay the responses recorded by torequests.replay.Recorder')
+    parser.add_argument('path', help='the directory of the records')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9090)
+    parser.add_argument('--latency', default='record',
+                        choices=['record', 'sample', 'none'])
+    parser.add_argument('--latency-scale', type=float, default=1.0)
+    args = parser.parse_args()
+    server = ReplayServer(args.path,
+                          host=args.host,
+                          port=args.port,
+                          latency=None if args.latency == 'none' else args.latency,
+                          latency_scale=args.latency_scale)
+    print('replay %s records on http://%s:%s' %
+          (len(server.records), args.host, args.port))
+    server.serve_forever()